@@ -4,8 +4,12 @@ import math
 import os
 import yaml
 import re
+import time
 import requests
 
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
 from ansible.module_utils.basic import *
 
 DOCUMENTATION = '''
@@ -22,6 +26,16 @@ Options:
     - option-name: ptf_ip
       description: PTF container management IP address
       required: True
+
+    - option-name: max_workers
+      description: number of exabgp processes routes are announced to in parallel
+      required: False
+      default: 8
+
+    - option-name: chunk_size
+      description: maximum number of routes announced in one HTTP request
+      required: False
+      default: 5000
 '''
 
 EXAMPLES = '''
@@ -47,6 +61,13 @@ LEAF_ASN_START = 64600
 TOR_ASN_START = 65500
 IPV4_BASE_PORT = 5000
 IPV6_BASE_PORT = 6000
+# 192.168.0.0, first address of the routes advertised by the VMs
+ROUTE_BASE_V4 = (192 << 24) + (168 << 16)
+
+ANNOUNCE_WORKERS = 8
+ANNOUNCE_CHUNK_SIZE = 5000
+ANNOUNCE_TIMEOUT = 30
+ANNOUNCE_RETRIES = 3
 
 
 def get_topo_type(topo_name):
@@ -70,18 +91,69 @@ def read_topo(topo_name):
         return {}
 
 
-def announce_routes(ptf_ip, port, routes):
-    messages = []
-    for prefix, nexthop, aspath in routes:
-        if aspath:
-            messages.append("announce route {} next-hop {} as-path [ {} ]".format(prefix, nexthop, aspath))
-        else:
-            messages.append("announce route {} next-hop {}".format(prefix, nexthop))
+def format_route(prefix, nexthop, aspath):
+    if aspath:
+        return "announce route {} next-hop {} as-path [ {} ]".format(prefix, nexthop, aspath)
+    return "announce route {} next-hop {}".format(prefix, nexthop)
 
-    url = "http://%s:%d" % (ptf_ip, port)
+
+def post_commands(url, messages):
     data = { "commands": ";".join(messages) }
-    r = requests.post(url, data=data, timeout=90)
-    assert r.status_code == 200
+    for attempt in range(ANNOUNCE_RETRIES):
+        if attempt:
+            time.sleep(2 ** attempt)
+        try:
+            r = requests.post(url, data=data, timeout=ANNOUNCE_TIMEOUT)
+            if r.status_code == 200:
+                return
+            error = "status code {}".format(r.status_code)
+        except requests.exceptions.RequestException as e:
+            error = repr(e)
+    raise Exception("Failed to announce {} routes to {} after {} attempts: {}"
+                    .format(len(messages), url, ANNOUNCE_RETRIES, error))
+
+
+def announce_routes(ptf_ip, port, routes, chunk_size=ANNOUNCE_CHUNK_SIZE):
+    """Announce routes to the exabgp process listening on port, chunk_size routes per request.
+    Announcing a route is idempotent, so a chunk which failed is sent again as a whole.
+    Returns the number of routes announced.
+    """
+    url = "http://%s:%d" % (ptf_ip, port)
+    count = 0
+    messages = []
+    for prefix, nexthop, aspath in routes:
+        messages.append(format_route(prefix, nexthop, aspath))
+        if len(messages) >= chunk_size:
+            post_commands(url, messages)
+            count += len(messages)
+            messages = []
+    if messages:
+        post_commands(url, messages)
+        count += len(messages)
+    return count
+
+
+def announce_all(ptf_ip, announcements, max_workers=ANNOUNCE_WORKERS, chunk_size=ANNOUNCE_CHUNK_SIZE):
+    """Announce routes to several exabgp processes in parallel.
+    announcements is a list of (port, routes), the routes of one port are announced in the order of the list.
+    Returns the number of routes announced.
+    """
+    port_routes = OrderedDict()
+    for port, routes in announcements:
+        port_routes.setdefault(port, []).append(routes)
+    if not port_routes:
+        return 0
+
+    def announce_port(port):
+        return sum([announce_routes(ptf_ip, port, routes, chunk_size) for routes in port_routes[port]])
+
+    pool = ThreadPool(max(1, min(max_workers, len(port_routes))))
+    try:
+        counts = pool.map(announce_port, list(port_routes.keys()))
+    finally:
+        pool.close()
+        pool.join()
+    return sum(counts)
 
 # AS path from Leaf router for T0 topology
 def get_leaf_uplink_as_path(spine_asn):
@@ -111,108 +183,114 @@ def get_uplink_router_as_path(uplink_router_type, spine_asn):
     return default_route_as_path
 
 
+def skip_routes(router_type, topo, podset, tor, tor_index, set_num, first_third_podset_number,
+                second_third_podset_number):
+    """Check whether the routes of tor in podset are not advertised by the router"""
+    if router_type == "core":
+        # Advertise podset 3+ to T2 DUT
+        if podset < 3:
+            return True
+
+        if set_num is not None:
+            # For T2, we have 3 sets - 1 set advertises first 1/3 podsets, second set advertises second 1/3 podsets, and all VM's advertises the last 1/3 podsets
+            if podset <= first_third_podset_number and set_num != 0:
+                return True
+            elif podset > first_third_podset_number and podset < second_third_podset_number and set_num != 1:
+                return True
+    elif router_type == "spine":
+        # Skip podset 0 for T2
+        if podset == 0:
+            return True
+    elif router_type == "leaf":
+        if topo == 't2':
+            # Send routes for podset 0-2 (first 3 pods) to the T2 DUT
+            if podset > 2:
+                return True
+
+            if set_num is not None:
+                # For T2, we have 3 sets - 1 set advertises podset 1, second set advertises podset 2, and all VM's advertises podset3
+                if podset == 0 and set_num != 0:
+                    return True
+                elif podset == 1 and set_num != 1:
+                    return True
+        else:
+            # Skip tor 0 podset 0 for T1
+            if podset == 0 and tor == 0:
+                return True
+    elif router_type == "tor":
+        # Skip non podset 0 for T0
+        if podset != 0:
+            return True
+        elif tor != tor_index:
+            return True
+    return False
+
+
+def get_routes_as_path(router_type, topo, podset, spine_asn, leaf_asn, tor_asn):
+    aspath = None
+    if router_type == "core":
+        aspath = "{} {}".format(leaf_asn, tor_asn)
+    elif router_type == "spine":
+        aspath = "{} {}".format(leaf_asn, tor_asn)
+    elif router_type == "leaf":
+        if topo == "t2":
+            aspath = "{}".format(tor_asn)
+        else:
+            if podset == 0:
+                aspath = "{}".format(tor_asn)
+            else:
+                aspath = "{} {} {}".format(spine_asn, leaf_asn, tor_asn)
+    return aspath
+
+
 def generate_routes(family, podset_number, tor_number, tor_subnet_number,
                     spine_asn, leaf_asn_start, tor_asn_start,
                     nexthop, nexthop_v6,
                     tor_subnet_size, max_tor_subnet_number, topo,
                     router_type = "leaf", tor_index=None, set_num=None):
-    routes = []
+    """Generate the (prefix, nexthop, aspath) routes advertised by the router one by one"""
     if router_type != "tor":
         default_route_as_path = get_uplink_router_as_path(router_type, spine_asn)
 
         if topo != "t2" or (topo == "t2" and router_type == "core"):
             if family in ["v4", "both"]:
-                routes.append(("0.0.0.0/0", nexthop, default_route_as_path))
+                yield ("0.0.0.0/0", nexthop, default_route_as_path)
             if family in ["v6", "both"]:
-                routes.append(("::/0", nexthop_v6, default_route_as_path))
+                yield ("::/0", nexthop_v6, default_route_as_path)
+
+    # First 3 pods are advertised from T1 - so remove 3 from the total pods being advertised by T3
+    first_third_podset_number = int(math.ceil((podset_number - 3) / 3.0))
+    second_third_podset_number = int(math.ceil(((podset_number - 3) * 2) / 3.0))
+
+    prefixlen_v4 = (32 - int(math.log(tor_subnet_size, 2)))
+    tor_size = max_tor_subnet_number * tor_subnet_size
+    podset_size = tor_number * tor_size
 
     # NOTE: Using large enough values (e.g., podset_number = 200,
     # us to overflow the 192.168.0.0/16 private address space here.
     # This should be fine for internal use, but may pose an issue if used otherwise
     for podset in range(0, podset_number):
+        leaf_asn = leaf_asn_start + podset
         for tor in range(0, tor_number):
+            if skip_routes(router_type, topo, podset, tor, tor_index, set_num,
+                           first_third_podset_number, second_third_podset_number):
+                continue
+
+            tor_asn  = tor_asn_start + tor
+            aspath = get_routes_as_path(router_type, topo, podset, spine_asn, leaf_asn, tor_asn)
+
+            tor_base = ROUTE_BASE_V4 + podset * podset_size + tor * tor_size
             for subnet in range(0, tor_subnet_number):
-                if router_type == "core":
-                    # Advertise podset 3+ to T2 DUT
-                    if podset < 3:
-                        continue
-
-                    # First 3 pods are advertised from T1 - so remove 3 from the total pods being advertised by T3
-                    first_third_podset_number = int(math.ceil((podset_number - 3) / 3.0))
-                    second_third_podset_number = int(math.ceil(((podset_number - 3) * 2) / 3.0))
-
-                    if set_num is not None:
-                        # For T2, we have 3 sets - 1 set advertises first 1/3 podsets, second set advertises second 1/3 podsets, and all VM's advertises the last 1/3 podsets
-                        if podset <= first_third_podset_number and set_num != 0:
-                            continue
-                        elif podset > first_third_podset_number and podset < second_third_podset_number and set_num != 1:
-                            continue
-                if router_type == "spine":
-                    # Skip podset 0 for T2
-                    if podset == 0:
-                        continue
-                elif router_type == "leaf":
-                    if topo == 't2':
-                        # Send routes for podset 0-2 (first 3 pods) to the T2 DUT
-                        if podset > 2:
-                            continue
-
-                        if set_num is not None:
-                            # For T2, we have 3 sets - 1 set advertises podset 1, second set advertises podset 2, and all VM's advertises podset3
-                            if podset == 0 and set_num != 0:
-                                continue
-                            elif podset == 1 and set_num != 1:
-                                continue
-                    else:
-                        # Skip tor 0 podset 0 for T1
-                        if podset == 0 and tor == 0:
-                            continue
-                elif router_type == "tor":
-                    # Skip non podset 0 for T0
-                    if podset != 0:
-                        continue
-                    elif tor != tor_index:
-                        continue
-
-                suffix = ( (podset * tor_number * max_tor_subnet_number * tor_subnet_size) + \
-                      (tor * max_tor_subnet_number * tor_subnet_size) + \
-                      (subnet * tor_subnet_size) )
-                octet2 = (168 + (suffix / (256 ** 2)))
-                octet1 = (192 + (octet2 / 256))
-                octet2 = (octet2 % 256)
-                octet3 = ((suffix / 256) % 256)
-                octet4 = (suffix % 256)
-                prefixlen_v4 = (32 - int(math.log(tor_subnet_size, 2)))
-
-                prefix = "{}.{}.{}.{}/{}".format(octet1, octet2, octet3, octet4, prefixlen_v4)
-                prefix_v6 = "20%02X:%02X%02X:0:%02X::/64" % (octet1, octet2, octet3, octet4)
-
-                leaf_asn = leaf_asn_start + podset
-                tor_asn  = tor_asn_start + tor
-
-                aspath = None
-                if router_type == "core":
-                    aspath = "{} {}".format(leaf_asn, tor_asn)
-                elif router_type == "spine":
-                    aspath = "{} {}".format(leaf_asn, tor_asn)
-                elif router_type == "leaf":
-                    if topo == "t2":
-                        aspath = "{}".format(tor_asn)
-                    else:
-                        if podset == 0:
-                            aspath = "{}".format(tor_asn)
-                        else:
-                            aspath = "{} {} {}".format(spine_asn, leaf_asn, tor_asn)
+                address = tor_base + subnet * tor_subnet_size
+                octets = (address >> 24, (address >> 16) & 0xFF, (address >> 8) & 0xFF, address & 0xFF)
 
                 if family in ["v4", "both"]:
-                    routes.append((prefix, nexthop, aspath))
+                    yield ("%d.%d.%d.%d/%d" % (octets + (prefixlen_v4,)), nexthop, aspath)
                 if family in ["v6", "both"]:
-                    routes.append((prefix_v6, nexthop_v6, aspath))
-
-    return routes
+                    yield ("20%02X:%02X%02X:0:%02X::/64" % octets, nexthop_v6, aspath)
 
 
-def fib_t0(topo, ptf_ip):
+def fib_t0(topo):
 
     common_config = topo['configuration_properties'].get('common', {})
     podset_number = common_config.get("podset_number", PODSET_NUMBER)
@@ -226,6 +304,7 @@ def fib_t0(topo, ptf_ip):
     leaf_asn_start = common_config.get("leaf_asn_start", LEAF_ASN_START)
     tor_asn_start = common_config.get("tor_asn_start", TOR_ASN_START)
 
+    announcements = []
     vms = topo['topology']['VMs']
     for vm in vms.values():
         vm_offset = vm['vm_offset']
@@ -239,11 +318,12 @@ def fib_t0(topo, ptf_ip):
                                     spine_asn, leaf_asn_start, tor_asn_start,
                                     nhipv6, nhipv6, tor_subnet_size, max_tor_subnet_number, "t0")
 
-        announce_routes(ptf_ip, port, routes_v4)
-        announce_routes(ptf_ip, port6, routes_v6)
+        announcements.append((port, routes_v4))
+        announcements.append((port6, routes_v6))
+    return announcements
 
 
-def fib_t1_lag(topo, ptf_ip):
+def fib_t1_lag(topo):
 
     common_config = topo['configuration_properties'].get('common', {})
     podset_number = common_config.get("podset_number", PODSET_NUMBER)
@@ -256,6 +336,7 @@ def fib_t1_lag(topo, ptf_ip):
     leaf_asn_start = common_config.get("leaf_asn_start", LEAF_ASN_START)
     tor_asn_start = common_config.get("tor_asn_start", TOR_ASN_START)
 
+    announcements = []
     vms = topo['topology']['VMs']
     vms_config = topo['configuration']
 
@@ -280,14 +361,15 @@ def fib_t1_lag(topo, ptf_ip):
                                         None, leaf_asn_start, tor_asn_start,
                                         nhipv4, nhipv6, tor_subnet_size, max_tor_subnet_number, "t1",
                                         router_type=router_type, tor_index=tor_index)
-            announce_routes(ptf_ip, port, routes_v4)
-            announce_routes(ptf_ip, port6, routes_v6)
+            announcements.append((port, routes_v4))
+            announcements.append((port6, routes_v6))
 
         if 'vips' in v:
             routes_vips = []
             for prefix in v["vips"]["ipv4"]["prefixes"]:
                 routes_vips.append((prefix, nhipv4, v["vips"]["ipv4"]["asn"]))
-            announce_routes(ptf_ip, port, routes_vips)
+            announcements.append((port, routes_vips))
+    return announcements
 
 
 """
@@ -319,7 +401,7 @@ We would have the following distribution:
    - 193.177.xx.xx - 194.55.xx.xx (4K routes) from all 24 T3 VM's on linecard1 (VM1-VM24)
    - default route from all 24 T3 VM's on linecard1 (VM1-VM24)
 """
-def fib_t2_lag(topo, ptf_ip):
+def fib_t2_lag(topo):
 
     vms = topo['topology']['VMs']
     # T1 VMs per linecard(asic) - key is the dut index, and value is a list of T1 VMs
@@ -339,10 +421,9 @@ def fib_t2_lag(topo, ptf_ip):
             if dut_index not in t3_vms:
                 t3_vms[dut_index] = list()
             t3_vms[dut_index].append(key)
-    generate_t2_routes(t1_vms, topo, ptf_ip)
-    generate_t2_routes(t3_vms, topo, ptf_ip)
+    return generate_t2_routes(t1_vms, topo) + generate_t2_routes(t3_vms, topo)
 
-def generate_t2_routes(dut_vm_dict, topo, ptf_ip):
+def generate_t2_routes(dut_vm_dict, topo):
     common_config = topo['configuration_properties'].get('common', {})
     vms = topo['topology']['VMs']
     vms_config = topo['configuration']
@@ -357,6 +438,7 @@ def generate_t2_routes(dut_vm_dict, topo, ptf_ip):
     leaf_asn_start = common_config.get("leaf_asn_start", LEAF_ASN_START)
     tor_asn_start = common_config.get("tor_asn_start", TOR_ASN_START)
 
+    announcements = []
     # generate routes for t1 vms
     for a_dut_index in dut_vm_dict:
         # sort the list of VMs
@@ -393,14 +475,15 @@ def generate_t2_routes(dut_vm_dict, topo, ptf_ip):
                                             common_config['dut_asn'], leaf_asn_start, tor_asn_start,
                                             nhipv4, nhipv6, tor_subnet_size, max_tor_subnet_number, "t2",
                                             router_type=router_type, tor_index=tor_index, set_num=set_num)
-                announce_routes(ptf_ip, port, routes_v4)
-                announce_routes(ptf_ip, port6, routes_v6)
+                announcements.append((port, routes_v4))
+                announcements.append((port6, routes_v6))
 
                 if 'vips' in vms_config[a_vm]:
                     routes_vips = []
                     for prefix in vms_config[a_vm]["vips"]["ipv4"]["prefixes"]:
                         routes_vips.append((prefix, nhipv4, vms_config[a_vm]["vips"]["ipv4"]["asn"]))
-                    announce_routes(ptf_ip, port, routes_vips)
+                    announcements.append((port, routes_vips))
+    return announcements
 
 
 def main():
@@ -408,12 +491,16 @@ def main():
     module = AnsibleModule(
         argument_spec=dict(
             topo_name=dict(required=True, type='str'),
-            ptf_ip=dict(required=True, type='str')
+            ptf_ip=dict(required=True, type='str'),
+            max_workers=dict(required=False, type='int', default=ANNOUNCE_WORKERS),
+            chunk_size=dict(required=False, type='int', default=ANNOUNCE_CHUNK_SIZE)
         ),
         supports_check_mode=False)
 
     topo_name = module.params['topo_name']
     ptf_ip = module.params['ptf_ip']
+    max_workers = module.params['max_workers']
+    chunk_size = module.params['chunk_size']
 
     topo = read_topo(topo_name)
     if not topo:
@@ -423,16 +510,22 @@ def main():
 
     try:
         if topo_type == "t0":
-            fib_t0(topo, ptf_ip)
-            module.exit_json(changed=True)
+            announcements = fib_t0(topo)
         elif topo_type == "t1":
-            fib_t1_lag(topo, ptf_ip)
-            module.exit_json(changed=True)
+            announcements = fib_t1_lag(topo)
         elif topo_type == "t2":
-            fib_t2_lag(topo, ptf_ip)
-            module.exit_json(changed=True)
+            announcements = fib_t2_lag(topo)
         else:
             module.exit_json(msg='Unsupported topology "{}" - skipping announcing routes'.format(topo_name))
+
+        start = time.time()
+        routes = announce_all(ptf_ip, announcements, max_workers, chunk_size)
+        seconds = time.time() - start
+        routes_per_second = int(routes / seconds) if seconds > 0 else routes
+        module.exit_json(changed=True, routes=routes, seconds=round(seconds, 2),
+                         routes_per_second=routes_per_second,
+                         msg='Announced {} routes in {:.2f} seconds, {} routes/s'.format(
+                             routes, seconds, routes_per_second))
     except Exception as e:
         module.fail_json(msg='Announcing routes failed, topo_name={}, topo_type={}, exception={}'\
             .format(topo_name, topo_type, repr(e)))
@@ -3,6 +3,7 @@
 import lxml.etree as ET
 import yaml
 import os
+import hashlib
 import traceback
 import ipaddr as ipaddress
 from operator import itemgetter
@@ -10,6 +11,11 @@ from itertools import groupby
 from collections import defaultdict
 from natsort import natsorted
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 try:
     from ansible.module_utils.port_utils import get_port_alias_to_name_map
     from ansible.module_utils.debug_utils import create_debug_file, print_debug_msg
@@ -48,6 +54,11 @@ options:
         Name of the connection graph xml file. Override the behavior of looking up connection graph xml file. When
         this option is specified, always use the specified connection graph xml file.
         required: False
+    use_cache:
+        Load the parsed graph files from the compiled graph cache under ~/.ansible/conn_graph. A graph file is
+        parsed again only when it was modified since it was compiled.
+        required: False
+        default: True
 
     Mutually exclusive options: host, hosts, anchor
 
@@ -120,8 +131,12 @@ class Parse_Lab_Graph():
     This module conn_graph_file also parse the server links to have a full root fanout switches template for deployment.
     """
 
+    # attributes holding the parsed graph, stored to the compiled graph cache
+    GRAPH_ATTRIBUTES = ('devices', 'vlanport', 'links', 'consolelinks', 'pdulinks', 'server')
+
     def __init__(self, xmlfile):
-        self.root = ET.parse(xmlfile)
+        self.xmlfile = xmlfile
+        self.root = None
         self.devices = {}
         self.vlanport = {}
         self.vlanrange = {}
@@ -153,6 +168,7 @@ class Parse_Lab_Graph():
         """
         Parse  the xml graph file
         """
+        self.root = ET.parse(self.xmlfile)
         deviceinfo = {}
         deviceroot = self.root.find(self.pngtag).find('Devices')
         devices = deviceroot.findall('Device')
@@ -337,15 +353,7 @@ class Parse_Lab_Graph():
         return self.links.get(hostname)
 
     def contains_hosts(self, hostnames, part):
-        if not part:
-            return set(hostnames) <= set(self.devices)
-        # It's possible that not all devices are found in connect_graph when using in devutil
-        THRESHOLD = 0.8
-        count = 0
-        for hostname in hostnames:
-            if hostname in self.devices.keys():
-                count += 1
-        return hostnames and (count * 1.0 / len(hostnames) >= THRESHOLD)
+        return contains_hosts(self.devices, hostnames, part)
 
 
     def get_host_console_info(self, hostname):
@@ -406,6 +414,133 @@ class Parse_Lab_Graph():
 LAB_CONNECTION_GRAPH_FILE = 'graph_files.yml'
 EMPTY_GRAPH_FILE = 'empty_graph.xml'
 LAB_GRAPHFILE_PATH = 'files/'
+LAB_GRAPH_CACHE_PATH = os.path.expanduser('~/.ansible/conn_graph')
+LAB_GRAPH_CACHE_INDEX = 'index.pickle'
+LAB_GRAPH_CACHE_VERSION = 1
+
+use_graph_cache = True
+
+
+def graph_file_stamp(filename):
+    """
+    The stamp of the content of a graph file, the compiled graph is rebuilt when it changes
+    """
+    st = os.stat(filename)
+    return (LAB_GRAPH_CACHE_VERSION, st.st_mtime, st.st_size)
+
+
+def load_pickle(filename, default):
+    try:
+        with open(filename, 'rb') as fd:
+            return pickle.load(fd)
+    except Exception:
+        # missing, partially written or incompatible cache
+        return default
+
+
+def save_pickle(filename, data):
+    tmp_filename = '{}.{}'.format(filename, os.getpid())
+    try:
+        if not os.path.isdir(LAB_GRAPH_CACHE_PATH):
+            os.makedirs(LAB_GRAPH_CACHE_PATH)
+        with open(tmp_filename, 'wb') as fd:
+            pickle.dump(data, fd, 2)
+        # concurrent module runs see either the old or the new file
+        os.rename(tmp_filename, filename)
+    except (IOError, OSError):
+        # the cache is an optimization only
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+
+class LabGraphCache(object):
+    """
+    Compiled representation of the lab graph files
+
+    Every parsed graph file is stored as a pickle of its device, link, vlan, console and pdu dictionaries,
+    so a module run loads the dictionaries instead of parsing the XML. The index maps every graph file to
+    the set of its hosts for finding the graph file of the testbed without loading any graph.
+    Entries are stamped with the modification time and size of the graph file and rebuilt when it changes.
+    """
+
+    def __init__(self, path=LAB_GRAPH_CACHE_PATH):
+        self.path = path
+        self.index_file = os.path.join(path, LAB_GRAPH_CACHE_INDEX)
+        self.index = load_pickle(self.index_file, {})
+        self.index_changed = False
+
+    def graph_cache_file(self, filename):
+        return os.path.join(self.path, hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest() + '.pickle')
+
+    def compile_graph(self, filename, stamp):
+        lab_graph = Parse_Lab_Graph(filename)
+        lab_graph.parse_graph()
+        # the parsed XML tree is not needed after parsing, release it
+        lab_graph.root = None
+        graph = dict((attr, getattr(lab_graph, attr)) for attr in Parse_Lab_Graph.GRAPH_ATTRIBUTES)
+        save_pickle(self.graph_cache_file(filename), {'stamp': stamp, 'graph': graph})
+        self.index[os.path.abspath(filename)] = {'stamp': stamp, 'hosts': frozenset(lab_graph.devices)}
+        self.index_changed = True
+        return lab_graph
+
+    def get_graph(self, filename):
+        """
+        return the parsed graph file, from the cache unless the graph file changed
+        """
+        stamp = graph_file_stamp(filename)
+        cached = load_pickle(self.graph_cache_file(filename), None)
+        if not cached or cached['stamp'] != stamp:
+            return self.compile_graph(filename, stamp)
+        lab_graph = Parse_Lab_Graph(filename)
+        for attr in Parse_Lab_Graph.GRAPH_ATTRIBUTES:
+            setattr(lab_graph, attr, cached['graph'][attr])
+        return lab_graph
+
+    def get_hosts(self, filename):
+        """
+        return the set of hosts in the graph file, from the index unless the graph file changed
+        """
+        stamp = graph_file_stamp(filename)
+        entry = self.index.get(os.path.abspath(filename))
+        if not entry or entry['stamp'] != stamp:
+            return frozenset(self.compile_graph(filename, stamp).devices)
+        return entry['hosts']
+
+    def save(self):
+        if self.index_changed:
+            save_pickle(self.index_file, self.index)
+            self.index_changed = False
+
+
+def load_graph(filename, graph_cache=None):
+    """
+    Parse a graph file, or load it from the compiled graph cache when it is enabled
+    """
+    if not use_graph_cache:
+        lab_graph = Parse_Lab_Graph(filename)
+        lab_graph.parse_graph()
+        return lab_graph
+    cache = graph_cache or LabGraphCache()
+    lab_graph = cache.get_graph(filename)
+    if graph_cache is None:
+        cache.save()
+    return lab_graph
+
+
+def contains_hosts(hosts, hostnames, part):
+    """
+    Check if the hosts of a graph file contain the hostnames
+
+    Parameters:
+        hosts: the hosts of the graph file, a set or a dict keyed by hostname
+        part: True if over 80% of hostnames are enough
+    """
+    if not part:
+        return all(hostname in hosts for hostname in hostnames)
+    # It's possible that not all devices are found in connect_graph when using in devutil
+    THRESHOLD = 0.8
+    count = len([hostname for hostname in hostnames if hostname in hosts])
+    return hostnames and (count * 1.0 / len(hostnames) >= THRESHOLD)
 
 
 def find_graph(hostnames, part=False):
@@ -422,6 +557,20 @@ def find_graph(hostnames, part=False):
     with open(filename) as fd:
         file_list = yaml.safe_load(fd)
 
+    if use_graph_cache:
+        # Look up the hosts in the index of the graph cache, only the selected graph file is loaded
+        graph_cache = LabGraphCache()
+        try:
+            for fn in file_list:
+                print_debug_msg(debug_fname, "Looking at conn graph file: %s for hosts %s" % (fn, hostnames))
+                filename = os.path.join(LAB_GRAPHFILE_PATH, fn)
+                if contains_hosts(graph_cache.get_hosts(filename), hostnames, part):
+                    print_debug_msg(debug_fname, ("Returning lab graph from conn graph file: %s for hosts %s" % (fn, hostnames)))
+                    return graph_cache.get_graph(filename)
+            return graph_cache.get_graph(os.path.join(LAB_GRAPHFILE_PATH, EMPTY_GRAPH_FILE))
+        finally:
+            graph_cache.save()
+
     # Finding the graph file contains all duts from hostnames,
     for fn in file_list:
         print_debug_msg(debug_fname, "Looking at conn graph file: %s for hosts %s" % (fn, hostnames))
@@ -524,6 +673,7 @@ def main():
             filepath=dict(required=False),
             anchor=dict(required=False, type='list'),
             ignore_errors=dict(required=False, type='bool', default=False),
+            use_cache=dict(required=False, type='bool', default=True),
         ),
         mutually_exclusive=[['host', 'hosts', 'anchor']],
         supports_check_mode=True
@@ -548,10 +698,12 @@ def main():
             global LAB_GRAPHFILE_PATH
             LAB_GRAPHFILE_PATH = m_args['filepath']
 
+        global use_graph_cache
+        use_graph_cache = m_args['use_cache']
+
         if m_args['filename']:
             filename = os.path.join(LAB_GRAPHFILE_PATH, m_args['filename'])
-            lab_graph = Parse_Lab_Graph(filename)
-            lab_graph.parse_graph()
+            lab_graph = load_graph(filename)
         else:
             # When calling passed in anchor instead of hostnames,
             # the caller is asking to return the whole graph. This
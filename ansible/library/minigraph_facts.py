@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 import calendar
+import hashlib
+import inspect
 import os
 import sys
 import socket
@@ -10,6 +12,7 @@ import copy
 import ipaddr as ipaddress
 from collections import defaultdict
 from natsort import natsorted
+from ansible.module_utils import port_utils
 from ansible.module_utils.port_utils import get_port_alias_to_name_map, get_port_indices_for_asic
 from lxml import etree as ET
 from lxml.etree import QName
@@ -29,6 +32,21 @@ options:
         description:
             - Set to target snmp server (normally {{inventory_hostname}})
         required: true
+    filename:
+        description:
+            - Minigraph file to parse, defaults to /etc/sonic/minigraph.xml
+        required: false
+    namespace:
+        description:
+            - ASIC namespace to retrieve the facts for on multi-ASIC devices
+        required: false
+    use_cache:
+        description:
+            - Use the facts cached for the same content of the minigraph file, hostname and ASIC namespaces,
+              parsed by the same code of this module and of port_utils.
+              The facts of all ASIC namespaces are cached from a single parse of the file.
+        required: false
+        default: true
 '''
 
 EXAMPLES = '''
@@ -45,6 +63,8 @@ ns3 = "http://www.w3.org/2001/XMLSchema-instance"
 ANSIBLE_USER_MINIGRAPH_PATH = os.path.expanduser('~/.ansible/minigraph')
 ANSIBLE_LOCAL_MINIGRAPH_PATH = '{}.xml'
 ANSIBLE_USER_MINIGRAPH_MAX_AGE = 86400  # 24-hours (in seconds)
+ANSIBLE_USER_MINIGRAPH_FACTS_CACHE = os.path.join(ANSIBLE_USER_MINIGRAPH_PATH, '{}_facts.json')
+MINIGRAPH_FACTS_CACHE_VERSION = 2
 
 class minigraph_encoder(json.JSONEncoder):
     def default(self, obj):
@@ -557,8 +577,15 @@ def port_alias_to_name_map_50G(all_ports, s100G_ports):
 
     return port_alias_to_name_map
 
-def parse_xml(filename, hostname, asic_name=None):
-    mini_graph_path, root = reconcile_mini_graph_locations(filename, hostname)
+def parse_xml(filename, hostname, asic_name=None, root=None):
+    if root is None:
+        mini_graph_path, root = reconcile_mini_graph_locations(filename, hostname)
+    else:
+        mini_graph_path = filename
+
+    # ports are collected by parse_dpg, start from scratch if the file was already parsed by this process
+    global ports
+    ports = {}
 
     u_neighbors = None
     u_devices = None
@@ -710,12 +737,152 @@ port_alias_to_name_map = {}
 port_name_to_alias_map = {}
 port_alias_asic_map = {}
 
+
+def minigraph_file_hash(path):
+    """
+    :param path: the minigraph file
+    :return: SHA-1 hex digest of the content of the file
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def parser_code_hash():
+    """
+    The facts depend on the code of this module and on the port alias maps of the HwSKUs in port_utils,
+    facts cached by another version of the code are not used.
+
+    :return: SHA-1 hex digest of the source of this module and of port_utils, None if it can't be read
+    """
+    sha = hashlib.sha1()
+    try:
+        for module in (sys.modules[__name__], port_utils):
+            source = inspect.getsource(module)
+            sha.update(source.encode('utf-8') if isinstance(source, unicode) else source)
+    except (IOError, TypeError, KeyError):
+        return None
+    return sha.hexdigest()
+
+
+def get_asic_namespaces():
+    """
+    :return: list of ASIC namespaces of the device, empty on single-ASIC devices
+    """
+    try:
+        from sonic_py_common import multi_asic
+        return [namespace for namespace in multi_asic.get_namespace_list() if namespace]
+    except ImportError:
+        return []
+
+
+def parse_all_namespaces(filename, hostname, namespace):
+    """
+    Parse the minigraph file once and extract the facts of the host and of all its ASIC namespaces.
+
+    :param namespace: the namespace requested, its facts are always extracted, the facts of the other
+                      namespaces are skipped if they can't be extracted
+    :return: dict of cleaned facts keyed by namespace, '' for the host
+    """
+    mini_graph_path, root = reconcile_mini_graph_locations(filename, hostname)
+    requested = namespace or ''
+    namespaces = [requested] + [ns for ns in [''] + get_asic_namespaces() if ns != requested]
+
+    facts = {}
+    for ns in namespaces:
+        try:
+            results = parse_xml(mini_graph_path, hostname, ns or None, root)
+        except Exception:
+            if ns == requested:
+                raise
+            continue
+        facts[ns] = json.loads(json.dumps(results, cls=minigraph_encoder))
+    return facts
+
+
+def get_facts_cache_key(path):
+    """
+    :param path: the minigraph file
+    :return: dict of what the cached facts depend on, None if the code of the parser can't be identified
+    """
+    code_sha = parser_code_hash()
+    if code_sha is None:
+        return None
+    return {
+        'version': MINIGRAPH_FACTS_CACHE_VERSION,
+        'path': path,
+        'sha1': minigraph_file_hash(path),
+        'code_sha1': code_sha,
+        'namespaces': get_asic_namespaces(),
+    }
+
+
+def load_facts_cache(hostname, cache_key):
+    try:
+        with open(ANSIBLE_USER_MINIGRAPH_FACTS_CACHE.format(hostname)) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if any(cache.get(name) != value for name, value in cache_key.items()):
+        return {}
+    return cache['facts']
+
+
+def save_facts_cache(hostname, cache_key, facts):
+    cache_file = ANSIBLE_USER_MINIGRAPH_FACTS_CACHE.format(hostname)
+    temp_file = '{}.{}'.format(cache_file, os.getpid())
+    cache = dict(cache_key)
+    cache['facts'] = facts
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(cache, f)
+        # rename is atomic, concurrent readers see either the old or the new cache
+        os.rename(temp_file, cache_file)
+    except (IOError, OSError):
+        # the cache is an optimization only
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def get_minigraph_facts(filename, hostname, namespace=None, use_cache=True):
+    """
+    Get the cleaned minigraph facts, parsing the minigraph file only if its content, the ASIC namespaces of the
+    device or the code of the parser changed since it was parsed the last time.
+
+    Facts are looked up in the cache file of the host ~/.ansible/minigraph/HOSTNAME_facts.json, which holds the
+    facts of the host and all its namespaces extracted from the same content of the minigraph file.
+
+    :param filename: the filename to load (may be None)
+    :param hostname: the hostname to load (required)
+    :param namespace: the ASIC namespace (may be None)
+    :param use_cache: False to always parse the minigraph file
+    :return: dict of facts which can be serialized to JSON
+    """
+    if not use_cache:
+        return json.loads(json.dumps(parse_xml(filename, hostname, namespace), cls=minigraph_encoder))
+
+    path = filename if filename is not None else '/etc/sonic/minigraph.xml'
+    cache_key = get_facts_cache_key(path)
+    if cache_key is None:
+        return json.loads(json.dumps(parse_xml(filename, hostname, namespace), cls=minigraph_encoder))
+
+    ns = namespace or ''
+    facts = load_facts_cache(hostname, cache_key)
+    if ns not in facts:
+        facts = parse_all_namespaces(filename, hostname, namespace)
+        save_facts_cache(hostname, cache_key, facts)
+    return facts[ns]
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
             host=dict(required=True),
             filename=dict(),
             namespace=dict(required=False, default=None),
+            use_cache=dict(required=False, default=True, type='bool'),
         ),
         supports_check_mode=True
     )
@@ -743,8 +910,7 @@ def main():
     namespace = m_args['namespace']
 
     try:
-        results = parse_xml(filename, m_args['host'], namespace)
-        results_clean = json.loads(json.dumps(results, cls=minigraph_encoder))
+        results_clean = get_minigraph_facts(filename, m_args['host'], namespace, m_args['use_cache'])
         module.exit_json(ansible_facts=results_clean)
     except Exception as e:
         tb = traceback.format_exc()
@@ -1,5 +1,5 @@
 import re
-from ipaddress import ip_address, ip_network
+from ipaddress import ip_address
 from lpm import LpmDict
 
 # These subnets are excluded from FIB test
@@ -54,16 +54,24 @@ class Fib():
         # filter out empty lines and lines starting with '#'
         pattern = re.compile("^#.*$|^[ \t]*$")
 
+        # routes mostly share few next hop groups, parse each of them once
+        next_hops = {}
+        ipv4_entries = []
+        ipv6_entries = []
         with open(file_path, 'r') as f:
-            for line in f.readlines():
+            for line in f:
                 if pattern.match(line): continue
-                entry = line.split(' ', 1)
-                prefix = ip_network(unicode(entry[0]))
-                next_hop = self.NextHop(entry[1])
-                if prefix.version is 4:
-                    self._ipv4_lpm_dict[str(prefix)] = next_hop
-                elif prefix.version is 6:
-                    self._ipv6_lpm_dict[str(prefix)] = next_hop
+                prefix, next_hop_str = line.split(' ', 1)
+                next_hop = next_hops.get(next_hop_str)
+                if next_hop is None:
+                    next_hop = next_hops[next_hop_str] = self.NextHop(next_hop_str)
+                if ':' in prefix:
+                    ipv6_entries.append((prefix, next_hop))
+                else:
+                    ipv4_entries.append((prefix, next_hop))
+
+        self._ipv4_lpm_dict.bulk_load(ipv4_entries)
+        self._ipv6_lpm_dict.bulk_load(ipv6_entries)
 
     def __getitem__(self, ip):
         ip = ip_address(unicode(ip))
@@ -29,6 +29,7 @@ from ptf.testutils import verify_packet_any_port
 from ptf.testutils import verify_no_packet_any
 
 import fib
+from flow_batch import FlowBatch
 
 class FibTest(BaseTest):
     '''
@@ -103,6 +104,8 @@ class FibTest(BaseTest):
          - dst_vid                vlan tag id of dst pkts. Default: None(untag)
          - ignore_ttl:            mask the ttl field in the expected packet
          - single_fib_for_duts:   have a single fib file for all DUTs in multi-dut case. Default: False
+         - batch_size:            send packets of up to batch_size flows back to back and match them
+                                  when received instead of checking packets one by one. Default: 0(disable)
         '''
         self.dataplane = ptf.dataplane_instance
 
@@ -136,6 +139,13 @@ class FibTest(BaseTest):
 
         self.ignore_ttl = self.test_params.get('ignore_ttl', False)
         self.single_fib = self.test_params.get('single_fib_for_duts', False)
+        self.batch_size = self.test_params.get('batch_size', 0)
+
+    def new_flow_batch(self):
+        if not self.batch_size:
+            return None
+        return FlowBatch(self, batch_size=self.batch_size,
+                         exp_src_mac=lambda port: self.router_macs[self.ptf_test_port_map[str(port)]['target_dut']])
 
     def check_ip_ranges(self, ipv4=True):
         for dut_index, fib in enumerate(self.fibs):
@@ -147,11 +157,14 @@ class FibTest(BaseTest):
             if len(ip_ranges) > 150:
                 covered_ip_ranges = ip_ranges[:100] + random.sample(ip_ranges[100:], 50)  # Limit test execution time
             else:
-                covered_ip_ranges = ip_ranges[:]
+                covered_ip_ranges = list(ip_ranges)
 
+            batch = self.new_flow_batch()
             for ip_range in covered_ip_ranges:
                 if ip_range.get_first_ip() in fib:
-                    self.check_ip_range(ip_range, dut_index, ipv4)
+                    self.check_ip_range(ip_range, dut_index, ipv4, batch)
+            if batch is not None:
+                batch.run(drop=self.pkt_action == self.ACTION_DROP)
 
             random.shuffle(covered_ip_ranges)
             self.check_balancing(covered_ip_ranges, dut_index, ipv4)
@@ -170,7 +183,7 @@ class FibTest(BaseTest):
             break
         return src_port, exp_port_list, next_hop
 
-    def check_ip_range(self, ip_range, dut_index, ipv4=True):
+    def check_ip_range(self, ip_range, dut_index, ipv4=True, batch=None):
 
         dst_ips = []
         dst_ips.append(ip_range.get_first_ip())
@@ -186,7 +199,7 @@ class FibTest(BaseTest):
                 return
             logging.info('Checking ip range {}, src_port={}, exp_ports={}, dst_ip={}, dut_index={}'\
                 .format(ip_range, src_port, exp_ports, dst_ip, dut_index))
-            self.check_ip_route(src_port, dst_ip, exp_ports, ipv4)
+            self.check_ip_route(src_port, dst_ip, exp_ports, ipv4, batch)
 
     def check_balancing(self, ip_ranges, dut_index, ipv4=True):
         # Test traffic balancing across ECMP/LAG members
@@ -201,21 +214,27 @@ class FibTest(BaseTest):
                 # Change balancing_test_times according to number of next hop groups
                 logging.info('Checking ip range balancing {}, src_port={}, exp_ports={}, dst_ip={}, dut_index={}'\
                     .format(ip_range, src_port, exp_port_list, dst_ip, dut_index))
+                batch = self.new_flow_batch()
+                matched_ports = []
                 for i in range(0, self.balancing_test_times*len(exp_port_list)):
-                    (matched_index, received) = self.check_ip_route(src_port, dst_ip, exp_port_list, ipv4)
+                    (matched_index, received) = self.check_ip_route(src_port, dst_ip, exp_port_list, ipv4, batch)
+                    matched_ports.append(matched_index)
+                if batch is not None:
+                    matched_ports = batch.run()
+                for matched_index in matched_ports:
                     hit_count_map[matched_index] = hit_count_map.get(matched_index, 0) + 1
                 self.check_hit_count_map(next_hop.get_next_hop(), hit_count_map)
                 self.balancing_test_count += 1
                 if self.balancing_test_count >= self.balancing_test_number:
                     break
 
-    def check_ip_route(self, src_port, dst_ip_addr, dst_port_list, ipv4=True):
+    def check_ip_route(self, src_port, dst_ip_addr, dst_port_list, ipv4=True, batch=None):
         if ipv4:
-            res = self.check_ipv4_route(src_port, dst_ip_addr, dst_port_list)
+            res = self.check_ipv4_route(src_port, dst_ip_addr, dst_port_list, batch)
         else:
-            res = self.check_ipv6_route(src_port, dst_ip_addr, dst_port_list)
+            res = self.check_ipv6_route(src_port, dst_ip_addr, dst_port_list, batch)
 
-        if self.pkt_action == self.ACTION_DROP:
+        if self.pkt_action == self.ACTION_DROP or batch is not None:
             return res
 
         (matched_index, received) = res
@@ -228,12 +247,13 @@ class FibTest(BaseTest):
 
         return (matched_port, received)
 
-    def check_ipv4_route(self, src_port, dst_ip_addr, dst_port_list):
+    def check_ipv4_route(self, src_port, dst_ip_addr, dst_port_list, batch=None):
         '''
         @summary: Check IPv4 route works.
         @param src_port: index of port to use for sending packet to switch
         @param dest_ip_addr: destination IP to build packet with.
         @param dst_port_list: list of ports on which to expect packet to come back from the switch
+        @param batch: FlowBatch to add the packet to instead of sending it
         '''
         sport = random.randint(0, 65535)
         dport = random.randint(0, 65535)
@@ -265,6 +285,8 @@ class FibTest(BaseTest):
                             ip_options=self.ip_options,
                             dl_vlan_enable=self.dst_vid is not None,
                             vlan_vid=self.dst_vid or 0)
+        if batch is not None:
+            flow_id = batch.stamp(pkt, exp_pkt)
         masked_exp_pkt = Mask(exp_pkt)
         masked_exp_pkt.set_do_not_care_scapy(scapy.Ether, "dst")
         masked_exp_pkt.set_do_not_care_scapy(scapy.Ether, "src")
@@ -275,6 +297,10 @@ class FibTest(BaseTest):
             masked_exp_pkt.set_do_not_care_scapy(scapy.IP, "chksum")
             masked_exp_pkt.set_do_not_care_scapy(scapy.TCP, "chksum")
 
+        if batch is not None:
+            batch.add(flow_id, src_port, pkt, masked_exp_pkt, dst_port_list)
+            return (None, None)
+
         send_packet(self, src_port, pkt)
         logging.info('Sent Ether(src={}, dst={})/IP(src={}, dst={})/TCP(sport={}, dport={}) on port {}'\
             .format(pkt.src,
@@ -305,12 +331,13 @@ class FibTest(BaseTest):
             return verify_no_packet_any(self, masked_exp_pkt, dst_port_list)
     #---------------------------------------------------------------------
 
-    def check_ipv6_route(self, src_port, dst_ip_addr, dst_port_list):
+    def check_ipv6_route(self, src_port, dst_ip_addr, dst_port_list, batch=None):
         '''
         @summary: Check IPv6 route works.
         @param source_port_index: index of port to use for sending packet to switch
         @param dest_ip_addr: destination IP to build packet with.
         @param dst_port_list: list of ports on which to expect packet to come back from the switch
+        @param batch: FlowBatch to add the packet to instead of sending it
         @return Boolean
         '''
         sport = random.randint(0, 65535)
@@ -341,6 +368,8 @@ class FibTest(BaseTest):
                                 ipv6_hlim=max(self.ttl-1, 0),
                                 dl_vlan_enable=self.dst_vid is not None,
                                 vlan_vid=self.dst_vid or 0)
+        if batch is not None:
+            flow_id = batch.stamp(pkt, exp_pkt)
         masked_exp_pkt = Mask(exp_pkt)
         masked_exp_pkt.set_do_not_care_scapy(scapy.Ether,"dst")
         masked_exp_pkt.set_do_not_care_scapy(scapy.Ether,"src")
@@ -351,6 +380,10 @@ class FibTest(BaseTest):
             masked_exp_pkt.set_do_not_care_scapy(scapy.IPv6, "chksum")
             masked_exp_pkt.set_do_not_care_scapy(scapy.TCP, "chksum")
 
+        if batch is not None:
+            batch.add(flow_id, src_port, pkt, masked_exp_pkt, dst_port_list)
+            return (None, None)
+
         send_packet(self, src_port, pkt)
         logging.info('Sent Ether(src={}, dst={})/IPv6(src={}, dst={})/TCP(sport={}, dport={}) on port {}'\
             .format(pkt.src,
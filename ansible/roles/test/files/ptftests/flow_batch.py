@@ -0,0 +1,164 @@
+'''
+Description:    Batched send/verify of test flows for the FIB and hash tests.
+
+                Sending one packet and waiting for it before sending the next
+                one makes the balancing checks take several minutes. A FlowBatch
+                stamps a flow identifier into the TCP payload of every packet,
+                sends the packets of a batch back to back and then drains the
+                dataplane, matching every received packet against its flow
+                through the identifier.
+
+Usage:          batch = FlowBatch(test, batch_size=256)
+                flow_id = batch.stamp(pkt, exp_pkt)     # before building Mask(exp_pkt)
+                batch.add(flow_id, src_port, pkt, masked_exp_pkt, exp_port_list)
+                rcvd_ports = batch.run()                # ports in order of add()
+'''
+
+import logging
+import struct
+import time
+
+import ptf
+import ptf.packet as scapy
+
+from ptf.testutils import dp_poll
+from ptf.testutils import send_packet
+
+FLOW_ID_MAGIC = b'PTFFLOW#'
+FLOW_ID_FORMAT = '!I'
+FLOW_ID_LEN = len(FLOW_ID_MAGIC) + struct.calcsize(FLOW_ID_FORMAT)
+
+
+def get_flow_id(pkt):
+    '''
+    @summary: Find the flow identifier stamped into a received packet
+    @param pkt: raw packet
+    @return flow identifier or None for packets not sent by a FlowBatch
+    '''
+    pos = pkt.find(FLOW_ID_MAGIC)
+    if pos == -1 or pos + FLOW_ID_LEN > len(pkt):
+        return None
+    return struct.unpack(FLOW_ID_FORMAT, pkt[pos + len(FLOW_ID_MAGIC):pos + FLOW_ID_LEN])[0]
+
+
+class Flow(object):
+    def __init__(self, flow_id, src_port, pkt, masked_exp_pkt, exp_ports):
+        self.flow_id = flow_id
+        self.src_port = src_port
+        self.pkt = pkt
+        self.masked_exp_pkt = masked_exp_pkt
+        self.exp_ports = exp_ports
+        self.rcvd_port = None
+        self.unexpected = []
+
+
+class FlowBatch(object):
+    '''
+    @summary: Send flows back to back and match received packets by flow identifier
+    '''
+    DEFAULT_BATCH_SIZE = 256
+
+    def __init__(self, test, batch_size=DEFAULT_BATCH_SIZE, timeout=None, exp_src_mac=None, device_number=0):
+        '''
+        @param test: ptf test the packets are sent from
+        @param batch_size: number of flows sent before draining received packets
+        @param timeout: time to wait for the next packet of a batch to be received
+        @param exp_src_mac: function returning expected source mac of packets received on a port
+        '''
+        self.test = test
+        self.batch_size = batch_size
+        self.timeout = timeout if timeout is not None else ptf.ptfutils.default_timeout
+        self.exp_src_mac = exp_src_mac
+        self.device_number = device_number
+        self.next_flow_id = 0
+        self.flows = []
+
+    def stamp(self, *pkts):
+        '''
+        @summary: Stamp a new flow identifier into the TCP payload of the packets
+        The payload is overwritten in place so the packet length doesn't change.
+        It has to be called for the expected packet before it is masked.
+        @return the flow identifier
+        '''
+        flow_id = self.next_flow_id
+        self.next_flow_id += 1
+        tag = FLOW_ID_MAGIC + struct.pack(FLOW_ID_FORMAT, flow_id)
+        for pkt in pkts:
+            layer = pkt.getlayer(scapy.TCP)
+            load = bytes(layer.payload)
+            layer.remove_payload()
+            layer.add_payload(scapy.Raw(load=tag + load[len(tag):]))
+        return flow_id
+
+    def add(self, flow_id, src_port, pkt, masked_exp_pkt, exp_ports):
+        '''
+        @summary: Add a stamped flow to the batch
+        @param exp_ports: list of ports on which the packet is expected to come back from the switch
+        '''
+        self.flows.append(Flow(flow_id, src_port, pkt, masked_exp_pkt, exp_ports))
+
+    def __len__(self):
+        return len(self.flows)
+
+    def _send(self, flows):
+        self.test.dataplane.flush()
+        for flow in flows:
+            send_packet(self.test, flow.src_port, flow.pkt)
+
+    def _drain(self, pending, timeout):
+        # wait until every pending flow is received or nothing arrived for timeout
+        deadline = time.time() + timeout
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            result = dp_poll(self.test, device_number=self.device_number, timeout=remaining)
+            if not isinstance(result, self.test.dataplane.PollSuccess):
+                break
+            flow = pending.get(get_flow_id(result.packet))
+            if flow is None:
+                continue
+            deadline = time.time() + timeout
+            if result.port not in flow.exp_ports or \
+                    not ptf.dataplane.match_exp_pkt(flow.masked_exp_pkt, result.packet):
+                flow.unexpected.append(result.port)
+                continue
+            if self.exp_src_mac:
+                exp_src_mac = self.exp_src_mac(result.port)
+                actual_src_mac = scapy.Ether(result.packet).src
+                if exp_src_mac != actual_src_mac:
+                    raise Exception("Pkt of flow {} sent on port {} was rcvd on {} which is one of the expected ports, "
+                                    "but the src mac doesn't match, expected {}, got {}".
+                                    format(flow.flow_id, flow.src_port, result.port, exp_src_mac, actual_src_mac))
+            flow.rcvd_port = result.port
+            del pending[flow.flow_id]
+
+    def run(self, drop=False):
+        '''
+        @summary: Send all the flows of the batch and verify they are received
+        @param drop: verify that none of the flows is received instead
+        @return list of ports the flows were received on, in order the flows were added
+        '''
+        for start in range(0, len(self.flows), self.batch_size):
+            flows = self.flows[start:start + self.batch_size]
+            pending = dict([(flow.flow_id, flow) for flow in flows])
+            self._send(flows)
+            if drop:
+                self._drain(pending, ptf.ptfutils.default_negative_timeout)
+                rcvd = [flow for flow in flows if flow.flow_id not in pending]
+                if rcvd:
+                    self.test.fail("{} of {} flows expected to be dropped were received, e.g. flow {} sent on port {} "
+                                   "was received on port {}".format(len(rcvd), len(flows), rcvd[0].flow_id,
+                                                                    rcvd[0].src_port, rcvd[0].rcvd_port))
+                continue
+            self._drain(pending, self.timeout)
+            if pending:
+                flow = pending[min(pending)]
+                self.test.fail("{} of {} flows were not received on expected ports, e.g. flow {} sent on port {} "
+                               "expected on ports {}, received on unexpected ports {}".format(
+                                   len(pending), len(flows), flow.flow_id, flow.src_port, flow.exp_ports,
+                                   flow.unexpected))
+            logging.info("Received {} flows of batch {}".format(len(flows), start // self.batch_size))
+        rcvd_ports = [flow.rcvd_port for flow in self.flows]
+        self.flows = []
+        return rcvd_ports
@@ -25,6 +25,7 @@ from ptf.testutils import verify_packet_any_port
 
 import fib
 import lpm
+from flow_batch import FlowBatch
 
 class HashTest(BaseTest):
 
@@ -81,6 +82,14 @@ class HashTest(BaseTest):
 
         self.ignore_ttl = self.test_params.get('ignore_ttl', False)
         self.single_fib = self.test_params.get('single_fib_for_duts', False)
+        # send packets of up to batch_size flows back to back and match them when received
+        self.batch_size = self.test_params.get('batch_size', 0)
+
+    def new_flow_batch(self):
+        if not self.batch_size:
+            return None
+        return FlowBatch(self, batch_size=self.batch_size,
+                         exp_src_mac=lambda port: self.router_macs[self.ptf_test_port_map[str(port)]['target_dut']])
 
     def get_src_and_exp_ports(self, dst_ip):
         while True:
@@ -140,20 +149,29 @@ class HashTest(BaseTest):
             logging.info("hit count map: {}".format(hit_count_map))
             assert True if len(hit_count_map.keys()) == 1 else False
         else:
+            batch = self.new_flow_batch()
+            matched_ports = []
             for _ in range(0, self.balancing_test_times*len(exp_port_list)):
                 logging.info('Checking hash key {}, src_port={}, exp_ports={}, dst_ip={}'\
                     .format(hash_key, src_port, exp_port_list, dst_ip))
-                (matched_index, _) = self.check_ip_route(hash_key, src_port, dst_ip, exp_port_list)
+                (matched_index, _) = self.check_ip_route(hash_key, src_port, dst_ip, exp_port_list, batch)
+                matched_ports.append(matched_index)
+            if batch is not None:
+                matched_ports = batch.run()
+            for matched_index in matched_ports:
                 hit_count_map[matched_index] = hit_count_map.get(matched_index, 0) + 1
             logging.info("hash_key={}, hit count map: {}".format(hash_key, hit_count_map))
 
             self.check_balancing(next_hop.get_next_hop(), hit_count_map)
 
-    def check_ip_route(self, hash_key, src_port, dst_ip, dst_port_list):
+    def check_ip_route(self, hash_key, src_port, dst_ip, dst_port_list, batch=None):
         if ip_network(unicode(dst_ip)).version == 4:
-            (matched_index, received) = self.check_ipv4_route(hash_key, src_port, dst_port_list)
+            (matched_index, received) = self.check_ipv4_route(hash_key, src_port, dst_port_list, batch)
         else:
-            (matched_index, received) = self.check_ipv6_route(hash_key, src_port, dst_port_list)
+            (matched_index, received) = self.check_ipv6_route(hash_key, src_port, dst_port_list, batch)
+
+        if batch is not None:
+            return (None, None)
 
         assert received
 
@@ -177,12 +195,13 @@ class HashTest(BaseTest):
             if ip_proto not in skip_ports:
                 return ip_proto
 
-    def check_ipv4_route(self, hash_key, src_port, dst_port_list):
+    def check_ipv4_route(self, hash_key, src_port, dst_port_list, batch=None):
         '''
         @summary: Check IPv4 route works.
         @param hash_key: hash key to build packet with.
         @param src_port: index of port to use for sending packet to switch
         @param dst_port_list: list of ports on which to expect packet to come back from the switch
+        @param batch: FlowBatch to add the packet to instead of sending it
         '''
         base_mac = self.dataplane.get_mac(0, 0)
         ip_src = self.src_ip_interval.get_random_ip() if hash_key == 'src-ip' else self.src_ip_interval.get_first_ip()
@@ -219,6 +238,8 @@ class HashTest(BaseTest):
         if hash_key == 'ip-proto':
             pkt['IP'].proto = ip_proto
             exp_pkt['IP'].proto = ip_proto
+        if batch is not None:
+            flow_id = batch.stamp(pkt, exp_pkt)
         masked_exp_pkt = Mask(exp_pkt)
         masked_exp_pkt.set_do_not_care_scapy(scapy.Ether, "dst")
         # mask the chksum also if masking the ttl
@@ -228,6 +249,10 @@ class HashTest(BaseTest):
             masked_exp_pkt.set_do_not_care_scapy(scapy.TCP, "chksum")
         masked_exp_pkt.set_do_not_care_scapy(scapy.Ether, "src")
 
+        if batch is not None:
+            batch.add(flow_id, src_port, pkt, masked_exp_pkt, dst_port_list)
+            return (None, None)
+
         send_packet(self, src_port, pkt)
         logging.info('Sent Ether(src={}, dst={})/IP(src={}, dst={})/TCP(sport={}, dport={} on port {})'\
             .format(pkt.src,
@@ -254,12 +279,13 @@ class HashTest(BaseTest):
                             format(ip_src, ip_dst, src_port, dst_port_list[rcvd_port], exp_src_mac, actual_src_mac))
         return (rcvd_port, rcvd_pkt)
 
-    def check_ipv6_route(self, hash_key, src_port, dst_port_list):
+    def check_ipv6_route(self, hash_key, src_port, dst_port_list, batch=None):
         '''
         @summary: Check IPv6 route works.
         @param hash_key: hash key to build packet with.
         @param in_port: index of port to use for sending packet to switch
         @param dst_port_list: list of ports on which to expect packet to come back from the switch
+        @param batch: FlowBatch to add the packet to instead of sending it
         @return Boolean
         '''
         base_mac = self.dataplane.get_mac(0, 0)
@@ -297,6 +323,8 @@ class HashTest(BaseTest):
         if hash_key == 'ip-proto':
             pkt['IPv6'].nh = ip_proto
             exp_pkt['IPv6'].nh = ip_proto
+        if batch is not None:
+            flow_id = batch.stamp(pkt, exp_pkt)
 
         masked_exp_pkt = Mask(exp_pkt)
         masked_exp_pkt.set_do_not_care_scapy(scapy.Ether,"dst")
@@ -307,6 +335,10 @@ class HashTest(BaseTest):
             masked_exp_pkt.set_do_not_care_scapy(scapy.TCP, "chksum")
         masked_exp_pkt.set_do_not_care_scapy(scapy.Ether, "src")
 
+        if batch is not None:
+            batch.add(flow_id, src_port, pkt, masked_exp_pkt, dst_port_list)
+            return (None, None)
+
         send_packet(self, src_port, pkt)
         logging.info('Sent Ether(src={}, dst={})/IPv6(src={}, dst={})/TCP(sport={}, dport={} on port {})'\
             .format(pkt.src,
@@ -1,6 +1,13 @@
 import random
-
-from ipaddress import ip_address, ip_network
+import socket
+import struct
+from bisect import bisect_right
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
+from ipaddress import ip_address, IPv4Address, IPv6Address
 from SubnetTree import SubnetTree
 
 '''
@@ -21,6 +28,11 @@ this range.
 To achieve the LPM functionality, use the LpmDict as a dictionary and use
 [] operator to get the corresponding value using the key (IP).
 
+For large tables use bulk_load() to insert all the prefixes at once. The
+boundaries are kept as integers and the sorted boundary array is cached until
+the table changes. ranges() returns an IpRanges sequence backed by this array,
+IpInterval objects are only created for the ranges which are accessed.
+
 Please check the test_lpm.py file to see the details of how this class works.
 '''
 class LpmDict():
@@ -54,55 +66,143 @@ class LpmDict():
         def __str__(self):
             return str(self._start) + ' - ' + str(self._end)
 
+    class IpRanges(Sequence):
+        """
+        Sequence of the IP ranges of LpmDict backed by the sorted boundaries.
+        Slicing returns a view on the same boundaries, adding it to a list
+        returns a list.
+        """
+        def __init__(self, boundaries, ipv4=True, start=0, stop=None):
+            self._boundaries = boundaries
+            self._ipv4 = ipv4
+            self._start = start
+            self._stop = len(boundaries) if stop is None else stop
+            self._max = LpmDict.MAX_IPV4 if ipv4 else LpmDict.MAX_IPV6
+            self._address = IPv4Address if ipv4 else IPv6Address
+
+        def __len__(self):
+            return self._stop - self._start
+
+        def _bounds(self, index):
+            index += self._start
+            start = self._boundaries[index]
+            if index + 1 < len(self._boundaries):
+                return start, self._boundaries[index + 1] - 1
+            return start, self._max
+
+        def __getitem__(self, index):
+            if isinstance(index, slice):
+                start, stop, step = index.indices(len(self))
+                if step != 1:
+                    return [self[i] for i in range(start, stop, step)]
+                stop = max(start, stop)
+                return LpmDict.IpRanges(self._boundaries, self._ipv4, self._start + start, self._start + stop)
+            if index < 0:
+                index += len(self)
+            if index < 0 or index >= len(self):
+                raise IndexError('range index out of range')
+            start, end = self._bounds(index)
+            return LpmDict.IpInterval(self._address(start), self._address(end))
+
+        def __iter__(self):
+            for index in range(len(self)):
+                yield self[index]
+
+        def __add__(self, other):
+            return list(self) + list(other)
+
+        def __radd__(self, other):
+            return list(other) + list(self)
+
+        def index_of(self, ip):
+            """
+            Index of the range containing the IP address.
+            """
+            index = bisect_right(self._boundaries, int(ip_address(unicode(ip))), self._start, self._stop) - 1
+            if index < self._start:
+                raise ValueError('{} is not in ranges'.format(ip))
+            return index - self._start
+
+        def get_random_ip(self, index):
+            start, end = self._bounds(index)
+            return str(self._address(random.randint(start, end)))
+
+    MAX_IPV4 = (1 << 32) - 1
+    MAX_IPV6 = (1 << 128) - 1
+
+    @staticmethod
+    def parse_prefix(prefix):
+        """
+        Parse prefix string into a tuple of (version, first address, last address)
+        with the addresses as integers.
+        """
+        addr, _, prefixlen = prefix.partition('/')
+        if ':' in addr:
+            high, low = struct.unpack('!QQ', socket.inet_pton(socket.AF_INET6, addr))
+            value, bits = (high << 64) | low, 128
+        else:
+            value, bits = struct.unpack('!I', socket.inet_aton(addr))[0], 32
+        prefixlen = int(prefixlen) if prefixlen else bits
+        host_mask = (1 << (bits - prefixlen)) - 1
+        first = value & ~host_mask
+        return (4 if bits == 32 else 6), first, first | host_mask
+
     def __init__(self, ipv4=True):
         self._ipv4 = ipv4
         self._prefix_set = set()
         self._subnet_tree = SubnetTree()
+        self._max = self.MAX_IPV4 if ipv4 else self.MAX_IPV6
         # 0.0.0.0 is a non-routable meta-address that needs to be skipped
-        self._boundaries = { ip_address(u'0.0.0.0') : 1} if ipv4 else { ip_address(u'::') : 1}
+        self._boundaries = {0: 1}
+        self._ranges = None
+
+    def _add_boundaries(self, first, last):
+        self._boundaries[first] = self._boundaries.get(first, 0) + 1
+        if last != self._max:
+            self._boundaries[last + 1] = self._boundaries.get(last + 1, 0) + 1
 
     def __setitem__(self, key, value):
-        prefix = ip_network(unicode(key))
+        _, first, last = self.parse_prefix(key)
         # add the current key to self._prefix_set only when it is not the default route and it is not a duplicate key
-        if prefix.prefixlen and key not in self._prefix_set:
-            boundary = prefix[0]
-            self._boundaries[boundary] = self._boundaries.get(boundary, 0) + 1
-            if prefix[-1] != ip_address(u'255.255.255.255') and prefix[-1] != ip_address(u'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff'):
-                next_boundary = prefix[-1] + 1
-                self._boundaries[next_boundary] = self._boundaries.get(next_boundary, 0) + 1
+        if (first, last) != (0, self._max) and key not in self._prefix_set:
+            self._add_boundaries(first, last)
             self._prefix_set.add(key)
+            self._ranges = None
         self._subnet_tree.__setitem__(key, value)
 
+    def bulk_load(self, entries):
+        """
+        Insert list of (prefix, value) entries.
+        """
+        for key, value in entries:
+            if key not in self._prefix_set:
+                _, first, last = self.parse_prefix(key)
+                if (first, last) != (0, self._max):
+                    self._add_boundaries(first, last)
+                    self._prefix_set.add(key)
+            self._subnet_tree[key] = value
+        self._ranges = None
+
     def __getitem__(self, key):
         return self._subnet_tree[key]
 
     def __delitem__(self, key):
         if '/0' not in key:
-            prefix = ip_network(unicode(key))
-            boundary = prefix[0]
-            next_boundary = prefix[-1] + 1
-            self._boundaries[boundary] = self._boundaries.get(boundary) - 1
-            if not self._boundaries[boundary]:
-                del self._boundaries[boundary]
-            self._boundaries[next_boundary] = self._boundaries.get(next_boundary) - 1
-            if not self._boundaries[next_boundary]:
-                del self._boundaries[next_boundary]
+            _, first, last = self.parse_prefix(key)
+            for boundary in (first, last + 1):
+                if boundary not in self._boundaries:
+                    continue
+                self._boundaries[boundary] = self._boundaries.get(boundary) - 1
+                if not self._boundaries[boundary]:
+                    del self._boundaries[boundary]
             self._prefix_set.remove(key)
+            self._ranges = None
         self._subnet_tree.__delitem__(key)
 
     def ranges(self):
-        sorted_boundaries = sorted(self._boundaries.keys())
-        ranges = []
-        for index, boundary in enumerate(sorted_boundaries):
-            if index != len(sorted_boundaries) - 1:
-                interval = self.IpInterval(sorted_boundaries[index], sorted_boundaries[index + 1] - 1)
-            else:
-                if self._ipv4:
-                    interval = self.IpInterval(sorted_boundaries[index], ip_address(u'255.255.255.255'))
-                else:
-                    interval = self.IpInterval(sorted_boundaries[index], ip_address(u'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff'))
-            ranges.append(interval)
-        return ranges
+        if self._ranges is None:
+            self._ranges = self.IpRanges(sorted(self._boundaries), self._ipv4)
+        return self._ranges
 
     def contains(self, key):
         return key in self._subnet_tree
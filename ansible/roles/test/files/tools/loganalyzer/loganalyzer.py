@@ -16,10 +16,13 @@ Usage:          Examples of how to use log analyzer
 #---------------------------------------------------------------------
 # Global imports
 #---------------------------------------------------------------------
+import os
 import sys
 import getopt
 import re
+import string
 import csv
+import json
 import pprint
 import logging
 import logging.handlers
@@ -31,6 +34,8 @@ from __builtin__ import True
 tokenizer = ','
 comment_key = '#'
 system_log_file = '/var/log/syslog'
+#-- Size of the blocks read backward from the end of analyzed log files
+read_block_size = 1024 * 1024
 
 #-- List of ERROR codes to be returned by AnsibleLogAnalyzer
 err_duplicate_start_marker = -1
@@ -248,6 +253,208 @@ class AnsibleLogAnalyzer:
         return regex, messages_regex
     #---------------------------------------------------------------------
 
+    def split_regex_alternatives(self, regex):
+        '''
+        @summary: Split regular expression by the top level alternation operator.
+
+        @param regex: regular expression string.
+
+        @return: List of alternatives.
+        '''
+        alternatives = []
+        depth = 0
+        in_class = False
+        start = 0
+        idx = 0
+        while idx < len(regex):
+            char = regex[idx]
+            if char == '\\':
+                idx += 1
+            elif in_class:
+                if char == ']':
+                    in_class = False
+            elif char == '[':
+                in_class = True
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif char == '|' and depth == 0:
+                alternatives.append(regex[start:idx])
+                start = idx + 1
+            idx += 1
+        alternatives.append(regex[start:])
+        return alternatives
+    #---------------------------------------------------------------------
+
+    def escape_end(self, regex, idx):
+        '''
+        @summary: Find the last character of an escape sequence.
+
+        @param regex: regular expression string.
+        @param idx: index of the character following the backslash.
+
+        @return: Index of the last character of the escape sequence.
+        '''
+        char = regex[idx]
+        if char == 'N' and regex[idx + 1:idx + 2] == '{':
+            end = regex.find('}', idx)
+            return len(regex) - 1 if end == -1 else end
+        if char in 'xuU':
+            digits, allowed = {'x': 2, 'u': 4, 'U': 8}[char], string.hexdigits
+        elif char.isdigit():
+            #-- octal code or back reference
+            digits, allowed = 2, string.digits
+        else:
+            return idx
+        end = idx
+        while end + 1 < len(regex) and end - idx < digits and regex[end + 1] in allowed:
+            end += 1
+        return end
+    #---------------------------------------------------------------------
+
+    def required_literal(self, regex):
+        '''
+        @summary: Find the longest literal string which must be present in any
+                  string matching the regular expression.
+                  Expressions containing groups, classes or alternations are
+                  not inspected.
+
+        @param regex: regular expression string.
+
+        @return: Literal string or None if it can't be determined.
+        '''
+        if '(' in regex or '[' in regex or '|' in regex:
+            return None
+
+        runs = []
+        run = ''
+        last_is_literal = False
+        idx = 0
+        while idx < len(regex):
+            char = regex[idx]
+            if char == '\\' and idx + 1 < len(regex):
+                idx += 1
+                if regex[idx].isalnum():
+                    #-- character class, anchor, back reference or character code,
+                    #-- the digits and name of a code are part of the escape
+                    runs.append(run)
+                    run = ''
+                    last_is_literal = False
+                    idx = self.escape_end(regex, idx)
+                else:
+                    run += regex[idx]
+                    last_is_literal = True
+            elif char in '*?{':
+                #-- previous character is optional
+                if last_is_literal:
+                    run = run[:-1]
+                runs.append(run)
+                run = ''
+                last_is_literal = False
+                if char == '{':
+                    end = regex.find('}', idx)
+                    idx = len(regex) if end == -1 else end
+            elif char == '+':
+                runs.append(run)
+                run = ''
+                last_is_literal = False
+            elif char in '.^$':
+                runs.append(run)
+                run = ''
+                last_is_literal = False
+            else:
+                run += char
+                last_is_literal = True
+            idx += 1
+        runs.append(run)
+
+        literal = max(runs, key=len)
+        return literal if literal else None
+    #---------------------------------------------------------------------
+
+    def create_prefilter(self, messages_regex):
+        '''
+        @summary: Build a cheap check which rejects most of the lines before
+                  they are matched against the full set of regular expressions.
+
+        @param messages_regex: regex class instance to build prefilter for.
+
+        @return: Compiled alternation of required literals or None if some
+            of the expressions have no required literal.
+        '''
+        if messages_regex is None:
+            return None
+
+        literals = []
+        for alternative in self.split_regex_alternatives(messages_regex.pattern):
+            literal = self.required_literal(alternative)
+            if literal is None:
+                return None
+            if literal not in literals:
+                literals.append(literal)
+
+        return re.compile('|'.join(map(re.escape, literals)))
+    #---------------------------------------------------------------------
+
+    def create_line_regex(self, messages_regex):
+        '''
+        @summary: Strip leading and trailing '.*' from the alternatives of the
+                  regular expression. Such expressions match a single line
+                  exactly when the stripped ones do, but searching with a
+                  leading '.*' backtracks over the whole line at every position.
+
+        @param messages_regex: regex class instance to optimize.
+
+        @return: regex class instance to search single lines with.
+        '''
+        if messages_regex is None:
+            return None
+
+        alternatives = []
+        for alternative in self.split_regex_alternatives(messages_regex.pattern):
+            while alternative.startswith('.*') and not alternative.startswith('.*?'):
+                alternative = alternative[2:]
+            while (alternative.endswith('.*')
+                   and (len(alternative) - len(alternative[:-2].rstrip('\\'))) % 2 == 0):
+                alternative = alternative[:-2]
+            alternatives.append(alternative)
+
+        pattern = '|'.join(alternatives)
+        if pattern == messages_regex.pattern:
+            return messages_regex
+        return re.compile(pattern, messages_regex.flags)
+    #---------------------------------------------------------------------
+
+    def read_lines_reversed(self, log_file, block_size=None):
+        '''
+        @summary: Read lines of the file starting from the end, loading
+                  only one block of the file at a time.
+
+        @param log_file: File object opened for reading.
+
+        @param block_size: Number of bytes read from file at a time.
+
+        @return: Generator of lines, last line first.
+        '''
+        block_size = block_size or read_block_size
+        log_file.seek(0, os.SEEK_END)
+        position = log_file.tell()
+        remainder = ''
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            log_file.seek(position)
+            lines = (log_file.read(size) + remainder).split('\n')
+            if len(lines) > 1 and lines[-1]:
+                yield lines[-1]
+            for idx in range(len(lines) - 2, 0, -1):
+                yield lines[idx] + '\n'
+            remainder = lines[0] + '\n' if len(lines) > 1 else lines[0]
+        if remainder:
+            yield remainder
+    #---------------------------------------------------------------------
+
     def line_matches(self, str, match_messages_regex, ignore_messages_regex):
         '''
         @summary: This method checks whether given string matches against the
@@ -269,11 +476,11 @@ class AnsibleLogAnalyzer:
 
         ret_code = False
 
-        if ((match_messages_regex is not None) and (match_messages_regex.findall(str))):
+        if ((match_messages_regex is not None) and (match_messages_regex.search(str))):
             if (ignore_messages_regex is None):
                 ret_code = True
 
-            elif (not ignore_messages_regex.findall(str)):
+            elif (not ignore_messages_regex.search(str)):
                 self.print_diagnostic_message('matching line: %s' % str)
                 ret_code = True
 
@@ -287,7 +494,7 @@ class AnsibleLogAnalyzer:
         '''
 
         ret_code = False
-        if (expect_messages_regex is not None) and (expect_messages_regex.findall(str)):
+        if (expect_messages_regex is not None) and (expect_messages_regex.search(str)):
             ret_code = True
 
         return ret_code
@@ -325,15 +532,27 @@ class AnsibleLogAnalyzer:
         expected_lines = []
         found_start_marker = False
         found_end_marker = False
+        #-- stdin can't be read backward, its lines are analyzed in order
+        #-- and the results are reversed at the end
         if stdin_as_input:
             log_file = sys.stdin
+            log_lines = log_file
         else:
             log_file = open(log_file_path, 'r')
+            log_lines = self.read_lines_reversed(log_file)
 
         start_marker = self.create_start_marker()
         end_marker = self.create_end_marker()
 
-        for rev_line in reversed(log_file.readlines()):
+        #-- lines not containing any of the required literals are skipped
+        #-- without running the full set of regular expressions
+        match_prefilter = self.create_prefilter(match_messages_regex)
+        expect_prefilter = self.create_prefilter(expect_messages_regex)
+        match_messages_regex = self.create_line_regex(match_messages_regex)
+        ignore_messages_regex = self.create_line_regex(ignore_messages_regex)
+        expect_messages_regex = self.create_line_regex(expect_messages_regex)
+
+        for rev_line in log_lines:
             if stdin_as_input:
                 in_analysis_range = True
             else:
@@ -365,12 +584,20 @@ class AnsibleLogAnalyzer:
                 # without much insight while they are time consuming to analyze
                 if is_sairedis_rec and len(rev_line) > 1000:
                     continue
-                if self.line_is_expected(rev_line, expect_messages_regex):
+                if ((expect_prefilter is None or expect_prefilter.search(rev_line))
+                        and self.line_is_expected(rev_line, expect_messages_regex)):
                     expected_lines.append(rev_line)
 
-                elif self.line_matches(rev_line, match_messages_regex, ignore_messages_regex):
+                elif ((match_prefilter is None or match_prefilter.search(rev_line))
+                        and self.line_matches(rev_line, match_messages_regex, ignore_messages_regex)):
                     matching_lines.append(rev_line)
 
+        if stdin_as_input:
+            matching_lines.reverse()
+            expected_lines.reverse()
+        else:
+            log_file.close()
+
         # care about the markers only if input is not stdin or sairedis recording
         if not stdin_as_input and not is_sairedis_rec:
             if (not found_start_marker):
@@ -425,6 +652,8 @@ def usage():
     print '                                 to all log files specified in --logs parameter.'
     print '                                 analyze - perform log analysis of files specified in --logs parameter.'
     print '                                 add_end_marker - add end marker to all log files specified in --logs parameter.'
+    print '                                 analyze_files - analyze files specified in --logs parameter with regular'
+    print '                                 expressions from --regex_file and print matched lines as JSON.'
     print '--out_dir path                   Directory path where to place output files, '
     print '                                 must be present when --action == analyze'
     print '--logs path{,path}               List of full paths to log files to be analyzed.'
@@ -443,10 +672,12 @@ def usage():
     print '                                 All the strings from these files will be expected to present'
     print '                                 in one of specified log files during the analysis. Must be present'
     print '                                 when action == analyze.'
+    print '--regex_file path                JSON file with "match", "ignore" and "expect" lists of regular expressions.'
+    print '                                 Must be present when action == analyze_files.'
 
 #---------------------------------------------------------------------
 
-def check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in, expect_files_in):
+def check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in, expect_files_in, regex_file=None):
     '''
     @summary: This function validates command line parameter 'action' and
         other related parameters.
@@ -469,6 +700,14 @@ def check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in,
             print 'ERROR: missing required match_files_in for analyze action'
             ret_code = False
 
+    elif (action == 'analyze_files'):
+        if log_files_in is None or len(log_files_in) == 0:
+            print 'ERROR: missing required logs for analyze_files action'
+            ret_code = False
+
+        elif regex_file is None or len(regex_file) == 0:
+            print 'ERROR: missing required regex_file for analyze_files action'
+            ret_code = False
 
     else:
         ret_code = False
@@ -586,6 +825,19 @@ def write_summary_file(run_id, out_dir, analysis_result_per_file, unused_regex_m
     out_file.close()
 #---------------------------------------------------------------------
 
+def compile_regex_list(messages_regex):
+    '''
+    @summary: Compile list of regular expressions into one regular expression.
+
+    @param messages_regex: List of regular expression strings.
+
+    @return: regex class instance or None if list is empty.
+    '''
+    if not messages_regex:
+        return None
+    return re.compile('|'.join(messages_regex))
+#---------------------------------------------------------------------
+
 def main(argv):
 
     action = None
@@ -596,10 +848,11 @@ def main(argv):
     match_files_in = None
     ignore_files_in = None
     expect_files_in = None
+    regex_file = None
     verbose = False
 
     try:
-        opts, args = getopt.getopt(argv, "a:r:s:l:o:m:i:e:vh", ["action=", "run_id=", "start_marker=", "logs=", "out_dir=", "match_files_in=", "ignore_files_in=", "expect_files_in=", "verbose", "help"])
+        opts, args = getopt.getopt(argv, "a:r:s:l:o:m:i:e:j:vh", ["action=", "run_id=", "start_marker=", "logs=", "out_dir=", "match_files_in=", "ignore_files_in=", "expect_files_in=", "regex_file=", "verbose", "help"])
 
     except getopt.GetoptError:
         print "Invalid option specified"
@@ -635,10 +888,13 @@ def main(argv):
         elif (opt in ("-e", "--expect_files_in")):
             expect_files_in = arg
 
+        elif (opt in ("-j", "--regex_file")):
+            regex_file = arg
+
         elif (opt in ("-v", "--verbose")):
             verbose = True
 
-    if not (check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in, expect_files_in) and check_run_id(run_id)):
+    if not (check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in, expect_files_in, regex_file) and check_run_id(run_id)):
         usage()
         sys.exit(err_invalid_input)
 
@@ -673,6 +929,18 @@ def main(argv):
     elif (action == "add_end_marker"):
         analyzer.place_marker(log_file_list, analyzer.create_end_marker())
         return 0
+    elif (action == "analyze_files"):
+        with open(regex_file) as regex_fp:
+            regex_sets = json.load(regex_fp)
+
+        match_messages_regex = compile_regex_list(regex_sets.get("match"))
+        ignore_messages_regex = compile_regex_list(regex_sets.get("ignore"))
+        expect_messages_regex = compile_regex_list(regex_sets.get("expect"))
+
+        result = analyzer.analyze_file_list(log_file_list, match_messages_regex,
+                                            ignore_messages_regex, expect_messages_regex)
+        print json.dumps(result)
+        return 0
 
     else:
         print 'Unknown action:%s specified' % action
@@ -0,0 +1,131 @@
+'''
+Description:    Benchmark of the log analyzer on a synthetic syslog.
+
+                Generates a syslog of the requested size with start/end markers
+                around most of its content and measures time and peak memory
+                of the streaming analyzer compared with the former approach of
+                reading the whole file with readlines().
+
+Usage:          python loganalyzer_benchmark.py --size_mb 1024 --file /tmp/syslog.bench
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import subprocess
+
+from loganalyzer import AnsibleLogAnalyzer
+
+RUN_ID = 'benchmark'
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MATCH_FILE = os.path.join(BASE_DIR, 'loganalyzer_common_match.txt')
+IGNORE_FILE = os.path.join(BASE_DIR, 'loganalyzer_common_ignore.txt')
+
+MESSAGES = [
+    'INFO swss#orchagent: :- doTask: Set port Ethernet{0} admin status to up',
+    'NOTICE syncd#syncd: :- processEvent: port oper status changed, port id 0x{0:x}',
+    'INFO bgp#bgpd[39]: %ADJCHANGE: neighbor 10.0.0.{1} Up',
+    'INFO lldp#lldpd[27]: sending LLDP PDU to Ethernet{0}',
+    'DEBUG pmon#xcvrd: Reading eeprom of port Ethernet{0}',
+    'ERR snmp#snmp-subagent [ax_interface] ERROR: MIBUpdater.subprocess error {0}',
+    'ERR swss#orchagent: :- addRoute: Failed to create route 192.168.{1}.0/24',
+]
+
+
+def generate(path, size_mb):
+    analyzer = AnsibleLogAnalyzer(RUN_ID, False)
+    size = size_mb * 1024 * 1024
+    written = 0
+    count = 0
+    with open(path, 'w') as log_file:
+        log_file.write('Oct 18 00:00:00.000000 dut INFO {}\n'.format(analyzer.create_start_marker()))
+        while written < size:
+            count += 1
+            line = 'Oct 18 00:00:00.{:06d} dut {}\n'.format(
+                count % 1000000, random.choice(MESSAGES).format(count % 512, count % 250))
+            log_file.write(line)
+            written += len(line)
+        log_file.write('Oct 18 00:00:01.000000 dut INFO {}\n'.format(analyzer.create_end_marker()))
+    return count
+
+
+def regex_sets(analyzer):
+    match_regex = analyzer.create_msg_regex([MATCH_FILE])[0]
+    ignore_regex = analyzer.create_msg_regex([IGNORE_FILE])[0]
+    return match_regex, ignore_regex
+
+
+def run_streaming(path):
+    analyzer = AnsibleLogAnalyzer(RUN_ID, False)
+    match_regex, ignore_regex = regex_sets(analyzer)
+    matching_lines, _ = analyzer.analyze_file(path, match_regex, ignore_regex, None)
+    return len(matching_lines)
+
+
+def run_readlines(path):
+    analyzer = AnsibleLogAnalyzer(RUN_ID, False)
+    match_regex, ignore_regex = regex_sets(analyzer)
+    end_marker = analyzer.create_end_marker()
+    start_marker = analyzer.create_start_marker()
+    matching_lines = []
+    in_analysis_range = False
+    with open(path, 'r') as log_file:
+        for rev_line in reversed(log_file.readlines()):
+            if rev_line.find(end_marker) != -1:
+                in_analysis_range = True
+                continue
+            if rev_line.find(start_marker) != -1:
+                break
+            if in_analysis_range and match_regex.findall(rev_line) and not ignore_regex.findall(rev_line):
+                matching_lines.append(rev_line)
+    return len(matching_lines)
+
+
+def run_mode(mode, path):
+    start = time.time()
+    matches = run_streaming(path) if mode == 'streaming' else run_readlines(path)
+    elapsed = time.time() - start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print('{} {} {:.3f} {}'.format(mode, matches, elapsed, max_rss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Log analyzer benchmark')
+    parser.add_argument('--size_mb', type=int, default=1024, help='Size of synthetic syslog in MB')
+    parser.add_argument('--file', default='/tmp/syslog.loganalyzer.benchmark', help='Synthetic syslog path')
+    parser.add_argument('--modes', default='streaming,readlines', help='Comma separated analyzers to run')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated syslog')
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.file)
+        return 0
+
+    print('Generating {} MB syslog {}'.format(args.size_mb, args.file))
+    lines = generate(args.file, args.size_mb)
+    size_mb = os.path.getsize(args.file) / (1024.0 * 1024.0)
+
+    print('{:>10} {:>10} {:>10} {:>10} {:>12}'.format('mode', 'matches', 'seconds', 'MB/s', 'max RSS(KB)'))
+    try:
+        for mode in args.modes.split(','):
+            # run every analyzer in its own process to get its own peak memory
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                              '--mode', mode, '--file', args.file])
+            mode, matches, elapsed, max_rss = output.decode().split()
+            print('{:>10} {:>10} {:>10} {:>10.1f} {:>12}'.format(
+                mode, matches, elapsed, size_mb / max(float(elapsed), 0.001), max_rss))
+    finally:
+        if not args.keep:
+            os.remove(args.file)
+    print('Analyzed {} lines'.format(lines))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
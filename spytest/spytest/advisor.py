@@ -0,0 +1,88 @@
+"""
+Parallelization advisor
+
+Reads the canbe_parallel CSV files of a run, the identical commands issued
+one after another on different DUTs from the main thread, groups them into
+serial sequences and ranks their call sites by the wall clock time which
+would be saved by running the sequence through st.exec_each/st.exec_all:
+the sum of the command times less the longest one.
+
+Usage: python advisor.py <logs path or canbe_parallel csv> [report csv]
+"""
+
+import os
+import sys
+import csv
+from collections import OrderedDict
+
+from tabulate import tabulate
+
+canbe_parallel_cols = ["Module", "Function", "Site", "Id", "DUT", "Previous DUT",
+                       "Time (ms)", "Previous Time (ms)", "Command"]
+report_cols = ["Module", "Site", "Sequences", "DUTs", "Serial (ms)", "Parallel (ms)", "Saving (ms)", "Command"]
+
+def find_files(path):
+    if not os.path.isdir(path):
+        return [path]
+    retval = []
+    for dirpath, _, filenames in os.walk(path):
+        for filename in sorted(filenames):
+            if filename.endswith("canbe_parallel.csv"):
+                retval.append(os.path.join(dirpath, filename))
+    return retval
+
+class Advisor(object):
+
+    def __init__(self, filepaths):
+        self.sequences = []
+        for filepath in filepaths:
+            self.load(filepath)
+
+    def load(self, filepath):
+        last = None
+        with open(filepath, 'r') as fd:
+            for row in csv.DictReader(fd):
+                pid = int(row["Id"])
+                key = (row["Module"], row["Function"], row["Command"])
+                # the next DUT of the same sequence is the next command
+                if last and last[0] == key and last[1] == pid - 1:
+                    seq = last[2]
+                else:
+                    seq = [row["Module"], row["Site"], row["Command"], [int(row["Previous Time (ms)"])]]
+                    self.sequences.append(seq)
+                seq[3].append(int(row["Time (ms)"]))
+                last = [key, pid, seq]
+
+    def sites(self):
+        sites = OrderedDict()
+        for [module, site, cmd, times] in self.sequences:
+            key = (module, site)
+            if key not in sites:
+                sites[key] = [module, site, 0, 0, 0, 0, 0, cmd]
+            entry = sites[key]
+            entry[2] = entry[2] + 1
+            entry[3] = max(entry[3], len(times))
+            entry[4] = entry[4] + sum(times)
+            entry[5] = entry[5] + max(times)
+            entry[6] = entry[6] + sum(times) - max(times)
+        return sites.values()
+
+    def report(self):
+        # modules with the most to save first and their sites ranked the same way
+        modules = OrderedDict()
+        for row in self.sites():
+            modules.setdefault(row[0], []).append(row)
+        rows = []
+        for module in sorted(modules, key=lambda m: sum([r[6] for r in modules[m]]), reverse=True):
+            rows.extend(sorted(modules[module], key=lambda r: r[6], reverse=True))
+        return rows
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "."
+    rows = Advisor(find_files(path)).report()
+    print(tabulate(rows, headers=report_cols, tablefmt="psql"))
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as fd:
+            writer = csv.writer(fd)
+            writer.writerow(report_cols)
+            writer.writerows(rows)
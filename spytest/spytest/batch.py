@@ -4,6 +4,7 @@ import sys
 import csv
 import shutil
 import logging
+import datetime
 from random import randint
 from random import Random
 from operator import itemgetter
@@ -220,6 +221,10 @@ def save_report():
     align = {col: True for col in ["Module", "Function", "TestCase", "Nodes"]}
     utils.write_html_table3(header, rows, filepath, align=align, total=False)
 
+    # show estimated completion
+    if isinstance(wa.sched, SpyTestScheduling):
+        wa.sched.save_eta()
+
 def report(op, nodeid, node_name):
     if op == "load":
         wa.executed[nodeid] = ["", "Pending"]
@@ -252,6 +257,68 @@ def report(op, nodeid, node_name):
 def shutdown():
     pass
 
+def get_durations_file():
+    # relative to the user root, which unlike the logs path is kept across runs
+    filepath = env.get("SPYTEST_BATCH_DURATIONS_FILE", "batch_durations.csv")
+    if not filepath:
+        return None
+    user_root = env.get("SPYTEST_USER_ROOT", os.getcwd())
+    return os.path.join(user_root, filepath)
+
+def seconds_format(seconds):
+    return utils.time_format(int(max(seconds, 0)))
+
+class SpyTestDurations(object):
+    """
+    execution time of the modules in previous runs
+    saved as csv rows of module name, average duration in seconds, functions and runs
+    """
+    header = ["Module", "Duration", "Functions", "Runs"]
+    default_function_time = 60
+    smoothing = 0.5
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.modules = SpyTestDict()
+        for row in utils.read_csv(filepath) if filepath else []:
+            if len(row) < 4 or row[0] == self.header[0]: continue
+            try: self.modules[row[0]] = [float(row[1]), int(row[2]), int(row[3])]
+            except Exception: continue
+        (duration, functions) = (0, 0)
+        for [mduration, mfunctions, _] in self.modules.values():
+            duration, functions = duration + mduration, functions + mfunctions
+        if functions:
+            self.function_time = duration / functions
+        else:
+            self.function_time = self.default_function_time
+
+    def predict(self, mname, functions):
+        # modules not executed before are estimated from average function duration
+        if mname in self.modules:
+            return self.modules[mname][0]
+        return functions * self.function_time
+
+    def update(self, mname, duration, functions):
+        if mname in self.modules:
+            [old, _, runs] = self.modules[mname]
+            duration = old + self.smoothing * (duration - old)
+            self.modules[mname] = [duration, functions, runs + 1]
+        else:
+            self.modules[mname] = [duration, functions, 1]
+
+    def save(self):
+        if not self.filepath: return
+        rows = []
+        for mname, [duration, functions, runs] in self.modules.items():
+            rows.append([mname, "{:.1f}".format(duration), functions, runs])
+        # write to temporary file so that the concurrent runs never read partial file
+        tmp_file = "{}.{}".format(self.filepath, os.getpid())
+        try:
+            utils.write_csv_file(self.header, rows, tmp_file)
+            os.rename(tmp_file, self.filepath)
+        except Exception as exp:
+            warn("failed to save module durations {}".format(exp))
+
 class SpyTestScheduling(object):
     def __init__(self, config, wa, log=None):
         self.config = config
@@ -275,6 +342,15 @@ class SpyTestScheduling(object):
         self.max_order = self.default_order
         self._load_buckets()
 
+        # longest processing time first scheduling based on durations of previous runs
+        self.lpt_support = bool(env.get("SPYTEST_BATCH_LPT_SCHEDULING", "1") != "0")
+        self.durations = SpyTestDurations(get_durations_file())
+        self.item_modules = {}
+        self.module_progress = SpyTestDict()
+        self.node_running = SpyTestDict()
+        self.start_time = None
+        self.predicted_makespan = None
+
         self.test_spytest_infra_first = None
         self.test_spytest_infra_second = None
         self.test_spytest_infra_last = None
@@ -425,6 +501,16 @@ class SpyTestScheduling(object):
         report("save", "", "")
         self.update_matching_modes(self.main_modules, True)
 
+        # track the completion of main modules to learn their durations
+        for mname, minfo in self.main_modules.items():
+            self.module_progress[mname] = [len(minfo.node_indexes), 0, len(minfo.node_indexes)]
+            for item_index in minfo.node_indexes:
+                self.item_modules[item_index] = mname
+        self.start_time = get_timenow()
+        [self.predicted_makespan, node_free] = self.estimate_remaining()
+        msg = "Predicted makespan {} with {} nodes"
+        trace(msg.format(seconds_format(self.predicted_makespan), len(node_free)))
+
     def find_active_nodes(self, names):
         active = []
         for name in names:
@@ -569,10 +655,88 @@ class SpyTestScheduling(object):
 
         return retval
 
+    def predict(self, mname, modules=None):
+        minfo = (modules or self.main_modules).get(mname)
+        functions = len(minfo.node_indexes) if minfo else 0
+        return self.durations.predict(mname, functions)
+
+    def _module_complete(self, item_index, duration):
+        mname = self.item_modules.pop(item_index, None)
+        if mname not in self.module_progress: return
+        progress = self.module_progress[mname]
+        progress[0] = progress[0] - 1
+        progress[1] = progress[1] + (duration or 0)
+        if progress[0] > 0: return
+        functions = progress[2]
+        predicted = self.durations.predict(mname, functions)
+        msg = "Module {} completed in {} predicted {}"
+        debug(msg.format(mname, seconds_format(progress[1]), seconds_format(predicted)))
+        self.durations.update(mname, progress[1], functions)
+        self.durations.save()
+        for modules in self.node_running.values():
+            if mname in modules:
+                modules.remove(mname)
+
+    def estimate_remaining(self):
+        """
+        simulate the scheduling of the pending modules in longest processing time first order
+        on the active nodes, which become free after the modules already assigned to them
+        returns the estimated remaining time and the estimated remaining time of each node
+        """
+        node_free = SpyTestDict()
+        for name, slave in wa.slaves.items():
+            if slave.excluded or slave.completed is not False: continue
+            if not slave.started: continue
+            node_free[name] = 0
+            for mname in self.node_running.get(name, []):
+                [remaining, elapsed, functions] = self.module_progress.get(mname, [0, 0, 0])
+                if remaining > 0:
+                    predicted = self.durations.predict(mname, functions)
+                    node_free[name] += max(predicted - elapsed, 0)
+        if not node_free:
+            return [0, node_free]
+
+        pending = []
+        for mname, minfo in self.main_modules.items():
+            md = self.get_module_data(mname, minfo.used_tpref)
+            pending.append([md.order, -self.predict(mname), mname, minfo])
+        for [_, predicted, mname, minfo] in sorted(pending, key=itemgetter(0, 1)):
+            names = [name for name in minfo.nodes if name in node_free]
+            if not names:
+                if not minfo.nodes: continue
+                # matching nodes are waiting for the devices of the active nodes
+                names = list(node_free.keys())
+            name = min(names, key=lambda n: node_free[n])
+            node_free[name] += -predicted
+        return [max(node_free.values()), node_free]
+
+    def save_eta(self):
+        if self.start_time is None: return
+        now = get_timenow()
+        elapsed = get_elapsed(self.start_time, False, 0, now)
+        [remaining, node_free] = self.estimate_remaining()
+        completion = now + datetime.timedelta(seconds=remaining)
+        header, rows = ["Item", "Value"], []
+        rows.append(["Predicted Makespan", seconds_format(self.predicted_makespan)])
+        rows.append(["Elapsed", seconds_format(elapsed)])
+        rows.append(["Estimated Remaining", seconds_format(remaining)])
+        rows.append(["Estimated Completion", get_timestamp(False, completion)])
+        for name, seconds in node_free.items():
+            rows.append(["Node {} Remaining".format(name), seconds_format(seconds)])
+        filepath = os.path.join(wa.logs_path, "batch_eta.html")
+        utils.write_html_table3(header, rows, filepath, total=False)
+
+    def show_makespan(self):
+        if self.start_time is None: return
+        msg = "Makespan predicted {} actual {}"
+        trace(msg.format(seconds_format(self.predicted_makespan),
+                         seconds_format(get_elapsed(self.start_time))))
+
     def mark_test_complete(self, node, item_index, duration=0):
         debug("Remove", item_index, "From", node, self.node_modules[node])
         if item_index in self.node_modules[node]:
             self.node_modules[node].remove(item_index)
+            self._module_complete(item_index, duration)
             report("finish", self.collection[item_index], node.gateway.id)
             debug("============== completed", item_index, self.collection[item_index])
         else:
@@ -595,16 +759,25 @@ class SpyTestScheduling(object):
     def _assign_test(self, node, name, modules):
         slave = self.wa.slaves[name]
         for order in range(0, self.max_order + 1):
+            candidates = []
             for mname,minfo in modules.items():
                 if name not in minfo.nodes: continue
-                md = self.get_module_data(name, minfo.used_tpref)
+                md = self.get_module_data(mname, minfo.used_tpref)
                 if self.order_support and md.order != order:
                     continue
+                candidates.append(mname)
+            if candidates:
+                if self.lpt_support:
+                    mname = max(candidates, key=lambda m: self.predict(m, modules))
+                else:
+                    mname = candidates[0]
+                minfo = modules[mname]
                 if not self._assign_pretest(node, name):
                     del modules[mname]
                     self.node_modules[node].extend(minfo.node_indexes)
                     slave.assigned = slave.assigned + len(minfo.node_indexes)
-                    debug("ASSIGNED", name, md.order, mname, minfo.node_indexes)
+                    self.node_running.setdefault(name, []).append(mname)
+                    debug("ASSIGNED", name, order, mname, minfo.node_indexes)
                     for item_index in minfo.node_indexes:
                         report("add", self.collection[item_index], node.gateway.id)
                     report("save", "", "")
@@ -981,6 +1154,8 @@ def unconfigure(config):
     return is_master()
 
 def finish():
+    if is_master() and isinstance(wa.sched, SpyTestScheduling):
+        wa.sched.show_makespan()
     return is_master()
 
 def make_scheduler(config, log):
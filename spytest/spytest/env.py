@@ -6,6 +6,9 @@ defaults = {
     "SPYTEST_NO_CONSOLE_LOG": "0",
     "SPYTEST_PROMPTS_FILENAME": None,
     "SPYTEST_TEXTFSM_INDEX_FILENAME": "index",
+    "SPYTEST_TEXTFSM_CACHE_SIZE": "1024",
+    "SPYTEST_INDEXED_SHOW_OUTPUT": "0",
+    "SPYTEST_TRANSFER_CHUNK_SIZE": "16384",
     "SPYTEST_UI_POSITIVE_CASES_ONLY": "0",
     "SPYTEST_REPEAT_MODULE_SUPPORT": "0",
     "SPYTEST_FILE_PREFIX": "results",
@@ -76,6 +79,10 @@ defaults = {
     "SPYTEST_RECOVERY_CTRL_C": "1",
     "SPYTEST_RECOVERY_CTRL_Q": "1",
     "SPYTEST_SOFT_TGEN_WAIT_MULTIPLIER": "2",
+    "SPYTEST_ADAPTIVE_POLL_WAIT": "1",
+    "SPYTEST_POLL_WAIT_INITIAL_DELAY": "0.25",
+    "SPYTEST_PROFILE_FLUSH_ROWS": "10000",
+    "SPYTEST_APPLY_SCRIPT_PARALLEL": "0",
 }
 
 dev_defaults = {
@@ -86,6 +93,9 @@ dev_defaults = {
     "SPYTEST_BATCH_MODULE_TOPO_PREF": None,
     "SPYTEST_BATCH_MATCHING_BUCKET_ORDER": "larger,largest",
     "SPYTEST_BATCH_RERUN": None,
+    # module durations of the previous runs, a relative path is taken relative to SPYTEST_USER_ROOT
+    "SPYTEST_BATCH_DURATIONS_FILE": "batch_durations.csv",
+    "SPYTEST_BATCH_LPT_SCHEDULING": "1",
     "SPYTEST_TESTBED_FILE": "testbed.yaml",
     "SPYTEST_FILE_MODE": "0",
     "SPYTEST_SCHEDULING": None,
@@ -0,0 +1,101 @@
+import re
+
+# index of the error rules of a device
+#   command regular expressions are compiled once and grouped by their literal prefix
+#   output patterns of all the rules matching a command are folded into one regular
+#   expression, which is searched first as it is much faster without groups and rarely
+#   matches, and one with a named group per rule to identify the rule which fired
+class ErrorIndex(object):
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.rules = []
+        self.prefixes = dict()
+        self.classes = dict()
+        for index, (name, errinfo) in enumerate(list(errors.items())):
+            cmd_regex = re.compile(errinfo.command)
+            search = self._strip_wildcards(errinfo.search)
+            rule = [index, name, errinfo, cmd_regex, re.compile(search), search]
+            self.rules.append(rule)
+            prefix = self._literal_prefix(errinfo.command)
+            self.prefixes.setdefault(prefix, []).append(rule)
+
+    # length of the literal text the regular expression starts with
+    @staticmethod
+    def _literal_prefix(regex):
+        if "|" in regex:
+            return ""
+        prefix = ""
+        for char in regex:
+            if char in ".^$*+?{}[]()\\|":
+                # drop previous char when it is made optional by quantifier
+                if char in "*?{" and prefix:
+                    prefix = prefix[:-1]
+                break
+            prefix = prefix + char
+        return prefix
+
+    # leading and trailing .* don't change whether search finds a match
+    # but they make it backtrack over every line of the output
+    @staticmethod
+    def _strip_wildcards(regex):
+        while regex.startswith(".*") and not regex.startswith(".*?"):
+            regex = regex[2:]
+        while regex.endswith(".*") and (len(regex) - len(regex[:-2].rstrip("\\"))) % 2 == 0:
+            regex = regex[:-2]
+        return regex
+
+    # find the rules applicable to given command and build the combined pattern
+    def _get_class(self, cmd):
+        rules = []
+        for prefix, prefix_rules in self.prefixes.items():
+            if cmd.startswith(prefix):
+                for rule in prefix_rules:
+                    if rule[3].match(cmd):
+                        rules.append(rule)
+        rules.sort(key=lambda rule: rule[0])
+        key = tuple([rule[0] for rule in rules])
+        if key not in self.classes:
+            # groups are numbered across the combined pattern, so a rule with
+            # groups (which back references need) is searched on its own
+            combinable = [rule for rule in rules if not rule[4].groups]
+            combined, named = None, None
+            if combinable:
+                try:
+                    combined = re.compile("|".join(["(?:{})".format(rule[5]) for rule in combinable]))
+                    named = re.compile("|".join(["(?P<e{}>{})".format(rule[0], rule[5]) for rule in combinable]))
+                except Exception:
+                    # patterns can't be combined (inline flags)
+                    combined, named = None, None
+            if combined is None:
+                combinable = []
+            standalone = [rule for rule in rules if rule not in combinable]
+            self.classes[key] = [rules, combinable, combined, named, standalone]
+        return self.classes[key]
+
+    # return name and info of the first rule in order matching the output
+    def match(self, cmd, output):
+        rules, combinable, combined, named, standalone = self._get_class(cmd)
+        if not rules:
+            return None, None
+        candidates = standalone
+        if combinable:
+            found = named.search(output) if combined.search(output) else None
+            if found:
+                # earlier rules may match beyond the leftmost match position
+                for rule in combinable:
+                    if found.group("e{}".format(rule[0])) is not None:
+                        break
+                candidates = [entry for entry in rules if entry[0] <= rule[0]]
+        for rule in candidates:
+            if rule[4].search(output):
+                return rule[1], rule[2]
+        return None, None
+
+def get_index(access):
+    errors = access["errors"]
+    index = access.get("errors_index", None)
+    if index is None or index.errors is not errors or len(index.rules) != len(errors):
+        index = ErrorIndex(errors)
+        access["errors_index"] = index
+    return index
@@ -45,7 +45,15 @@ import spytest.paths as paths
 import spytest.cmdargs as cmdargs
 import spytest.env as env
 import spytest.syslog as syslog
+import spytest.profile as profile
 from spytest.feature import Feature
+from spytest.profile import CmdProfile
+from spytest.advisor import canbe_parallel_cols
+from spytest.waiter import Waiter
+from spytest.waiter import WaitSites
+from spytest.waiter import get_wait_site
+from spytest.waiter import redis_event_cmd
+from spytest.waiter import syslog_event_cmd
 
 root_path = os.path.join(os.path.dirname(__file__), '..')
 root_path = os.path.abspath(root_path)
@@ -272,6 +280,8 @@ class Context(object):
         # create net module and register devices
         self.net = Net(self.cfg, self.file_prefix, self.log, self._tb)
         self.net.set_workarea(self.wa)
+        flush_rows = utils.integer_parse(env.get("SPYTEST_PROFILE_FLUSH_ROWS", "10000"), 10000)
+        profile.set_store_file(paths.get_stats_cmds_csv(self.logs_path), flush_rows)
         if self._tb.is_valid():
             self.net.register_devices(self.topo)
 
@@ -704,6 +714,10 @@ class WorkArea(object):
         self.module_get_tech_support = False
         self.module_fetch_core_files = False
         self.stats_count = 0
+        self.wait_sites = WaitSites()
+        self.all_wait_sites = WaitSites()
+        self.cmd_profile = CmdProfile()
+        self.err_check_modules = OrderedDict()
         self.module_tc_executed = 0
         self.min_topo_called = False
         self.tgen_reconnect = False
@@ -813,6 +827,7 @@ class WorkArea(object):
             self.log("Sleep for {} sec(s)...{}".format(val, msg))
         else:
             self.log("Sleep for {} sec(s)...".format(val))
+        self.wait_sites.add(get_wait_site(), "sleep", val, val)
         self.net.wait(val)
 
     def tg_wait(self, val, msg=None):
@@ -824,6 +839,7 @@ class WorkArea(object):
             self.log("TG Sleep for {} sec(s)...{}".format(val, msg))
         else:
             self.log("TG Sleep for {} sec(s)...".format(val))
+        self.wait_sites.add(get_wait_site(), "tgsleep", val, val)
         self._context.net.tg_wait(val)
 
     def report_tc_pass(self, tcid, msgid, *args):
@@ -960,12 +976,18 @@ class WorkArea(object):
         todo: Update Documentation
         :param cmdlist:
         :type cmdlist:
-        :param dut:
+        :param dut: DUT or list of DUTs to apply the same script on, which
+                    is done in parallel when SPYTEST_APPLY_SCRIPT_PARALLEL is set
         :type dut:
         :return:
         :rtype:
         """
-        return self.net.apply_script(dut, cmdlist)
+        if not isinstance(dut, list):
+            return self.net.apply_script(dut, cmdlist)
+        if env.get("SPYTEST_APPLY_SCRIPT_PARALLEL", "0") != "0":
+            [retvals, _] = self.exec_each(dut, self.net.apply_script, cmdlist)
+            return retvals
+        return [self.net.apply_script(d, cmdlist) for d in dut]
 
     def apply_json(self, dut, json):
         """
@@ -2510,9 +2532,15 @@ class WorkArea(object):
         if stats.canbe_parallel:
             msg = "yet to be parallized: {}".format(nodeid)
             utils.banner(msg, func=ftrace)
-            for [start_time, msg, dut1, dut2] in stats.canbe_parallel:
-                ftrace(start_time, msg, dut1, dut2)
+            rows = []
+            module, func = paths.parse_nodeid(nodeid)
+            for [start_time, msg, dut1, dut2, pid, site, ctime, ptime] in stats.canbe_parallel:
+                ftrace(start_time, msg, dut1, dut2, site)
+                rows.append([module, func, site, pid, dut1, dut2, ctime, ptime, msg])
             utils.banner(None, func=ftrace)
+            [_, logs_path, _] = _get_logs_path()
+            csv_file = paths.get_canbe_parallel_csv(logs_path)
+            utils.write_csv_file(canbe_parallel_cols, rows, csv_file, os.path.exists(csv_file))
 
         #Construct the final result log message to print in all log files.
         msg = "\n================== Report: {} : {} : {} : {} =========\n"
@@ -2541,6 +2569,8 @@ class WorkArea(object):
             stats.tc_cmd_time = utils.time_format(stats.tc_cmd_time, True)
             stats.helper_cmd_time = utils.time_format(stats.helper_cmd_time, True)
             stats.tg_cmd_time = utils.time_format(stats.tg_cmd_time, True)
+            err_check_msecs = stats.err_check_time
+            stats.err_check_time = utils.time_format(stats.err_check_time, True)
             ofh.write("\nRESULT = {}".format(res))
             ofh.write("\nDESCRIPTION = {}".format(desc))
             ofh.write("\nTOTAL Test Time = {}".format(time_taken))
@@ -2550,6 +2580,9 @@ class WorkArea(object):
             ofh.write("\nTOTAL HELPER Time = {}".format(stats.helper_cmd_time))
             ofh.write("\nTOTAL TG Time = {}".format(stats.tg_cmd_time))
             ofh.write("\nTOTAL PROMPT NFOUND = {}".format(stats.pnfound))
+            ofh.write("\nTOTAL ERROR CHECK Time = {} ({} checks)".format(stats.err_check_time, stats.err_check_count))
+            if stats.cmds_flushed:
+                ofh.write("\nFLUSHED {} entries to {}".format(stats.cmds_flushed, paths.get_stats_cmds_csv()))
             for [start_time, thid, ctype, dut, cmd, ctime] in stats.cmds:
                 start_msg = "\n{} {}".format(get_timestamp(this=start_time), thid)
                 if ctype == "CMD":
@@ -2562,13 +2595,34 @@ class WorkArea(object):
                     ofh.write("{}WAIT TIME: {} = {}".format(start_msg, ctime, cmd))
                 elif ctype == "TGWAIT":
                     ofh.write("{}TGWAIT TIME: {} = {}".format(start_msg, ctime, cmd))
+                elif ctype == "POLL":
+                    ofh.write("{}POLL TIME: {} = {}".format(start_msg, ctime, cmd))
                 elif ctype == "PROMPT_NFOUND":
                     ofh.write("{}PROMPT NFOUND: {}".format(start_msg, cmd))
+            for [site, kind, count, polls, success_time, wasted, timeouts, total] in self.wait_sites.rows():
+                ofh.write("\nWAIT SITE: {} {} count={} polls={} success={} wasted={} timeouts={} total={}".format(
+                          site, kind, count, polls, success_time, wasted, timeouts, total))
+            for [ctype, template, count, total, p50, p95, pmax] in stats.cmd_profile.rows(20):
+                ofh.write("\nCMD PROFILE: {} count={} total={} p50={} p95={} max={} = {}".format(
+                          ctype, count, total, p50, p95, pmax, template))
             ofh.write("\n=========================================================\n")
+        profile.flush()
+        self.cmd_profile.merge(stats.cmd_profile)
+        cols = ["Type", "Command", "Count", "Total (ms)", "P50 (ms)", "P95 (ms)", "Max (ms)"]
+        utils.write_csv_file(cols, self.cmd_profile.rows(), paths.get_cmd_profile_csv(logs_path))
+        self.all_wait_sites.merge(self.wait_sites)
+        self.wait_sites.init()
+        cols = ["Site", "Kind", "Count", "Polls", "Time To Success", "Wasted", "Timeouts", "Total"]
+        utils.write_csv_file(cols, self.all_wait_sites.rows(), paths.get_wait_sites_csv(logs_path))
+        entry = self.err_check_modules.setdefault(module, [0, 0, 0])
+        entry[0], entry[1], entry[2] = entry[0] + 1, entry[1] + stats.err_check_count, entry[2] + err_check_msecs
+        rows = [[name] + entry for name, entry in self.err_check_modules.items()]
+        cols = ["Module", "Tests", "Checks", "Time (ms)"]
+        utils.write_csv_file(cols, rows, paths.get_err_check_csv(logs_path))
         self.stats_count = self.stats_count + 1
         row = [self.stats_count, module, func, res, time_taken, stats.helper_cmd_time,
                stats.tc_cmd_time, stats.tg_cmd_time, stats.tc_total_wait,
-               stats.tg_total_wait, stats.pnfound, desc.replace(",", " ")]
+               stats.tg_total_wait, stats.pnfound, err_check_msecs, desc.replace(",", " ")]
         Result.write_report_csv(stats_csv, [row], ReportType.STATS, False, True)
 
     def get_device_names(self, dtype):
@@ -3327,15 +3381,50 @@ class WorkArea(object):
         if rv or self.is_dry_run():
             return rv
 
-        # retry after sleep
-        t = time.time() + timeout
-        while True:
-            time.sleep(delay)
-            if time.time() > t:
-                break
-            if method(*args, **kwargs):
-                return True
-        return False
+        # retry after sleep, starting with short delays when adaptive
+        if env.get("SPYTEST_ADAPTIVE_POLL_WAIT", "1") != "0":
+            initial = utils.float_parse(env.get("SPYTEST_POLL_WAIT_INITIAL_DELAY", "0.25"), delay)
+            w = Waiter(timeout, delay, initial)
+        else:
+            w = Waiter(timeout, delay, delay, jitter=0)
+        rv = w.wait(method, *args, **kwargs)
+        self._add_wait_site("poll", w, rv)
+        return rv
+
+    def redis_event(self, db, pattern):
+        return lambda delay: redis_event_cmd(db, pattern, delay)
+
+    def syslog_event(self, pattern):
+        return lambda delay: syslog_event_cmd(pattern, delay)
+
+    def event_wait(self, dut, event, delay, timeout, method, *args, **kwargs):
+        """
+        poll the method like poll_wait, but instead of sleeping between
+        the polls block on the DUT until the event or the delay expires
+
+        :param event: st.redis_event() or st.syslog_event()
+        """
+        rv = bool(method(*args, **kwargs))
+        if rv or self.is_dry_run():
+            return rv
+
+        def sleep(val):
+            self.config(dut, event(val), skip_error_check=True,
+                        max_time=int(val) + 30)
+
+        w = Waiter(timeout, delay, delay, sleep=sleep)
+        rv = w.wait(method, *args, **kwargs)
+        self._add_wait_site("event", w, rv)
+        return rv
+
+    def _add_wait_site(self, kind, w, rv):
+        # the condition became true somewhere in the last delay
+        wasted = w.last_sleep if rv else w.elapsed
+        site = get_wait_site(3)
+        self.wait_sites.add(site, kind, w.elapsed, wasted, rv, w.polls)
+        profile.poll("{} {}".format(kind, site), w.elapsed)
+        self.log("{} wait at {} {} in {:.2f} sec(s) after {} poll(s)".format(kind.upper(),
+                 site, "succeeded" if rv else "timed out", w.elapsed, w.polls))
 
     def exec_all(self, entries, first_on_main=False):
         return putil.exec_all2(self.cfg.faster_init, "abort", entries,
@@ -447,6 +447,15 @@ def poll_wait(method, timeout, *args, **kwargs):
 def poll_wait2(delay, timeout, method, *args, **kwargs):
     return getwa().poll_wait(delay, timeout, method, *args, **kwargs)
 
+def event_wait(dut, event, delay, timeout, method, *args, **kwargs):
+    return getwa().event_wait(dut, event, delay, timeout, method, *args, **kwargs)
+
+def redis_event(db, pattern):
+    return getwa().redis_event(db, pattern)
+
+def syslog_event(pattern):
+    return getwa().syslog_event(pattern)
+
 def exec_all(entries, first_on_main=False):
     return getwa().exec_all(entries, first_on_main=first_on_main)
 
@@ -19,6 +19,7 @@ import utilities.common as utils
 import utilities.parallel as putils
 
 from spytest import profile
+from spytest import errcheck
 from spytest.dicts import SpyTestDict
 from spytest.logger import Logger, get_thread_name
 from spytest.template import Template
@@ -100,6 +101,7 @@ class Net(object):
         self.use_sample_data = bool(env.get("SPYTEST_USE_SAMPLE_DATA", "0") != "0")
         self.cmd_tmpl_cache = dict()
         self.debug_find_prompt = bool(env.get("SPYTEST_DEBUG_FIND_PROMPT", "0") != "0")
+        self.indexed_show_output = bool(env.get("SPYTEST_INDEXED_SHOW_OUTPUT", "0") != "0")
         self.dry_run_cmd_delay = env.get("SPYTEST_DRYRUN_CMD_DELAY", "0")
         self.dry_run_cmd_delay = int(self.dry_run_cmd_delay)
         self.connect_retry_delay = 4
@@ -1311,24 +1313,14 @@ class Net(object):
 
     def _check_error(self, access, cmd, output, skip_raise=False):
         devname = access["devname"]
-        actions = []
-        matched_result = None
-        matched_err = ""
-        matched_severity = None
-        for err, errinfo in list(access["errors"].items()):
-            #self.logger.debug("COMPARE-CMD: {} vs {}".format(errinfo.command, cmd))
-            if re.compile(errinfo.command).match(cmd):
-                #self.logger.debug("COMPARE-OUT: {} vs {}".format(errinfo.search, output))
-                if re.search(errinfo.search, output):
-                    #self.logger.debug("MATCHED-OUT: {} ACTION: {} {}/{}".format(
-                        #output, errinfo.action, skip_raise, self.wa.session_init_completed))
-                    actions = utils.make_list(errinfo.action)
-                    matched_err = err
-                    matched_result = errinfo.get("result", None)
-                    matched_severity = errinfo.get("severity", None)
-                    break
+        start_time = time.time()
+        matched_err, errinfo = errcheck.get_index(access).match(cmd, output)
+        profile.error_check((time.time() - start_time) * 1000)
         if not matched_err:
             return output
+        actions = utils.make_list(errinfo.action)
+        matched_result = errinfo.get("result", None)
+        matched_severity = errinfo.get("severity", None)
         new_output = []
         # check if coredump and techsupport are needed
         for action in actions:
@@ -2360,6 +2352,8 @@ class Net(object):
             [tmpl, parsed] = self.tmpl[devname].apply(output, cmd)
             self.dut_log(devname, str(parsed), lvl=logging.DEBUG)
             self._trace_tmpl(cmd, tmpl)
+            if self.indexed_show_output and isinstance(parsed, list):
+                parsed = utils.ParsedOutput(parsed)
             return parsed
         except Exception as e:
             self.logger.exception(e)
@@ -3166,27 +3160,62 @@ class Net(object):
 
         return False
 
+    def _parse_md5sum(self, output):
+        retval = dict()
+        for line in output.split(nl):
+            match = re.match(r"^\s*([0-9a-f]{32})\s+\*?(\S+)\s*$", line)
+            if match:
+                retval[match.group(2)] = match.group(1)
+        return retval
+
     def _transfer_base64(self, access, src_file, dst_file):
         devname = access["devname"]
         prompt = self._get_cli_prompt(devname)
-        script_cmd = "rm -f {0}.tmp {0}".format(dst_file)
-        self._exec(devname, script_cmd, prompt)
-        redir = ">"
-        lines = utils.b64encode(src_file)
-        (count, split) = (len(lines), self.max_cmds_once)
-        for i in range(0, count, split):
-            script_cmds = []
-            for j in range(i, i+split):
-                if j >= count:
+
+        # skip the transfer when the remote file is same
+        md5sum = utils.md5(src_file)
+        script_cmd = "md5sum {} 2>/dev/null".format(dst_file)
+        output = self._send_command(access, script_cmd, prompt, True)
+        if self._parse_md5sum(output).get(dst_file) == md5sum:
+            msg = "Transfer: skipped as {} is same as {}".format(dst_file, src_file)
+            self.dut_log(devname, msg)
+            return
+
+        # compressed data is sent in chunks of base64 lines, each chunk is decoded into
+        # its own part file and verified with md5, so that a transfer can be resumed
+        # from the parts already transferred by an earlier attempt
+        chunk_size = int(env.get("SPYTEST_TRANSFER_CHUNK_SIZE", "16384"))
+        chunks = utils.gzip_b64_chunks(src_file, chunk_size)
+        prefix = "{}.tmp.{}-{}.".format(dst_file, md5sum[:8], chunk_size)
+        script_cmd = "md5sum {}* 2>/dev/null".format(prefix)
+        output = self._send_command(access, script_cmd, prompt, True)
+        existing = self._parse_md5sum(output)
+
+        for index, (lines, chunk_md5) in enumerate(chunks):
+            part_file = "{}{:05d}".format(prefix, index)
+            if existing.get(part_file) == chunk_md5:
+                continue
+            script_cmd = "base64 -d > {0} << 'SPYTEST_EOF' && md5sum {0}".format(part_file)
+            script_cmd = nl.join([script_cmd] + lines + ["SPYTEST_EOF"])
+            for _ in range(3):
+                output = self._send_command(access, script_cmd, prompt, True, trace_dut_log=0)
+                if self._parse_md5sum(output).get(part_file) == chunk_md5:
                     break
-                script_cmds.append(lines[j])
-            if script_cmds:
-                line = "".join(script_cmds)
-                script_cmd = "echo {} {} {}.tmp".format(line, redir, dst_file)
-                self._send_command(access, script_cmd, prompt, True)
-                redir = ">>"
-        script_cmd = "base64 -d {0}.tmp > {0}".format(dst_file)
-        self._exec(devname, script_cmd, prompt)
+                msg = "Transfer: checksum mismatch of chunk {} of {}".format(index, src_file)
+                self.dut_log(devname, msg, logging.WARNING)
+            else:
+                msg = "Transfer: failed to send chunk {} of {}".format(index, src_file)
+                self.dut_log(devname, msg, logging.ERROR)
+                raise ValueError(msg)
+
+        script_cmd = "cat {0}* | gunzip -c > {1} && rm -f {2}.tmp.* && md5sum {1}"
+        script_cmd = script_cmd.format(prefix, dst_file, dst_file)
+        output = self._send_command(access, script_cmd, prompt, True)
+        if self._parse_md5sum(output).get(dst_file) != md5sum:
+            msg = "Transfer: checksum mismatch of {}".format(dst_file)
+            self.dut_log(devname, msg, logging.ERROR)
+            self._send_command(access, "rm -f {}".format(dst_file), prompt, True)
+            raise ValueError(msg)
 
     def _transfer_base64_small(self, access, src_file, dst_file):
         script_cmds = []
@@ -3279,6 +3308,7 @@ class Net(object):
         except Exception as e:
             print(e)
             self.dut_log(devname, "SFTP Failed - Doing Console transfer")
+            # a failed console transfer raises, the file is not there to be used
             self._transfer_base64(access, src_file, dst_file)
         return dst_file
 
@@ -3311,7 +3341,12 @@ class Net(object):
                 for i in range(1,max_iters):
                     self.dut_log(devname, "Trying to upload file '{}'. attempt '{}'".format(src_file, i))
                     fct = bool(i == (max_iters-1))
-                    dst_file = self._upload_file1(access, src_file, force_console_transfer=fct)
+                    try:
+                        dst_file = self._upload_file1(access, src_file, force_console_transfer=fct)
+                    except ValueError:
+                        # retry the failed transfer unless it is the last attempt
+                        if fct: raise
+                        continue
                     if fct:
                         ls_script_cmd = "sudo ls -lrt {}".format(os.path.dirname(dst_file))
                     else:
@@ -3337,7 +3372,12 @@ class Net(object):
         prompt = self._get_cli_prompt(devname)
         for i in range(1, 6):
             self.dut_log(devname, "Trying to upload file '{}'. attempt '{}'".format(src_file, i))
-            tmp_file = self._upload_file(access, src_file)
+            try:
+                tmp_file = self._upload_file(access, src_file)
+            except ValueError:
+                # retry the failed transfer unless it is the last attempt
+                if i == 5: raise
+                continue
             ls_script_cmd = "sudo ls -lrt {}".format(tmp_file)
             output = self._send_command(access, ls_script_cmd, prompt, False)
             if "No such file or directory" not in output: break
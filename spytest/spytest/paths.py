@@ -68,6 +68,21 @@ def get_stats_htm(prefix=None, consolidated=False):
 def get_stats_txt(prefix=None, consolidated=False):
     return get_file_path("stats", "txt", prefix, consolidated)
 
+def get_stats_cmds_csv(prefix=None, consolidated=False):
+    return get_file_path("stats_cmds", "csv", prefix, consolidated)
+
+def get_cmd_profile_csv(prefix=None, consolidated=False):
+    return get_file_path("cmd_profile", "csv", prefix, consolidated)
+
+def get_canbe_parallel_csv(prefix=None, consolidated=False):
+    return get_file_path("canbe_parallel", "csv", prefix, consolidated)
+
+def get_err_check_csv(prefix=None, consolidated=False):
+    return get_file_path("errcheck", "csv", prefix, consolidated)
+
+def get_wait_sites_csv(prefix=None, consolidated=False):
+    return get_file_path("wait_sites", "csv", prefix, consolidated)
+
 def get_report_txt(prefix=None, consolidated=False):
     return get_file_path("summary", "txt", prefix, consolidated)
 
@@ -1,94 +1,266 @@
+import os
+import re
+import csv
+import time
+import datetime
+import threading
+from array import array
 
-from spytest.st_time import get_timenow
 from spytest.dicts import SpyTestDict
+from spytest.waiter import get_call_site
 import spytest.logger as logger
 
+# the waits are recorded in seconds and the rest in milliseconds
+CMD_TYPES = ["CMD", "HELPER", "TG", "WAIT", "TGWAIT", "POLL", "PROMPT_NFOUND"]
+TYPE_SCALE = {"WAIT": 1000, "TGWAIT": 1000, "POLL": 1000}
+
+# columns of the entries in the CSV file, in the order of CmdStore iteration
+cmd_store_cols = ["Start (epoch)", "Thread", "Type", "DUT", "Command", "Time (ms, s for waits)"]
+
+template_regex = re.compile(r"\d+")
+
+def cmd_template(cmd):
+    return template_regex.sub("N", cmd)
+
+def to_datetime(value):
+    return datetime.datetime.utcfromtimestamp(value)
+
+def percentile(values, pct):
+    # nearest rank of sorted values
+    index = int(round(pct * (len(values) - 1) / 100.0))
+    return values[index]
+
+class Strings(object):
+
+    def __init__(self):
+        self.ids = dict()
+        self.values = []
+
+    def intern(self, value):
+        sid = self.ids.get(value)
+        if sid is None:
+            sid = len(self.values)
+            self.ids[value] = sid
+            self.values.append(value)
+        return sid
+
+class CmdProfile(object):
+
+    def __init__(self):
+        self.durations = dict()
+
+    def add(self, ctype, template, msecs):
+        key = (ctype, template)
+        if key not in self.durations:
+            self.durations[key] = array("d")
+        self.durations[key].append(msecs)
+
+    def merge(self, other):
+        for key, values in other.durations.items():
+            if key not in self.durations:
+                self.durations[key] = array("d")
+            self.durations[key].extend(values)
+
+    def rows(self, limit=0):
+        # [type, template, count, total, p50, p95, max] in msecs, most expensive first
+        rows = []
+        for (ctype, template), values in self.durations.items():
+            values = sorted(values)
+            rows.append([ctype, template, len(values), int(sum(values)), int(percentile(values, 50)),
+                         int(percentile(values, 95)), int(values[-1])])
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows[:limit] if limit else rows
+
+class CmdStore(object):
+    """
+    append only columnar store of the profiled entries
+    the command, dut and thread strings are interned, the entries
+    are flushed to the CSV file every flush_rows and when requested
+    """
+
+    def __init__(self, filepath=None, flush_rows=0):
+        self.filepath = filepath
+        self.flush_rows = flush_rows
+        self.strings = Strings()
+        self.templates = dict()
+        self.profile = CmdProfile()
+        self.flushed = 0
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.start = array("d")
+        self.thid = array("i")
+        self.ctype = array("b")
+        self.dut = array("i")
+        self.cmd = array("i")
+        self.value = array("d")
+
+    def __len__(self):
+        return len(self.start)
+
+    def append(self, start, thid, ctype, dut, cmd, value):
+        # the columns are appended by the threads of exec_all too
+        with self.lock:
+            cmd_id = self.strings.intern(cmd)
+            self.start.append(start)
+            self.thid.append(self.strings.intern(thid))
+            self.ctype.append(CMD_TYPES.index(ctype))
+            self.dut.append(self.strings.intern(dut))
+            self.cmd.append(cmd_id)
+            self.value.append(value or 0)
+            if ctype != "PROMPT_NFOUND":
+                template = self.templates.get(cmd_id)
+                if template is None:
+                    template = cmd if ctype == "POLL" else cmd_template(cmd)
+                    self.templates[cmd_id] = template
+                self.profile.add(ctype, template, value * TYPE_SCALE.get(ctype, 1))
+            if self.filepath and self.flush_rows and len(self.start) >= self.flush_rows:
+                self._flush()
+
+    def _value(self, index):
+        if CMD_TYPES[self.ctype[index]] == "PROMPT_NFOUND":
+            return ""
+        value = self.value[index]
+        return int(value) if value == int(value) else value
+
+    def __iter__(self):
+        values = self.strings.values
+        for index in range(len(self.start)):
+            yield [to_datetime(self.start[index]), values[self.thid[index]],
+                   CMD_TYPES[self.ctype[index]], values[self.dut[index]],
+                   values[self.cmd[index]], self._value(index)]
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.filepath or not self.start:
+            return
+        # the file is shared by the stores of all the modules of the run
+        new_file = not os.path.exists(self.filepath) or not os.path.getsize(self.filepath)
+        with open(self.filepath, "a") as ofh:
+            writer = csv.writer(ofh)
+            if new_file:
+                writer.writerow(cmd_store_cols)
+            values = self.strings.values
+            for index in range(len(self.start)):
+                dut = values[self.dut[index]]
+                writer.writerow(["{:.3f}".format(self.start[index]), values[self.thid[index]].strip(": "),
+                                 CMD_TYPES[self.ctype[index]], "" if dut is None else dut,
+                                 values[self.cmd[index]], self._value(index)])
+        self.flushed = self.flushed + len(self.start)
+        self._clear()
+
 class Profile(object):
 
     def __init__(self):
+        self.store_file = None
+        self.flush_rows = 0
+        self.init()
+
+    def init(self):
         self.pnfound = 0
         self.tg_total_wait = 0
         self.tc_total_wait = 0
-        self.tg_total_wait = 0
         self.tc_cmd_time = 0
-        self.tc_cmds = []
         self.tg_cmd_time = 0
-        self.tg_cmds = []
         self.helper_cmd_time = 0
-        self.helper_cmds = []
-        self.cmds = []
+        self.cmds = CmdStore(self.store_file, self.flush_rows)
         self.profile_ids = dict()
+        self.profile_times = dict()
         self.canbe_parallel = []
+        self.err_check_time = 0
+        self.err_check_count = 0
 
-    def init(self):
-        self.__init__()
+    def set_store_file(self, filepath, flush_rows=10000):
+        self.store_file = filepath
+        self.flush_rows = flush_rows
+        self.cmds.filepath = filepath
+        self.cmds.flush_rows = flush_rows
+
+    def flush(self):
+        self.cmds.flush()
 
     def start(self, msg, dut=None, data=None):
         msg = msg.replace("\r", "")
         msg = msg.replace("\n", "\\n")
         count = len(self.profile_ids)
-        self.profile_ids[count] = [get_timenow(), dut, msg, data]
+        self.profile_ids[count] = [time.time(), dut, msg, data]
         return count
 
     def stop(self, pid):
         [start_time, dut, msg, data] = self.profile_ids[pid]
-        delta = get_timenow() - start_time
-        cmd_time = int(delta.total_seconds() * 1000)
+        cmd_time = int((time.time() - start_time) * 1000)
         thid = logger.get_thread_name()
+        self.profile_times[pid] = cmd_time
         if dut:
             if pid > 0 and thid == "T0000: ":
                 [_, pdut, pmsg, _] = self.profile_ids[pid-1]
                 if pmsg == msg and dut != pdut:
-                    self.canbe_parallel.append([start_time, msg, dut, pdut])
+                    site = ":".join([str(part) for part in get_call_site(3, True)])
+                    self.canbe_parallel.append([to_datetime(start_time), msg, dut, pdut, pid, site,
+                                                cmd_time, self.profile_times.get(pid-1, 0)])
             if "spytest-helper.py" in msg:
-                self.helper_cmds.append([start_time, thid, dut, msg, cmd_time])
                 self.helper_cmd_time = self.helper_cmd_time + cmd_time
-                self.cmds.append([start_time, thid, "HELPER", dut, msg, cmd_time])
+                self.cmds.append(start_time, thid, "HELPER", dut, msg, cmd_time)
             else:
-                self.tc_cmds.append([start_time, thid, dut, msg, cmd_time])
                 self.tc_cmd_time = self.tc_cmd_time + cmd_time
-                self.cmds.append([start_time, thid, "CMD", dut, msg, cmd_time])
+                self.cmds.append(start_time, thid, "CMD", dut, msg, cmd_time)
         else:
-            self.tg_cmds.append([start_time, thid, dut, msg, cmd_time])
             self.tg_cmd_time = self.tg_cmd_time + cmd_time
-            self.cmds.append([start_time, thid, "TG", dut, msg, cmd_time])
+            self.cmds.append(start_time, thid, "TG", dut, msg, cmd_time)
         return data
 
     def wait(self, val, is_tg=False):
-        start_time = get_timenow()
         thid = logger.get_thread_name()
         if is_tg:
             self.tg_total_wait = self.tg_total_wait + val
-            self.cmds.append([start_time, thid, "TGWAIT", None, "TG sleep", val])
+            self.cmds.append(time.time(), thid, "TGWAIT", None, "TG sleep", val)
         else:
             self.tc_total_wait = self.tc_total_wait + val
-            self.cmds.append([start_time, thid, "WAIT", None, "static delay", val])
+            self.cmds.append(time.time(), thid, "WAIT", None, "static delay", val)
+
+    def poll(self, site, val):
+        thid = logger.get_thread_name()
+        self.cmds.append(time.time() - val, thid, "POLL", None, site, val)
+
+    def error_check(self, val):
+        self.err_check_time = self.err_check_time + val
+        self.err_check_count = self.err_check_count + 1
 
     def prompt_nfound(self, cmd):
-        start_time = get_timenow()
         thid = logger.get_thread_name()
         self.pnfound = self.pnfound + 1
-        self.cmds.append([start_time, thid, "PROMPT_NFOUND", None, cmd, ""])
+        self.cmds.append(time.time(), thid, "PROMPT_NFOUND", None, cmd, None)
 
     def get_stats(self):
         stats = SpyTestDict()
         stats.tg_total_wait = self.tg_total_wait
         stats.tc_total_wait = self.tc_total_wait
         stats.tc_cmd_time = self.tc_cmd_time
-        stats.tc_cmds = self.tc_cmds
         stats.tg_cmd_time = self.tg_cmd_time
-        stats.tg_cmds = self.tg_cmds
         stats.helper_cmd_time = self.helper_cmd_time
-        stats.helper_cmds = self.helper_cmds
         stats.cmds = self.cmds
+        stats.cmds_flushed = self.cmds.flushed
+        stats.cmd_profile = self.cmds.profile
         stats.canbe_parallel = self.canbe_parallel
         stats.pnfound = self.pnfound
+        stats.err_check_time = int(self.err_check_time)
+        stats.err_check_count = self.err_check_count
         return stats
 
 obj = Profile()
 def init():
     return obj.init()
 
+def set_store_file(filepath, flush_rows=10000):
+    return obj.set_store_file(filepath, flush_rows)
+
+def flush():
+    return obj.flush()
+
 def start(msg, dut=None, data=None):
     return obj.start(msg, dut, data)
 
@@ -98,9 +270,14 @@ def stop(pid):
 def wait(val, is_tg=False):
     return obj.wait(val, is_tg)
 
+def poll(site, val):
+    return obj.poll(site, val)
+
 def get_stats():
     return obj.get_stats()
 
 def prompt_nfound(cmd):
     return obj.prompt_nfound(cmd)
 
+def error_check(val):
+    return obj.error_check(val)
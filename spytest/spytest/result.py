@@ -33,7 +33,7 @@ slave_cols2 = ['#', "Device", 'Module', 'TestFunction', "LogDate", "LogHost", "L
 if hide_log_text: slave_cols2.remove("LogText")
 if hide_log_host: slave_cols2.remove("LogHost")
 slave_cols3 = ["#", "Module", "Function", "Result", "Test Time", "Helper Time", "CMD Time",
-               "TG Time", "Wait", "TGWait", "PROMPT NFOUND", "Description"]
+               "TG Time", "Wait", "TGWait", "PROMPT NFOUND", "ErrCheck Time (ms)", "Description"]
 slave_cols4 = ["#", "Module", "DUTs", "MEM0", "MEM1", "MEM", "CPU0", "CPU1", "CPU"]
 slave_cols5 = ["#", "Name", "Value"]
 slave_cols6 = ['Feature', 'TestCase', 'Result', 'Description', 'Function', 'Module', "Devices",
@@ -49,7 +49,7 @@ merge_cols2 = ['#', "Node", "Device", 'Module', 'TestFunction', "LogDate", "LogH
 if hide_log_text: merge_cols2.remove("LogText")
 if hide_log_host: merge_cols2.remove("LogHost")
 merge_cols3 = ["#", "Node", "Module", "Function", "Result", "Test Time", "Helper Time", "CMD Time",
-                "TG Time", "Wait", "TGWait", "PROMPT NFOUND", "Description"]
+                "TG Time", "Wait", "TGWait", "PROMPT NFOUND", "ErrCheck Time (ms)", "Description"]
 merge_cols4 = ["#", "Node", "Module", "DUTs", "MEM0", "MEM1", "MEM", "CPU0", "CPU1", "CPU"]
 merge_cols5 = ["#", "Name", "Value"]
 merge_cols6 = ['Feature', 'TestCase', 'Result', 'Description', 'Function', 'Module', "Devices",
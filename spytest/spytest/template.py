@@ -2,6 +2,9 @@ import sys
 import os
 import re
 import json
+import time
+import threading
+from collections import OrderedDict
 
 import textfsm
 try:
@@ -11,6 +14,62 @@ except Exception:
 
 import spytest.env as env
 
+# compiled parsers shared by all Template instances in the process
+class TemplateCache(object):
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.lock = threading.Lock()
+        self.fsms = dict()
+        self.rows = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # find the template for the given key using LRU of index row matches
+    def lookup(self, key, index, attrs):
+        with self.lock:
+            if key in self.rows:
+                self.hits = self.hits + 1
+                value = self.rows.pop(key)
+                self.rows[key] = value
+                return value
+        self.misses = self.misses + 1
+        row_idx = index.GetRowMatch(attrs)
+        value = index.index[row_idx]['Template'] if row_idx else None
+        with self.lock:
+            self.rows[key] = value
+            while len(self.rows) > self.size:
+                self.rows.popitem(last=False)
+        return value
+
+    # compile the template file once and reuse the state machine
+    def compile(self, tmpl_path):
+        with self.lock:
+            entry = self.fsms.get(tmpl_path)
+            if entry is None:
+                with open(tmpl_path, "r") as tmpl_fp:
+                    fsm = textfsm.TextFSM(tmpl_fp)
+                header = tuple([hdr.lower() for hdr in fsm.header])
+                entry = [fsm, header, threading.Lock()]
+                self.fsms[tmpl_path] = entry
+        return entry
+
+    def parse(self, tmpl_path, data):
+        [fsm, header, lock] = self.compile(tmpl_path)
+        with lock:
+            fsm.Reset()
+            rows = fsm.ParseText(data)
+        return header, rows
+
+    def clear(self):
+        with self.lock:
+            self.fsms.clear()
+            self.rows.clear()
+            self.hits = 0
+            self.misses = 0
+
+cache = TemplateCache(int(env.get("SPYTEST_TEXTFSM_CACHE_SIZE", "1024")))
+
 class Template(object):
 
     def __init__(self, platform=None, cli=None):
@@ -19,8 +78,8 @@ class Template(object):
     def reinit(self, platform=None, cli=None):
         self.root = os.path.join(os.path.dirname(__file__), '..', 'templates')
         self.samples = os.path.join(self.root, 'test')
-        index_file = env.get("SPYTEST_TEXTFSM_INDEX_FILENAME", "index")
-        self.cli_table = clitable.CliTable(index_file, self.root)
+        self.index_file = env.get("SPYTEST_TEXTFSM_INDEX_FILENAME", "index")
+        self.cli_table = clitable.CliTable(self.index_file, self.root)
         self.platform = platform
         self.cli = cli
 
@@ -56,37 +115,90 @@ class Template(object):
         return [tmpl_file, ""]
 
     # find template the given command and apply on given data
-    def apply(self, output, cmd):
+    # returns template, lower case header and rows as lists of values
+    def parse(self, output, cmd):
         attrs = dict(Command=cmd)
         if self.platform: attrs["Platform"] = self.platform
         if self.cli: attrs["cli"] = self.cli
-        try:
-            self.cli_table.ParseCmd(output, attrs)
-            objs = []
-            for row in self.cli_table:
-                temp_dict = {}
-                for index, element in enumerate(row):
-                    if index >= len(self.cli_table.header):
-                        print("HEADER: {} ROW: {}".format(self.cli_table.header, row))
-                    temp_dict[self.cli_table.header[index].lower()] = element
-                objs.append(temp_dict)
-            tmpl_file = self.get_tmpl(cmd)
-            return [tmpl_file, objs]
-        except clitable.CliTableError as e:
-            raise Exception('Unable to parse command "%s" - %s' % (cmd, str(e)))
+        key = (self.index_file, cmd, self.platform, self.cli)
+        tmpl_file = cache.lookup(key, self.cli_table.index, attrs)
+        if not tmpl_file:
+            msg = 'No template found for attributes: "%s"' % attrs
+            raise Exception('Unable to parse command "%s" - %s' % (cmd, msg))
+        if ":" in tmpl_file:
+            # multiple templates are merged on keys by clitable
+            try:
+                self.cli_table.ParseCmd(output, attrs, tmpl_file)
+            except clitable.CliTableError as e:
+                raise Exception('Unable to parse command "%s" - %s' % (cmd, str(e)))
+            header = [hdr.lower() for hdr in self.cli_table.header]
+            rows = [list(row) for row in self.cli_table]
+            return [tmpl_file, header, rows]
+        tmpl_path = os.path.join(self.root, tmpl_file)
+        header, rows = cache.parse(tmpl_path, output)
+        return [tmpl_file, header, rows]
+
+    # find template the given command and apply on given data
+    def apply(self, output, cmd):
+        [tmpl_file, header, rows] = self.parse(output, cmd)
+        objs = [dict(zip(header, row)) for row in rows]
+        return [tmpl_file, objs]
 
     # apply the given template on given data
     def apply_textfsm(self, tmpl_file, data):
         tmpl_file2 = os.path.join(self.root, tmpl_file)
-        tmpl_fp = open(tmpl_file2, "r")
-        out = textfsm.TextFSM(tmpl_fp).ParseText(data)
-        tmpl_fp.close()
-        return out
+        _, rows = cache.parse(tmpl_file2, data)
+        return rows
+
+    # parse all the sample files with clitable and compiled templates
+    # and report parses per second for each
+    def benchmark(self, count=10):
+        samples, seen = [], []
+        for row in self.cli_table.index.index:
+            tmpl_file = row['Template']
+            if tmpl_file in seen: continue
+            seen.append(tmpl_file)
+            fp = os.path.join(self.samples, os.path.splitext(tmpl_file)[0] + ".txt")
+            if os.path.isfile(fp):
+                with open(fp, 'r') as fh:
+                    samples.append([tmpl_file, fh.read()])
+        result = OrderedDict()
+        for name, func in [("clitable", self._bench_clitable),
+                           ("compiled", self._bench_compiled)]:
+            parses, start = 0, time.time()
+            for _ in range(count):
+                for tmpl_file, data in samples:
+                    try:
+                        func(tmpl_file, data)
+                        parses = parses + 1
+                    except Exception:
+                        pass
+            elapsed = time.time() - start
+            result[name] = parses / elapsed if elapsed else 0
+        return len(samples), result
+
+    def _bench_clitable(self, tmpl_file, data):
+        self.cli_table.ParseCmd(data, templates=tmpl_file)
+        header = [hdr.lower() for hdr in self.cli_table.header]
+        return [dict(zip(header, row)) for row in self.cli_table]
+
+    def _bench_compiled(self, tmpl_file, data):
+        header, rows = cache.parse(os.path.join(self.root, tmpl_file), data)
+        return [dict(zip(header, row)) for row in rows]
 
 if __name__ == "__main__":
     template = Template()
+    if len(sys.argv) >= 2 and sys.argv[1] == "--bench":
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        nsamples, result = template.benchmark(count)
+        print("============ Samples: {} Iterations: {}".format(nsamples, count))
+        for name, rate in result.items():
+            print("{:>10}: {:.1f} parses/sec".format(name, rate))
+        sys.exit(0)
+
     if len(sys.argv) <= 2:
         print("USAGE: template.py <template file> <data file>")
+        print("       template.py --bench [iterations]")
         sys.exit(0)
 
     f = open(sys.argv[2], "r")
@@ -101,4 +213,3 @@ if __name__ == "__main__":
     except Exception as exp:
         print("============ ERROR: {}".format(exp))
         print (rv)
-
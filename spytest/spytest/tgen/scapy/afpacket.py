@@ -1,13 +1,21 @@
 """
-AF_PACKET receive support
+AF_PACKET receive and batched send support
 
 When VLAN offload is enabled on the NIC Linux will not deliver the VLAN tag
 in the data returned by recv. Instead, it delivers the VLAN TCI in a control
 message. Python 2.x doesn't have built-in support for recvmsg, so we have to
 use ctypes to call it. The recv function exported by this module reconstructs
 the VLAN tag if it was offloaded.
+
+The send function sends a batch of packets with one sendmmsg call.
+
+RxRing receives packets in bulk from a memory mapped ring (TPACKET_V2)
+shared with the kernel, without a system call per packet. The kernel
+delivers the VLAN TCI in the ring frame header.
 """
 
+import mmap
+import select
 import struct
 from ctypes import sizeof
 from ctypes import get_errno
@@ -29,6 +37,14 @@ ETH_P_8021Q = 0x8100
 SOL_PACKET = 263
 PACKET_AUXDATA = 8
 TP_STATUS_VLAN_VALID = 1 << 4
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V2 = 1
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# tp_status tp_len tp_snaplen tp_mac tp_net tp_sec tp_nsec tp_vlan_tci tp_vlan_tpid
+tpacket2_hdr = struct.Struct("IIIHHIIHH")
 
 class struct_iovec(Structure):
     _fields_ = [
@@ -47,6 +63,12 @@ class struct_msghdr(Structure):
         ("msg_flags", c_int),
     ]
 
+class struct_mmsghdr(Structure):
+    _fields_ = [
+        ("msg_hdr", struct_msghdr),
+        ("msg_len", c_uint),
+    ]
+
 class struct_cmsghdr(Structure):
     _fields_ = [
         ("cmsg_len", c_size_t),
@@ -69,6 +91,12 @@ libc = CDLL("libc.so.6")
 recvmsg = libc.recvmsg
 recvmsg.argtypes = [c_int, POINTER(struct_msghdr), c_int]
 recvmsg.retype = c_int
+try:
+    sendmmsg = libc.sendmmsg
+    sendmmsg.argtypes = [c_int, POINTER(struct_mmsghdr), c_uint, c_int]
+    sendmmsg.restype = c_int
+except AttributeError:
+    sendmmsg = None
 
 def enable_auxdata(sk):
     """
@@ -124,3 +152,93 @@ def recv(sk, bufsize):
         return buf.raw[:12] + tag + buf.raw[12:rv]
     else:
         return buf.raw[:rv]
+
+def send(sk, frames):
+    """
+    Send packets on an AF_PACKET socket with as few system calls as possible
+    @sk Socket
+    @frames List of packets
+    Returns the number of packets sent, which is less than the number
+    of packets only when the sending fails after some packets were sent.
+    """
+    if not sendmmsg:
+        for frame in frames:
+            sk.send(frame)
+        return len(frames)
+
+    count = len(frames)
+    bufs = [create_string_buffer(frame, len(frame)) for frame in frames]
+    iovs = (struct_iovec * count)()
+    msgs = (struct_mmsghdr * count)()
+    for index, buf in enumerate(bufs):
+        iovs[index].iov_base = cast(buf, c_void_p)
+        iovs[index].iov_len = len(frames[index])
+        msgs[index].msg_hdr.msg_iov = pointer(iovs[index])
+        msgs[index].msg_hdr.msg_iovlen = 1
+
+    sent = 0
+    while sent < count:
+        rv = sendmmsg(sk.fileno(), pointer(msgs[sent]), count - sent, 0)
+        if rv <= 0:
+            if sent:
+                break
+            msg = "sendmmsg failed: rv={} errno={}".format(rv, get_errno())
+            raise RuntimeError(msg)
+        sent = sent + rv
+    return sent
+
+class RxRing(object):
+    """
+    Memory mapped receive ring of an AF_PACKET socket
+    @sk Socket
+    @frame_size Maximum packet size including the ring frame header
+    @frame_nr Number of packets the ring holds
+    """
+    def __init__(self, sk, frame_size=16384, frame_nr=256, frames_per_block=4):
+        block_nr = max(frame_nr // frames_per_block, 1)
+        block_size = frame_size * frames_per_block
+        sk.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+        req = struct.pack("IIII", block_size, block_nr, frame_size, block_nr * frames_per_block)
+        sk.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+        self.ring = mmap.mmap(sk.fileno(), block_size * block_nr, mmap.MAP_SHARED,
+                              mmap.PROT_READ | mmap.PROT_WRITE)
+        self.frame_size = frame_size
+        self.frame_nr = block_nr * frames_per_block
+        self.index = 0
+        self.poller = select.poll()
+        self.poller.register(sk.fileno(), select.POLLIN | select.POLLERR)
+
+    def close(self):
+        self.ring.close()
+
+    def recv(self, timeout=1.0, max_count=None):
+        """
+        Receive the packets available in the ring
+        @timeout Seconds to wait for the first packet
+        @max_count Maximum number of packets returned, all in the ring by default
+        """
+        retval = []
+        max_count = max_count or self.frame_nr
+        waited = False
+        while len(retval) < max_count:
+            offset = self.index * self.frame_size
+            hdr = tpacket2_hdr.unpack_from(self.ring, offset)
+            if not hdr[0] & TP_STATUS_USER:
+                if retval or waited:
+                    break
+                self.poller.poll(int(timeout * 1000))
+                waited = True
+                continue
+
+            (status, _, snaplen, mac, _, _, _, vlan_tci, _) = hdr
+            data = self.ring[offset + mac:offset + mac + snaplen]
+            if vlan_tci != 0 or status & TP_STATUS_VLAN_VALID:
+                # Insert VLAN tag
+                tag = struct.pack("!HH", ETH_P_8021Q, vlan_tci)
+                data = data[:12] + tag + data[12:]
+            retval.append(data)
+
+            # give the frame back to the kernel
+            struct.pack_into("I", self.ring, offset, TP_STATUS_KERNEL)
+            self.index = (self.index + 1) % self.frame_nr
+        return retval
@@ -1,5 +1,7 @@
 import os
 import time
+import heapq
+import itertools
 import traceback
 import threading
 
@@ -74,6 +76,8 @@ class ScapyDriver(object):
 
     def captureQueueInit(self):
         self.pkts_captured = []
+        self.track_sids = dict()
+        self.track_version = None
 
     def startCapture(self):
         self.logger.debug("start-cap: {}".format(self.iface))
@@ -96,11 +100,8 @@ class ScapyDriver(object):
     def getCapture(self):
         self.logger.debug("get-cap: {}".format(self.iface))
         retval = []
-        for pkt in self.pkts_captured:
-            (data, hex_bytes) = (str(pkt), [])
-            for index in range(len(data)):
-                hex_bytes.append("%02X"% ord(data[index]))
-            retval.append(hex_bytes)
+        for data in self.pkts_captured:
+            retval.append(["%02X" % byte for byte in bytearray(data)])
         return retval
 
     def rx_any_enable(self):
@@ -118,8 +119,7 @@ class ScapyDriver(object):
             # read packets
             while self.rx_any_enable():
                 try:
-                    packet = self.packet.readp(iface=self.iface)
-                    if packet:
+                    for packet in self.packet.readp(iface=self.iface):
                         self.handle_recv(None, packet)
                 except Exception as e:
                     if str(e) != "[Errno 100] Network is down":
@@ -142,6 +142,16 @@ class ScapyDriver(object):
                 self.packet.set_link(status)
             self.iface_status = status
 
+    def get_track_sids(self):
+        # map of signature to tracked stream, rebuilt when the streams change
+        if self.track_version != self.port.track_version:
+            track_sids = dict()
+            for stream in reversed(self.port.track_streams):
+                sid = stream.get_sid()
+                if sid: track_sids[sid.encode()] = stream
+            (self.track_sids, self.track_version) = (track_sids, self.port.track_version)
+        return self.track_sids
+
     def handle_stats(self, packet):
         pktlen = 0 if not packet else len(packet)
         framesReceived = self.port.incrStat('framesReceived')
@@ -150,11 +160,10 @@ class ScapyDriver(object):
             self.logger.debug("{} framesReceived: {}".format(self.iface, framesReceived))
         if pktlen > 1518:
             self.port.incrStat('oversizeFramesReceived')
-        for stream in self.port.track_streams:
-            if self.packet.match_stream(stream, packet):
-                stream.incrStat('framesReceived')
-                stream.incrStat('bytesReceived', pktlen)
-                break # no need to check in other streams
+        stream = self.get_track_sids().get(self.packet.get_signature(packet))
+        if stream:
+            stream.incrStat('framesReceived')
+            stream.incrStat('bytesReceived', pktlen)
 
     def handle_capture(self, packet):
         self.pkts_captured.append(packet)
@@ -170,6 +179,10 @@ class ScapyDriver(object):
         self.txState.clear()
         self.txStateAck = dict()
         self.stream_pkts = dict()
+        # packets due within the window are sent together
+        self.tx_window = self.utils.get_env_int("SPYTEST_SCAPY_TX_WINDOW_USEC", 1000) / 1000000.0
+        self.tx_start_interval = 0.1
+        self.tx_max_lag = 1.0
         self.txThread = threading.Thread(target=self.txThreadMain, args=())
         self.txThread.daemon = True
         self.txThread.start()
@@ -301,10 +314,15 @@ class ScapyDriver(object):
                     self.logger.debug(" start {} {}/{}".format(stream.stream_id, stream.enable, stream.enable2))
                 if stream.enable and stream.enable2:
                     pwa = self.packet.build_first(stream)
-                    pwa.tx_time = time.clock()
+                    pwa.tx_time = self.utils.clock()
+                    pwa.tx_start = pwa.tx_time
+                    pwa.tx_first = 0
+                    pwa.tx_sent = 0
                     pwa_list.append(pwa)
                     sids[stream.stream_id] = 0
                     self.stop_ack_wait(stream.stream_id)
+                    stream.stats["txRateRequested"] = pwa.rate_pps
+                    stream.stats["txRateAchieved"] = 0
         except Exception as exp:
             self.logger.log_exception(exp, traceback.format_exc())
 
@@ -319,76 +337,100 @@ class ScapyDriver(object):
             self.logger.debug("txThreadMainInner {} Nothing Todo".format(self.iface))
             return
 
+        # streams ordered on next packet send time
+        (tx_queue, tx_seq) = ([], itertools.count())
+        for pwa in pwa_list:
+            heapq.heappush(tx_queue, (pwa.tx_time, next(tx_seq), pwa))
+
         tx_count = 0
+        start_time = self.utils.clock() + self.tx_start_interval
         while (self.txState.is_set()):
             # call start again to see if new streams are created
             # while there are transmitting streams
-            if not self.txThreadMainInnerStart(pwa_list, sids):
-                break
-
-            # sort based on next packet send time
-            pwa_list.sort(key=self.pwa_sort)
-
-            pwa_next_list = []
-            for pwa in pwa_list:
-                if not pwa.stream.enable or not pwa.stream.enable2:
+            if not tx_queue or self.utils.clock() >= start_time:
+                pwa_list = []
+                self.txThreadMainInnerStart(pwa_list, sids)
+                for pwa in pwa_list:
+                    heapq.heappush(tx_queue, (pwa.tx_time, next(tx_seq), pwa))
+                if not tx_queue: break
+                start_time = self.utils.clock() + self.tx_start_interval
+
+            # drop the stopped streams
+            while tx_queue and not self.tx_enabled(tx_queue[0][2]):
+                heapq.heappop(tx_queue)
+            if not tx_queue: continue
+
+            # wait for the first packet, but not beyond checking for new streams
+            if not self.tx_wait(min(tx_queue[0][0], start_time)):
+                continue
+
+            # send the packets of all the streams due within the window together
+            (frames, now) = ([], self.utils.clock())
+            while tx_queue and tx_queue[0][0] <= now + self.tx_window:
+                pwa = heapq.heappop(tx_queue)[2]
+                if not self.tx_enabled(pwa):
                     continue
-                self.pwa_wait(pwa)
                 try:
-                    send_start_time = time.clock()
-                    pkt = self.send_packet(pwa, pwa.stream.stream_id)
-                    bytesSent = len(pkt)
-                    send_time = time.clock() - send_start_time
-
-                    # increment port counters
-                    framesSent = self.port.incrStat('framesSent')
-                    self.port.incrStat('bytesSent', bytesSent)
-                    if self.dbg > 2:
-                        self.logger.debug("{} framesSent: {}".format(self.iface, framesSent))
-                    pwa.stream.incrStat('framesSent')
-                    pwa.stream.incrStat('bytesSent', bytesSent)
-                    tx_count = tx_count + 1
-
-                    # increment stream counters
-                    stream_tx = self.stream_pkts[pwa.stream.stream_id] + 1
-                    self.stream_pkts[pwa.stream.stream_id] = stream_tx
-                    if self.dbg > 2 or (self.dbg > 1 and stream_tx%100 == 99):
-                        self.logger.debug("{}/{} framesSent: {}".format(self.iface,
-                                            pwa.stream.stream_id, stream_tx))
+                    (pkts, next_pwa, ipg) = self.packet.build_burst(pwa)
+                    self.tx_stats(pwa, pkts, now)
                 except Exception as e:
                     self.logger.log_exception(e, traceback.format_exc())
                     pwa.stream.enable2 = False
-                else:
-                    build_start_time = time.clock()
-                    pwa = self.packet.build_next(pwa)
-                    if not pwa: continue
-                    build_time = time.clock() - build_start_time
-                    ipg = self.packet.build_ipg(pwa)
-                    pwa.tx_time = time.clock() + ipg - build_time - send_time
-                    pwa_next_list.append(pwa)
-            pwa_list = pwa_next_list
+                    continue
+                frames.extend(pkts)
+                tx_count = tx_count + len(pkts)
+                if not next_pwa: continue
+                # schedule from the due time rather than the send time so that
+                # the rate doesn't drift, unless the stream is too far behind
+                next_pwa.tx_time = max(pwa.tx_time + ipg, now - self.tx_max_lag)
+                heapq.heappush(tx_queue, (next_pwa.tx_time, next(tx_seq), next_pwa))
+
+            if frames:
+                try:
+                    self.packet.sendp_batch(frames, self.iface, "*", 0)
+                except Exception as e:
+                    self.logger.log_exception(e, traceback.format_exc())
+
         self.logger.debug("txThreadMainInner {} Completed {}".format(self.iface, tx_count))
 
-    def pwa_sort(self, pwa):
-        return pwa.tx_time
-
-    def pwa_wait(self, pwa):
-        delay = pwa.tx_time - time.clock()
-        if self.dbg > 2 or (self.dbg > 1 and pwa.left != 0):
-            self.logger.debug("stream: {} delay: {} pps: {}".format(pwa.stream.stream_id, delay, pwa.rate_pps))
-        if delay <= 0:
-            # yield
-            time.sleep(0)
-        elif delay > 1.0/10:
-            self.utils.msleep(delay * 1000, 10)
-        elif delay > 1.0/100:
-            self.utils.msleep(delay * 1000, 1)
-        elif delay > 1.0/200:
-            self.utils.usleep(delay * 1000 * 1000, 100)
-        elif delay > 1.0/500:
-            self.utils.usleep(delay * 1000 * 1000, 10)
-        else:
-            self.utils.usleep(delay * 1000 * 1000)
+    def tx_enabled(self, pwa):
+        return pwa.stream.enable and pwa.stream.enable2
+
+    def tx_wait(self, tx_time):
+        # returns True when the time is reached
+        delay = tx_time - self.utils.clock()
+        if self.dbg > 2:
+            self.logger.debug("{} tx delay: {}".format(self.iface, delay))
+        if delay > 0:
+            time.sleep(delay)
+            return self.utils.clock() >= tx_time
+        return True
+
+    def tx_stats(self, pwa, pkts, now):
+        bytesSent = sum([len(pkt) for pkt in pkts])
+
+        # increment port counters
+        framesSent = self.port.incrStat('framesSent', len(pkts))
+        self.port.incrStat('bytesSent', bytesSent)
+        if self.dbg > 2:
+            self.logger.debug("{} framesSent: {}".format(self.iface, framesSent))
+        pwa.stream.incrStat('framesSent', len(pkts))
+        pwa.stream.incrStat('bytesSent', bytesSent)
+
+        # increment stream counters
+        stream_tx = self.stream_pkts[pwa.stream.stream_id] + len(pkts)
+        self.stream_pkts[pwa.stream.stream_id] = stream_tx
+        if self.dbg > 2 or (self.dbg > 1 and stream_tx%100 < len(pkts)):
+            self.logger.debug("{}/{} framesSent: {}".format(self.iface,
+                                pwa.stream.stream_id, stream_tx))
+
+        # achieved rate excludes the packets sent at start time
+        if not pwa.tx_sent:
+            (pwa.tx_start, pwa.tx_first) = (now, len(pkts))
+        pwa.tx_sent = pwa.tx_sent + len(pkts)
+        if now > pwa.tx_start:
+            rate = (pwa.tx_sent - pwa.tx_first) / (now - pwa.tx_start)
+            pwa.stream.stats["txRateAchieved"] = int(round(rate))
 
     def send_packet(self, pwa, stream_name):
         return self.packet.send_packet(pwa, self.iface, stream_name, pwa.left)
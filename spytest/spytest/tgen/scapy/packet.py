@@ -22,6 +22,7 @@ from scapy.config import Conf
 from dicts import SpyTestDict
 from utils import Utils
 from logger import Logger
+from template import PacketTemplate
 
 try: print("SCAPY VERSION = {}".format(Conf().version))
 except Exception: print("SCAPY VERSION = UNKNOWN")
@@ -130,6 +131,8 @@ class ScapyPacket(object):
         except Exception: self.logger.info("SCAPY VERSION = UNKNOWN")
         self.utils = Utils(self.dry, logger=self.logger)
         self.max_rate_pps = self.utils.get_env_int("SPYTEST_SCAPY_MAX_RATE_PPS", 100)
+        self.tx_template = bool(self.utils.get_env_int("SPYTEST_SCAPY_TX_TEMPLATE", 1))
+        self.tx_batch = self.utils.get_env_int("SPYTEST_SCAPY_TX_BATCH", 64)
         self.dbg = dbg
         self.show_summary = bool(self.dbg > 2)
         self.hex = hex
@@ -138,6 +141,8 @@ class ScapyPacket(object):
         self.tx_count = 0
         self.rx_count = 0
         self.rx_sock = None
+        self.rx_ring = None
+        self.rx_ring_frames = self.utils.get_env_int("SPYTEST_SCAPY_RX_RING_FRAMES", 256)
         self.tx_sock = None
         self.finished = False
         self.exabgp_nslist = []
@@ -225,6 +230,7 @@ class ScapyPacket(object):
         self.logger.info("ScapyPacket {} cleanup...".format(self.iface))
         self.exabgpd_stop_all()
         self.finished = True
+        self.rx_ring = self.close_sock(self.rx_ring)
         self.rx_sock = self.close_sock(self.rx_sock)
         self.tx_sock = self.close_sock(self.tx_sock)
         self.init_bridge(self.iface)
@@ -237,45 +243,64 @@ class ScapyPacket(object):
         self.rx_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 12 * 1024)
         self.rx_sock.bind((self.iface+"-rx", 3))
         afpacket.enable_auxdata(self.rx_sock)
+        if self.rx_ring_frames > 0:
+            try:
+                self.rx_ring = afpacket.RxRing(self.rx_sock, frame_nr=self.rx_ring_frames)
+            except Exception as exp:
+                self.logger.debug("Failed to create RX ring {} {}".format(self.iface, exp))
 
     def set_link(self, status):
         msg = "link:{} status:{}".format
         self.logger.debug(msg(iface, status))
 
     def readp(self, iface):
+        # returns the received frames, scapy packets are built only when tracing
 
         if self.dry:
             time.sleep(2)
-            return None
+            return []
 
         if not self.iface:
-            return None
+            return []
 
         try:
-            data = afpacket.recv(self.rx_sock, 12 * 1024)
+            if self.rx_ring:
+                frames = self.rx_ring.recv()
+            else:
+                frames = [afpacket.recv(self.rx_sock, 12 * 1024)]
         except Exception as exp:
             if self.finished:
-                return None
+                return []
             raise exp
-        packet = Ether(data)
-        self.rx_count = self.rx_count + 1
+        self.rx_count = self.rx_count + len(frames)
         self.trace_stats()
 
         if self.dbg > 1:
-            cmd = "" if not self.show_summary else packet.command()
-            msg = "readp:{} len:{} count:{} {}".format
-            self.logger.debug(msg(iface, len(data), self.rx_count, cmd))
-
-        if self.dbg > 2:
-            self.trace_packet(packet, self.hex)
-
-        return packet
+            for data in frames:
+                packet = Ether(data)
+                cmd = "" if not self.show_summary else packet.command()
+                msg = "readp:{} len:{} count:{} {}".format
+                self.logger.debug(msg(iface, len(data), self.rx_count, cmd))
+                if self.dbg > 2:
+                    self.trace_packet(packet, self.hex)
+
+        return frames
+
+    def tx_open(self, iface):
+        if not self.tx_sock:
+            try:
+                self.tx_sock = L2Socket(iface)
+            except Exception as exp:
+                self.logger.debug("Failed to create L2Socket {} {}".format(iface, exp))
+        return self.tx_sock
 
     def sendp(self, pkt, data, iface, stream_name, left):
         self.tx_count = self.tx_count + 1
         self.trace_stats()
 
         if self.dbg > 2 or (self.dbg > 1 and left != 0):
+            # template frames are not built by scapy
+            if pkt is None: pkt = Ether(data)
             cmd = "" if not self.show_summary else pkt.command()
             msg = "sendp:{}:{} len:{} count:{} {}".format
             self.logger.debug(msg(iface, stream_name, len(data), self.tx_count, cmd))
@@ -284,13 +309,7 @@ class ScapyPacket(object):
             self.trace_packet(pkt, self.hex)
 
         if not self.dry:
-            if not self.tx_sock:
-                try:
-                    self.tx_sock = L2Socket(iface)
-                except Exception as exp:
-                    self.logger.debug("Failed to create L2Socket {} {}".format(iface, exp))
-
-            if self.tx_sock:
+            if self.tx_open(iface):
                 try: return self.tx_sock.send(data)
                 except Exception: pass
             try:
@@ -299,6 +318,20 @@ class ScapyPacket(object):
                 self.logger.debug("Failed to send legacy {} {}".format(iface, exp))
                 if self.is_vde: self.os_system("ip link set dev {0} up".format(iface))
 
+    def sendp_batch(self, frames, iface, stream_name, left):
+        sent = 0
+        if len(frames) > 1 and not self.dry and self.dbg <= 1 and self.tx_open(iface):
+            try:
+                sent = afpacket.send(self.tx_sock, frames)
+            except Exception as exp:
+                self.logger.debug("Failed to send batch {} {}".format(iface, exp))
+            self.tx_count = self.tx_count + sent
+            self.trace_stats()
+
+        # send one at a time what is not sent in batch
+        for data in frames[sent:]:
+            self.sendp(None, data, iface, stream_name, left)
+
     def trace_stats(self):
         #self.logger.debug("Name: {} RX: {} TX: {}".format(self.iface, self.rx_count, self.tx_count))
         pass
@@ -316,7 +349,10 @@ class ScapyPacket(object):
         if fields: self.show_pkt(pkt)
         if hex: hexdump(pkt)
 
-    def send_packet(self, pwa, iface, stream_name, left):
+    def build_frame(self, pwa):
+        if pwa.template:
+            return pwa.template.frame()
+
         if pwa.padding:
             strpkt = str(pwa.pkt/pwa.padding)
         else:
@@ -334,10 +370,35 @@ class ScapyPacket(object):
             crc = binascii.unhexlify(crc1)
         except Exception:
             crc = binascii.unhexlify('00' * 4)
-        bstr = bytes(strpkt+crc)
-        self.sendp(pwa.pkt, bstr, iface, stream_name, left)
+        return bytes(strpkt+crc)
+
+    def send_packet(self, pwa, iface, stream_name, left):
+        bstr = self.build_frame(pwa)
+        pkt = None if pwa.template else pwa.pkt
+        self.sendp(pkt, bstr, iface, stream_name, left)
         return bstr
 
+    def build_burst(self, pwa):
+        # build the packets of the stream which are due now
+        # returns the frames, the stream unless it is completed
+        # and the gap to the next packet of the stream
+        (frames, ipg) = ([], 0)
+        while pwa:
+            frames.append(self.build_frame(pwa))
+            pwa = self.build_next(pwa)
+            if pwa:
+                ipg = self.build_ipg(pwa)
+                if ipg > 0 or len(frames) >= self.tx_batch:
+                    break
+        return frames, pwa, ipg
+
+    def send_burst(self, pwa, iface, stream_name):
+        # send the packets of the stream which are due now in one batch
+        left = pwa.left
+        (frames, pwa, ipg) = self.build_burst(pwa)
+        self.sendp_batch(frames, iface, stream_name, left)
+        return frames, pwa, ipg
+
     def check(self, pkt):
         pkt.do_build()
         if self.dbg > 3:
@@ -767,9 +828,22 @@ class ScapyPacket(object):
         pwa.frame_size_max = frame_size_max
         pwa.frame_size_step = frame_size_step
         self.add_padding(pwa, True)
+        pwa.template = self.build_template(pwa)
 
         return pwa
 
+    def build_template(self, pwa):
+        if not self.tx_template or pwa.length_mode != "fixed":
+            return None
+        sid = None
+        if pwa.add_signature:
+            sid = pwa.stream.get_sid() or "DeadBeef"
+        try:
+            return PacketTemplate(pwa.pkt, pwa.stream.kws, sid)
+        except Exception as exp:
+            self.logger.debug("stream {} not using template: {}".format(pwa.stream.stream_id, exp))
+        return None
+
     def add_padding(self, pwa, first):
         pwa.padding = None
         if pwa.length_mode == "random":
@@ -985,9 +1059,9 @@ class ScapyPacket(object):
             tcp_dst_port_count  = self.utils.intval(pwa.stream.kws, "tcp_dst_port_count", 0)
             if tcp_dst_port_mode in ["increment", "decrement", "incr", "decr"]:
                 if tcp_dst_port_mode in ["increment", "incr"]:
-                    pwa.pkt[TCP].dport = pwa.pkt[TCP].sport + tcp_dst_port_step
+                    pwa.pkt[TCP].dport = pwa.pkt[TCP].dport + tcp_dst_port_step
                 else:
-                    pwa.pkt[TCP].dport = pwa.pkt[TCP].sport - tcp_dst_port_step
+                    pwa.pkt[TCP].dport = pwa.pkt[TCP].dport - tcp_dst_port_step
                 pwa.tcp_dst_port_count = pwa.tcp_dst_port_count + 1
                 if tcp_dst_port_count > 0 and pwa.tcp_dst_port_count >= tcp_dst_port_count:
                     pwa.pkt[TCP].dport = self.utils.intval(pwa.stream.kws, "tcp_dst_port", 0)
@@ -1019,9 +1093,9 @@ class ScapyPacket(object):
             udp_dst_port_count  = self.utils.intval(pwa.stream.kws, "udp_dst_port_count", 0)
             if udp_dst_port_mode in ["increment", "decrement", "incr", "decr"]:
                 if udp_dst_port_mode in ["increment", "incr"]:
-                    pwa.pkt[UDP].dport = pwa.pkt[UDP].sport + udp_dst_port_step
+                    pwa.pkt[UDP].dport = pwa.pkt[UDP].dport + udp_dst_port_step
                 else:
-                    pwa.pkt[UDP].dport = pwa.pkt[UDP].sport - udp_dst_port_step
+                    pwa.pkt[UDP].dport = pwa.pkt[UDP].dport - udp_dst_port_step
                 pwa.udp_dst_port_count = pwa.udp_dst_port_count + 1
                 if udp_dst_port_count > 0 and pwa.udp_dst_port_count >= udp_dst_port_count:
                     pwa.pkt[UDP].dport = self.utils.intval(pwa.stream.kws, "udp_dst_port", 0)
@@ -1034,6 +1108,12 @@ class ScapyPacket(object):
 
         return pwa
 
+    def build_next_frame(self, pwa):
+        if pwa.template:
+            pwa.template.advance()
+            return pwa
+        return self.build_next_dma(pwa)
+
     def build_next(self, pwa):
         if self.dbg > 2 or (self.dbg > 1 and pwa.left != 0):
             self.logger.debug("build_next {}/{} {} left={}".format(self.iface, pwa.stream.stream_id, pwa.transmit_mode, pwa.left))
@@ -1041,20 +1121,20 @@ class ScapyPacket(object):
         if pwa.transmit_mode in ["continuous"] and pwa.duration2 > 0:
             if pwa.left <= 0: return None
             pwa.left = pwa.left - 1
-            pwa = self.build_next_dma(pwa)
+            pwa = self.build_next_frame(pwa)
             return pwa
 
         if pwa.transmit_mode in ["continuous"]:
-            pwa = self.build_next_dma(pwa)
+            pwa = self.build_next_frame(pwa)
             return pwa
 
         if pwa.transmit_mode in ["continuous_burst"]:
             pwa.burst_sent = pwa.burst_sent + 1
-            pwa = self.build_next_dma(pwa)
+            pwa = self.build_next_frame(pwa)
             return pwa
 
         if pwa.left > 1:
-            pwa = self.build_next_dma(pwa)
+            pwa = self.build_next_frame(pwa)
             if not pwa: return None
 
         pwa.burst_sent = pwa.burst_sent + 1
@@ -1066,21 +1146,19 @@ class ScapyPacket(object):
         return None
 
     def build_ipg(self, pwa):
+        pps = self.utils.min_value(pwa.rate_pps, self.max_rate_pps)
+        if pwa.transmit_mode in ["continuous"]:
+            # packets are not sent in bursts
+            return 1.0/float(pps)
         if pwa.burst_sent != 0 and pwa.burst_sent < pwa.pkts_per_burst:
             return 0
         pwa.burst_sent = 0
-        pps = self.utils.min_value(pwa.rate_pps, self.max_rate_pps)
         return (1.0 * pwa.pkts_per_burst)/float(pps)
 
-    def match_stream(self, stream, pkt):
-        sid = stream.get_sid()
-        if not sid: return False
-        strpkt = str(pkt)
-        if sid == strpkt[-12:-4]:
-            self.logger.debug("{}: CMP0: {} {}".format(self.iface, sid, strpkt[-12:-4]))
-            return True
-        #self.logger.debug("{}: CMP1: {} {}".format(self.iface, sid, strpkt[-12:-4]))
-        return False
+    @staticmethod
+    def get_signature(data):
+        # stream id inserted before CRC by build_frame
+        return data[-12:-4]
 
     def if_delete_cmds(self, index, intf):
         ns = "{}_{}".format(intf.name, index)
@@ -16,6 +16,8 @@ def initStatistics(stats):
     stats["userDefinedStat1"] = 0
     stats["userDefinedStat2"] = 0
     stats["captureFilter"] = 0
+    stats["txRateRequested"] = 0
+    stats["txRateAchieved"] = 0
 
 def incrStat(stats, name, val = 1):
     if name in stats:
@@ -38,12 +40,14 @@ class ScapyStream(object):
         #print("ScapyStream: {} {} {}".format(self.port, self.stream_id, kws))
         if self.track_port:
             self.track_port.track_streams.append(self)
+            self.track_port.track_version += 1
         self.stream_lock = threading.Lock()
 
     def __del__(self):
         print("ScapyStream {} exiting...".format(self.stream_id))
         if self.track_port:
             self.track_port.track_streams.remove(self)
+            self.track_port.track_version += 1
 
     def get_sid(self):
         #if not self.track_port: return None
@@ -110,6 +114,7 @@ class ScapyPort(object):
         self.utils = Utils(self.dry, logger=self.logger)
         self.streams = SpyTestDict()
         self.track_streams = []
+        self.track_version = 0
         self.interfaces = SpyTestDict()
         self.stats = SpyTestDict()
         initStatistics(self.stats)
@@ -134,6 +139,7 @@ class ScapyPort(object):
             stream.track_port = None
             stream.unlock()
         self.track_streams = []
+        self.track_version += 1
 
     def cleanup(self):
         self.logger.debug("ScapyPort {} cleanup...".format(self.name))
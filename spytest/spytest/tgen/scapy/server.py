@@ -562,6 +562,8 @@ class ScapyServer(object):
         res["tx"]["raw_pkt_count"] = self.stat_value(tx_stats.framesSent, detailed)
         res["tx"]["pkt_byte_count"] = self.stat_value(tx_stats.bytesSent, detailed)
         res["tx"]["total_pkts"] = self.stat_value(tx_stats.framesSent, detailed)
+        res["tx"]["requested_pkt_rate"] = self.stat_value(tx_stats.txRateRequested, detailed)
+        res["tx"]["achieved_pkt_rate"] = self.stat_value(tx_stats.txRateAchieved, detailed)
         res["rx"] = SpyTestDict()
         res["rx"]["raw_pkt_rate"] = self.stat_value(1, detailed)
         res["rx"]["raw_pkt_count"] = self.stat_value(rx_stats.framesReceived, detailed)
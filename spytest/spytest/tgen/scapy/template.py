@@ -0,0 +1,223 @@
+"""
+Pre-encoded packet templates for the transmit path
+
+Building every frame with scapy (mutate the layer fields, serialize the whole
+packet, splice the stream signature and compute the CRC) limits a stream to a
+few thousand packets per second. A template serializes the first packet of a
+stream once and records the byte offsets of the fields which change from one
+packet to the next. The next packet is produced by patching those offsets in
+place and updating the affected checksums incrementally (RFC 1624).
+
+The fields are stepped exactly as ScapyPacket.build_next_dma does, streams
+using options which can't be expressed this way (random or incrementing frame
+sizes, unknown modes or checksums) are rejected with TemplateUnsupported and
+use the scapy path.
+"""
+
+import struct
+import socket
+import zlib
+import binascii
+
+from scapy.packet import Raw, Padding, NoPayload
+from scapy.layers.l2 import Ether, Dot1Q, ARP
+from scapy.layers.inet import IP, UDP, TCP
+from scapy.layers.inet6 import IPv6
+
+from utils import Utils
+
+# name, layer, offset in layer, width, kind, reset value key, reset value default
+TEMPLATE_FIELDS = [
+    ("mac_src", Ether, 6, 6, "mac", "mac_src", None),
+    ("mac_dst", Ether, 0, 6, "mac", "mac_dst", None),
+    ("arp_src_hw", ARP, 8, 6, "mac", "arp_src_hw_addr", "00:00:01:00:00:02"),
+    ("arp_dst_hw", ARP, 18, 6, "mac", "arp_dst_hw_addr", "00:00:00:00:00:00"),
+    ("ip_src", IP, 12, 4, "ipv4", "ip_src_addr", "0.0.0.0"),
+    ("ip_dst", IP, 16, 4, "ipv4", "ip_dst_addr", "192.0.0.1"),
+    ("ipv6_src", IPv6, 8, 16, "ipv6", "ipv6_src_addr", "fe80:0:0:0:0:0:0:12"),
+    ("ipv6_dst", IPv6, 24, 16, "ipv6", "ipv6_dst_addr", "fe80:0:0:0:0:0:0:22"),
+    ("vlan_id", Dot1Q, 0, 2, "vlan", "vlan_id", 0),
+    ("tcp_src_port", TCP, 0, 2, "int", "tcp_src_port", 0),
+    ("tcp_dst_port", TCP, 2, 2, "int", "tcp_dst_port", 0),
+    ("udp_src_port", UDP, 0, 2, "int", "udp_src_port", 0),
+    ("udp_dst_port", UDP, 2, 2, "int", "udp_dst_port", 0),
+]
+
+STEP_DEFAULTS = {"mac": "00:00:00:00:00:01", "ipv4": "0.0.0.1", "ipv6": "::1", "vlan": 1, "int": 1}
+
+INCR_MODES = ["increment", "incr"]
+DECR_MODES = ["decrement", "decr"]
+
+# modes accepted by build_next_dma for each kind of field
+KIND_MODES = {
+    "mac": ["increment", "decrement"],
+    "ipv4": ["increment", "decrement"],
+    "ipv6": ["increment", "decrement"],
+    "vlan": ["increment", "decrement"],
+    "int": ["increment", "decrement", "incr", "decr"],
+}
+
+# offset of the checksum in the layers which include the IP addresses in their checksum
+L4_CHECKSUM_OFFSET = {TCP: 16, UDP: 6}
+ICMPV6_CHECKSUM_OFFSET = 2
+IP_CHECKSUM_OFFSET = 10
+
+class TemplateUnsupported(Exception):
+    pass
+
+def to_int(kind, value):
+    if kind == "mac":
+        return int(value.replace(":", "").replace(".", ""), 16)
+    if kind == "ipv4":
+        return struct.unpack("!I", socket.inet_aton(value))[0]
+    if kind == "ipv6":
+        return Utils.ipv6_ip2long(value)
+    return int(value)
+
+def to_bytes(value, width):
+    return binascii.unhexlify("{:0{}x}".format(value, width * 2))
+
+def from_bytes(data, offset, width):
+    return int(binascii.hexlify(bytes(data[offset:offset+width])), 16)
+
+def csum_update(csum, old, new, width):
+    # HC' = ~(~HC + ~m + m') over the 16 bit words of the changed field
+    total = ~csum & 0xFFFF
+    for shift in range(0, width * 8, 16):
+        total += (~(old >> shift) & 0xFFFF) + ((new >> shift) & 0xFFFF)
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+def layer_offset(data, layer):
+    # the layer is serialized together with its payload and the padding
+    return len(data) - len(bytes(layer))
+
+def checksum_offsets(data, pkt, layer):
+    # checksums to be updated when the addresses of given IP layer change
+    retval = []
+    if isinstance(layer, IP):
+        retval.append((layer_offset(data, layer) + IP_CHECKSUM_OFFSET, False))
+    payload = layer.payload
+    if type(payload) in L4_CHECKSUM_OFFSET:
+        offset = layer_offset(data, payload) + L4_CHECKSUM_OFFSET[type(payload)]
+        retval.append((offset, isinstance(payload, UDP)))
+    elif isinstance(layer, IPv6) and type(payload).__name__.startswith("ICMPv6"):
+        retval.append((layer_offset(data, payload) + ICMPV6_CHECKSUM_OFFSET, False))
+    elif isinstance(layer, IPv6) and not isinstance(payload, (Raw, Padding, NoPayload)):
+        raise TemplateUnsupported("unknown checksum of {}".format(type(payload).__name__))
+    return retval
+
+class TemplateField(object):
+
+    def __init__(self, name, offset, width, value, step, count, reset, values, mask, csums):
+        self.name = name
+        self.offset = offset
+        self.width = width
+        self.value = value
+        self.step = step
+        self.count = count
+        self.counter = 0
+        self.reset = reset
+        self.values = values
+        self.mask = mask
+        self.csums = csums
+
+    def next_value(self):
+        self.counter = self.counter + 1
+        if self.values:
+            if self.counter >= len(self.values):
+                self.counter = 0
+            return self.values[self.counter]
+        if self.count > 0 and self.counter >= self.count:
+            self.counter = 0
+            return self.reset
+        return (self.value + self.step) & self.mask
+
+    def advance(self, data):
+        value = self.next_value()
+        if value == self.value:
+            return
+        self.value = value
+        old = from_bytes(data, self.offset, self.width)
+        new = (old & ~self.mask) | value
+        data[self.offset:self.offset+self.width] = to_bytes(new, self.width)
+        for offset, udp in self.csums:
+            csum = struct.unpack_from("!H", data, offset)[0]
+            if udp and csum == 0:
+                # UDP without checksum
+                continue
+            csum = csum_update(csum, old, new, self.width)
+            if udp and csum == 0:
+                csum = 0xFFFF
+            struct.pack_into("!H", data, offset, csum)
+
+class PacketTemplate(object):
+
+    def __init__(self, pkt, kws, sid=None):
+        data = bytes(pkt)
+        self.data = bytearray(data)
+        self.fields = []
+        sid_start = len(data) - len(sid) if sid else len(data)
+        for name, layer_cls, offset, width, kind, reset_key, reset_default in TEMPLATE_FIELDS:
+            mode = kws.get("{}_mode".format(name), "fixed").strip()
+            if mode == "fixed":
+                continue
+            if layer_cls not in pkt:
+                continue
+            field = self._build_field(data, pkt, name, layer_cls, offset, width,
+                                      kind, mode, kws, reset_key, reset_default)
+            if max([field.offset + field.width] + [csum[0] + 2 for csum in field.csums]) > sid_start:
+                # the signature overwrites the end of short frames
+                raise TemplateUnsupported("{} overlaps the signature".format(name))
+            self.fields.append(field)
+
+        # insert stream id before CRC
+        if sid:
+            self.data[-len(sid):] = bytearray(sid.encode())
+
+    def _build_field(self, data, pkt, name, layer_cls, offset, width, kind, mode, kws, reset_key, reset_default):
+        layer = pkt[layer_cls]
+        offset = layer_offset(data, layer) + offset
+        mask = (1 << (width * 8)) - 1
+        if kind == "vlan":
+            mask = 0x0FFF
+        value = from_bytes(data, offset, width) & mask
+
+        if mode == "list" and kind == "mac" and layer_cls is Ether:
+            values = [to_int(kind, val) for val in kws[reset_key]]
+            return TemplateField(name, offset, width, value, 0, 0, values[0], values, mask, [])
+        if mode not in KIND_MODES[kind]:
+            raise TemplateUnsupported("{}_mode {}".format(name, mode))
+
+        step = kws.get("{}_step".format(name), STEP_DEFAULTS[kind])
+        step = to_int(kind, step)
+        if mode in DECR_MODES:
+            step = -step
+        count = Utils.intval(kws, "{}_count".format(name), 0)
+        if kind == "mac" and layer_cls is Ether:
+            reset = kws[reset_key][0]
+        elif kind in ["vlan", "int"]:
+            reset = Utils.intval(kws, reset_key, reset_default)
+        else:
+            reset = kws.get(reset_key, reset_default)
+            if kind == "mac":
+                reset = reset.replace(".", ":")
+        reset = to_int(kind, reset) & mask
+
+        csums = []
+        if kind in ["ipv4", "ipv6"]:
+            csums = checksum_offsets(data, pkt, layer)
+        elif layer_cls in L4_CHECKSUM_OFFSET:
+            csums = [(layer_offset(data, layer) + L4_CHECKSUM_OFFSET[layer_cls], layer_cls is UDP)]
+
+        return TemplateField(name, offset, width, value, step, count, reset, None, mask, csums)
+
+    def advance(self):
+        for field in self.fields:
+            field.advance(self.data)
+
+    def frame(self):
+        data = bytes(self.data)
+        crc = struct.pack("!I", socket.htonl(zlib.crc32(data) & 0xFFFFFFFF))
+        return data + crc
@@ -0,0 +1,91 @@
+"""
+Benchmark of the scapy traffic generator transmit path
+
+For every stream type in ut_streams measures how many packets per second
+are built with scapy (build_next_dma + serialize) and with the pre-encoded
+template, and verifies that both produce the same frames. When an interface
+is given the frames are also sent, in batches for the template path.
+
+Usage: python tx_benchmark.py [--count 20000] [--iface <iface>] [--index 6]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import argparse
+
+from packet import ScapyPacket
+from port import ScapyStream
+from template import TEMPLATE_FIELDS
+from ut_streams import ut_stream_get
+
+def stream_type(kws):
+    parts = [kws.get("l2_encap", ""), kws.get("l3_protocol", "") or "l2", kws.get("l4_protocol", "")]
+    modes = [field[0] for field in TEMPLATE_FIELDS if kws.get(field[0] + "_mode", "fixed") != "fixed"]
+    if kws.get("length_mode", "fixed") != "fixed": modes.append("length")
+    name = "/".join([part for part in parts if part])
+    if modes: name = "{} {}".format(name, ",".join(sorted(modes)))
+    return name
+
+def build_stream(packet, index, template):
+    packet.tx_template = template
+    kws = ut_stream_get(index, transmit_mode="continuous")
+    return packet.build_first(ScapyStream(0, index, None, None, **kws))
+
+def run(packet, index, count, iface):
+    frames = {}
+    pps = {}
+    for template in [False, True]:
+        pwa = build_stream(packet, index, template)
+        if not pwa:
+            return None
+        if template and not pwa.template:
+            return [pps[False], None, None]
+        built = []
+        start = time.time()
+        while pwa and len(built) < count:
+            if iface:
+                (pkts, pwa, _) = packet.send_burst(pwa, iface, "bench")
+                built.extend(pkts)
+            else:
+                built.append(packet.build_frame(pwa))
+                pwa = packet.build_next(pwa)
+        pps[template] = len(built) / max(time.time() - start, 0.000001)
+        frames[template] = built
+    match = frames[True] == frames[False]
+    return [pps[False], pps[True], match]
+
+def main():
+    parser = argparse.ArgumentParser(description='Scapy TX path benchmark')
+    parser.add_argument('--count', type=int, default=20000, help='Packets per stream')
+    parser.add_argument('--iface', default=None, help='Interface to send the packets on')
+    parser.add_argument('--index', type=int, default=None, help='Only run the given ut_streams entry')
+    parser.add_argument('--batch', type=int, default=None, help='Packets per batch')
+    args = parser.parse_args()
+
+    packet = ScapyPacket(args.iface, 0, not args.iface, False)
+    if args.batch: packet.tx_batch = args.batch
+
+    print('{:>3} {:>12} {:>12} {:>8} {:>6}  {}'.format('idx', 'scapy pps', 'template pps', 'speedup', 'match', 'stream'))
+    retval = 0
+    for index in range(100):
+        if args.index is not None and index != args.index:
+            continue
+        kws = ut_stream_get(index)
+        if not kws:
+            break
+        res = run(packet, index, args.count, args.iface)
+        if not res:
+            continue
+        (scapy_pps, template_pps, match) = res
+        if template_pps is None:
+            print('{:>3} {:>12.0f} {:>12} {:>8} {:>6}  {}'.format(index, scapy_pps, '-', '-', '-', stream_type(kws)))
+            continue
+        if not match: retval = 1
+        print('{:>3} {:>12.0f} {:>12.0f} {:>7.1f}x {:>6}  {}'.format(index, scapy_pps, template_pps,
+              template_pps / scapy_pps, str(match), stream_type(kws)))
+    return retval
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,6 +21,27 @@ except ImportError:
 
 from logger import Logger
 
+def get_monotonic_clock():
+    if hasattr(time, "monotonic"):
+        return time.monotonic
+
+    # Python 2.x doesn't have time.monotonic
+    try:
+        import ctypes
+        class timespec(ctypes.Structure):
+            _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+        clock_gettime = ctypes.CDLL("librt.so.1").clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1
+        def monotonic():
+            ts = timespec()
+            clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts))
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+        monotonic()
+        return monotonic
+    except Exception:
+        return time.time
+
 class Utils(object):
     def __init__(self, dry=False, logger=None):
         self.dry = dry
@@ -288,6 +309,9 @@ class Utils(object):
             pass
         return default
 
+    # wall clock seconds which never go backwards, for measuring intervals
+    clock = staticmethod(get_monotonic_clock())
+
     @staticmethod
     def msleep(delay, block=1):
         mdelay = delay /1000.0
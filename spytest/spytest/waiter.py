@@ -0,0 +1,158 @@
+"""
+Adaptive waiting for st.poll_wait and the DUT event waits
+
+A fixed poll interval either keeps polling long after the condition became
+true (up to one interval is lost on every successful wait) or, when it is
+short, hammers the DUT for the whole duration of slow waits. The Waiter
+starts with a small interval and doubles it, with some jitter so that the
+threads polling several DUTs don't stay in lock step, up to the interval
+given by the caller.
+
+Instead of sleeping, a wait can block on a DUT side notification (a redis
+keyspace event or a syslog marker) which ends the interval as soon as
+something relevant changed. Notifications only wake the waiter up early,
+the condition is always checked again, so a notification missed between
+the check and the subscription costs at most one interval.
+
+Every wait is accounted to its wait site, the test or API line calling the
+framework, with the time to success and the time possibly wasted: the last
+interval of a successful poll (the condition became true somewhere in it),
+the whole duration of a timed out poll and the whole duration of a static
+st.wait/st.tg_wait which can't tell when it could have stopped.
+"""
+
+import os
+import sys
+import time
+import pipes
+import random
+import threading
+from collections import OrderedDict
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+framework_files = [os.path.join(root, "spytest"), os.path.join(root, "utilities", "common.py")]
+
+def get_call_site(skip=2, in_tests=False):
+    # first frame outside the framework, or the first one in the test
+    # modules when in_tests is set and there is one
+    frame = sys._getframe(skip)
+    retval = None
+    while frame:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if not any(filename.startswith(path) for path in framework_files):
+            filename = os.path.relpath(filename, root)
+            site = [filename, frame.f_lineno, frame.f_code.co_name]
+            if not in_tests or filename.startswith("tests" + os.sep):
+                return site
+            retval = retval or site
+        frame = frame.f_back
+    return retval or ["unknown", 0, ""]
+
+def get_wait_site(skip=2):
+    [filename, lineno, _] = get_call_site(skip + 1)
+    return "{}:{}".format(filename, lineno)
+
+class Waiter(object):
+
+    def __init__(self, timeout, max_delay, initial=0.25, factor=2, jitter=0.2, sleep=time.sleep):
+        self.timeout = timeout
+        self.max_delay = max_delay
+        self.delay = min(initial, max_delay) if initial > 0 else max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.sleep = sleep
+        self.polls = 0
+        self.slept = 0
+        self.last_sleep = 0
+        self.elapsed = 0
+
+    def next_delay(self, left):
+        delay = self.delay
+        if self.jitter:
+            delay = delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.delay = min(self.delay * self.factor, self.max_delay)
+        return max(min(delay, left), 0)
+
+    def wait(self, method, *args, **kwargs):
+        start = time.time()
+        end = start + self.timeout
+        rv = False
+        while True:
+            left = end - time.time()
+            if left <= 0:
+                break
+            delay = self.next_delay(left)
+            self.last_sleep = delay
+            sleep_start = time.time()
+            self.sleep(delay)
+            self.slept = self.slept + time.time() - sleep_start
+            self.polls = self.polls + 1
+            if method(*args, **kwargs):
+                rv = True
+                break
+        self.elapsed = time.time() - start
+        return rv
+
+class WaitSites(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sites = OrderedDict()
+
+    def init(self):
+        with self.lock:
+            self.sites = OrderedDict()
+
+    def add(self, site, kind, elapsed, wasted, success=True, polls=0):
+        with self.lock:
+            if site not in self.sites:
+                self.sites[site] = [kind, 0, 0, 0, 0, 0, 0]
+            entry = self.sites[site]
+            entry[1] = entry[1] + 1
+            entry[2] = entry[2] + polls
+            entry[4] = entry[4] + wasted
+            if success:
+                entry[3] = entry[3] + elapsed
+            else:
+                entry[5] = entry[5] + 1
+            entry[6] = entry[6] + elapsed
+
+    def merge(self, other):
+        for site, [kind, count, polls, success_time, wasted, timeouts, total] in other.items():
+            with self.lock:
+                if site not in self.sites:
+                    self.sites[site] = [kind, 0, 0, 0, 0, 0, 0]
+                entry = self.sites[site]
+                entry[1] = entry[1] + count
+                entry[2] = entry[2] + polls
+                entry[3] = entry[3] + success_time
+                entry[4] = entry[4] + wasted
+                entry[5] = entry[5] + timeouts
+                entry[6] = entry[6] + total
+
+    def items(self):
+        with self.lock:
+            return list(self.sites.items())
+
+    def rows(self):
+        # [site, kind, count, polls, time to success, wasted, timeouts, total] most wasteful first
+        rows = []
+        for site, [kind, count, polls, success_time, wasted, timeouts, total] in self.items():
+            rows.append([site, kind, count, polls, round(success_time, 3),
+                         round(wasted, 3), timeouts, round(total, 3)])
+        return sorted(rows, key=lambda row: row[5], reverse=True)
+
+# the pattern is quoted for the shell running the command and again for
+# the bash running the process substitution
+def redis_event_cmd(db, pattern, timeout):
+    channel = "__keyspace@{}__:{}".format(db, pattern)
+    timeout = "{:.1f}".format(timeout)
+    inner = "timeout {0} redis-cli -n {1} --csv psubscribe {2}".format(timeout, db, pipes.quote(channel))
+    script = "grep -m1 -q pmessage <({})".format(inner)
+    return "timeout {0} bash -c {1}".format(timeout, pipes.quote(script))
+
+def syslog_event_cmd(pattern, timeout):
+    timeout = "{:.1f}".format(timeout)
+    inner = "timeout {0} tail -n0 -F /var/log/syslog".format(timeout)
+    script = "grep -m1 -q -e {0} <({1})".format(pipes.quote(pattern), inner)
+    return "timeout {0} bash -c {1}".format(timeout, pipes.quote(script))
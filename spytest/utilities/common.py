@@ -1,7 +1,9 @@
+import io
 import os
 import re
 import sys
 import csv
+import gzip
 import glob
 import base64
 import random
@@ -139,13 +141,87 @@ def iterable(obj):
         return []
     return obj
 
+class ParsedOutput(list):
+    """
+    List of parsed output entries which answers the filter_and_select
+    matches through hash indexes instead of scanning all the entries.
+
+    An index maps the string value of a column to the positions of the
+    entries having it. It is built on the first match using the column
+    and kept until the list is modified, so repeated queries on the same
+    output take time in proportion to the number of matched entries.
+    The entries must not be modified in place once they are matched.
+    """
+
+    def __init__(self, entries=()):
+        list.__init__(self, entries)
+        self._indexes = dict()
+
+    def _index(self, key):
+        index = self._indexes.get(key)
+        if index is None:
+            index = dict()
+            for pos, ent in enumerate(self):
+                if key in ent:
+                    index.setdefault(str(ent[key]), []).append(pos)
+            self._indexes[key] = index
+        return index
+
+    def _match_positions(self, match):
+        if isinstance(match, list):
+            # list of matches - select if any one is matched
+            positions = set()
+            for m in match:
+                if not m:
+                    return range(len(self))
+                positions.update(self._match_positions(m))
+            return sorted(positions)
+
+        # select if all conditions match, starting from the least frequent value
+        postings = []
+        for key, value in match.items():
+            value = str(value)
+            positions = self._index(key).get(value)
+            if not positions:
+                return []
+            postings.append((len(positions), key, value, positions))
+        postings.sort(key=lambda posting: posting[0])
+        retval = postings[0][3]
+        for _, key, value, _ in postings[1:]:
+            retval = [pos for pos in retval if key in self[pos] and str(self[pos][key]) == value]
+        return retval
+
+    def match(self, match):
+        """
+        returns the entries matching the given match expression of filter_and_select
+        """
+        return [self[pos] for pos in self._match_positions(match)]
+
+    def select(self, select=None, match=None):
+        return filter_and_select(self, select, match)
+
+def _invalidate_indexes(name):
+    method = getattr(list, name)
+    def wrapper(self, *args, **kwargs):
+        # also called before __init__ when unpickled
+        self._indexes = dict()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ["append", "extend", "insert", "remove", "pop", "sort", "reverse", "clear",
+              "__setitem__", "__delitem__", "__iadd__", "__imul__", "__setslice__", "__delslice__"]:
+    if hasattr(list, _name):
+        setattr(ParsedOutput, _name, _invalidate_indexes(_name))
+
 def filter_and_select(output, select=None, match=None):
     """
 
     This method applies the given match in the output and
     returns columns as per given select
 
-    :param output: output to which match has to be applied
+    :param output: output to which match has to be applied,
+        matches are answered through indexes when it is a ParsedOutput
     :param select: select expression
     :param match: match expression
     :return: columns as per the select
@@ -174,10 +250,13 @@ def filter_and_select(output, select=None, match=None):
         return newd
 
     # collect the matched/all entries
-    retval = []
-    for ent in iterable(output):
-        if not match or match_entry(ent, match):
-            retval.append(ent)
+    if match and isinstance(output, ParsedOutput) and isinstance(match, (dict, list)):
+        retval = output.match(match)
+    else:
+        retval = []
+        for ent in iterable(output):
+            if not match or match_entry(ent, match):
+                retval.append(ent)
 
     # return all columns if select is not specified
     if not select:
@@ -326,6 +405,27 @@ def b64encode(file_path):
         retval.append(encoded_data[i*76:(i+1)*76])
     return retval
 
+def gzip_b64_chunks(file_path, chunk_size):
+    """
+    compress the file with gzip and split the compressed data in chunks
+    :return: list of (base64 lines, md5 of the chunk data) of each chunk
+    """
+    with open(file_path, "rb") as fh:
+        data = fh.read()
+    buf = io.BytesIO()
+    # fixed mtime keeps the chunks same across attempts of resumed transfers
+    gz = gzip.GzipFile(filename="", mode="wb", fileobj=buf, mtime=0)
+    gz.write(data)
+    gz.close()
+    compressed = buf.getvalue()
+    retval = []
+    for start in range(0, len(compressed), chunk_size):
+        chunk = compressed[start:start+chunk_size]
+        encoded_data = str_decode(base64.b64encode(chunk))
+        lines = [encoded_data[i:i+76] for i in range(0, len(encoded_data), 76)]
+        retval.append((lines, hashlib.md5(chunk).hexdigest()))
+    return retval
+
 ######################## to be removed after refactoring ####################
 ######################## to be removed after refactoring ####################
 class ExecAllFunc(object):
@@ -824,6 +924,12 @@ def integer_parse(s, default=None):
     except Exception:
         return default
 
+def float_parse(s, default=None):
+    try:
+        return float(s)
+    except Exception:
+        return default
+
 def min(n1, n2):
     return n1 if n1 < n2 else n2
 
@@ -24,6 +24,7 @@ python3 junit_xml_parser.py tests/files/sample_tr.xml
 import argparse
 import glob
 import json
+import multiprocessing
 import sys
 import os
 
@@ -159,10 +160,7 @@ def validate_junit_xml_archive(directory_name, strict=False):
     roots = []
     metadata_source = None
     metadata = {}
-    doc_list = glob.glob(os.path.join(directory_name, "tr.xml"))
-    doc_list += glob.glob(os.path.join(directory_name, "*test*.xml"))
-    doc_list += glob.glob(os.path.join(directory_name, "**", "*test*.xml"), recursive=True)
-    doc_list = set(doc_list)
+    doc_list = _find_junit_xml_documents(directory_name)
 
     total_size = 0
     for document in doc_list:
@@ -211,6 +209,194 @@ def validate_junit_xml_path(path, strict=False):
     return roots
 
 
+def _find_junit_xml_documents(directory_name):
+    doc_list = glob.glob(os.path.join(directory_name, "tr.xml"))
+    doc_list += glob.glob(os.path.join(directory_name, "*test*.xml"))
+    doc_list += glob.glob(os.path.join(directory_name, "**", "*test*.xml"), recursive=True)
+
+    return sorted(set(doc_list))
+
+
+def iterparse_junit_xml_file(document_name, metadata=None):
+    """Incrementally validate and parse an XML file containing JUnit XML.
+
+    Each test case is released as soon as it has been parsed, so the memory needed does not depend
+    on the size of the file and there is no limit on the file size.
+
+    Args:
+        document_name: The name of the document.
+        metadata: An optional dict that is updated with the metadata of the document once the
+            properties section has been parsed.
+
+    Yields:
+        A (feature, test case) tuple for each test case in the document, in the format of parse_test_result.
+
+    Raises:
+        JUnitXMLValidationError: if any of the following are true:
+            - The provided file doesn't exist
+            - The provided file is unparseable
+            - The provided file is missing required fields
+    """
+    if not os.path.exists(document_name) or not os.path.isfile(document_name):
+        raise JUnitXMLValidationError("file not found")
+
+    if metadata is None:
+        metadata = {}
+
+    root = None
+    depth = 0
+    try:
+        for event, element in ET.iterparse(document_name, events=("start", "end"), forbid_dtd=True):
+            if event == "start":
+                if root is None:
+                    root = element
+                    _validate_test_summary(root)
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth != 1:
+                continue
+
+            if element.tag == METADATA_TAG:
+                _validate_test_metadata(root)
+                metadata.update(_parse_test_metadata(root))
+            elif element.tag == TESTCASE_TAG:
+                _validate_test_case(element)
+                yield _parse_test_case(element)
+                root.remove(element)
+    except JUnitXMLValidationError:
+        raise
+    except Exception as e:
+        raise JUnitXMLValidationError(f"could not parse {document_name}: {e}") from e
+
+
+def _parse_junit_xml_document(document_name):
+    # Runs in the worker processes of JUnitXMLStream, errors are returned rather than raised so that
+    # the remaining documents are still parsed.
+    metadata = {}
+    try:
+        test_cases = list(iterparse_junit_xml_file(document_name, metadata))
+    except Exception as e:
+        return document_name, None, None, str(e)
+
+    return document_name, metadata, test_cases, None
+
+
+class JUnitXMLStream:
+    """A stream of the test cases found in a JUnit XML file or archive.
+
+    The documents of an archive are parsed incrementally by a pool of worker processes, and the test
+    cases of each document are yielded as (feature, test case) tuples as soon as the document has been
+    parsed. Element trees are never kept in memory, and there is no limit on the size of the archive.
+
+    The metadata and summary of the test run are complete once all of the test cases have been consumed.
+    """
+
+    def __init__(self, path, strict=False, processes=None):
+        """Initialize a JUnit XML stream.
+
+        Args:
+            path: A JUnit XML file, or a directory containing JUnit XML documents.
+            strict: Fail if ANY document in the directory is not valid instead of skipping it.
+            processes: The number of worker processes, defaults to the number of CPUs.
+        """
+        self.path = path
+        self.strict = strict
+        self.processes = processes or os.cpu_count() or 1
+        self.documents = 0
+        self.test_cases = 0
+        self.test_metadata = {}
+        self._summary = defaultdict(int)
+        self._metadata_source = None
+        self._metadata = {}
+
+    @property
+    def test_summary(self):
+        return {attribute: str(round(self._summary[attribute], 3)) for attribute, _ in REQUIRED_TESTSUITE_ATTRIBUTES}
+
+    def __iter__(self):
+        if os.path.isfile(self.path):
+            doc_list = [self.path]
+            strict = True
+        elif os.path.isdir(self.path):
+            doc_list = _find_junit_xml_documents(self.path)
+            strict = self.strict
+        else:
+            raise JUnitXMLValidationError("file not found")
+
+        processes = min(self.processes, len(doc_list))
+        if processes > 1:
+            with multiprocessing.Pool(processes) as pool:
+                yield from self._consume(pool.imap_unordered(_parse_junit_xml_document, doc_list), strict)
+        else:
+            yield from self._consume(map(_parse_junit_xml_document, doc_list), strict)
+
+        if not self.documents:
+            raise JUnitXMLValidationError(f"provided directory {self.path} does not contain any valid XML files")
+
+    def _consume(self, results, strict):
+        for document, metadata, test_cases, error in results:
+            try:
+                if error:
+                    raise JUnitXMLValidationError(error)
+                self._validate_metadata(document, metadata)
+            except JUnitXMLValidationError as e:
+                if strict:
+                    raise JUnitXMLValidationError(f"could not parse {document}: {e}") from e
+
+                print(f"could not parse {document}: {e} - skipping")
+                continue
+
+            self.documents += 1
+            self.test_metadata = _update_test_metadata(self.test_metadata, metadata)
+            for feature, test_case in test_cases:
+                self.test_cases += 1
+                self._summary["tests"] += 1
+                self._summary["failures"] += test_case["result"] == "failure" or test_case["result"] == "error"
+                self._summary["skipped"] += test_case["result"] == "skipped"
+                self._summary["errors"] += test_case["error"]
+                self._summary["time"] += float(test_case["time"])
+                yield feature, test_case
+
+    def _validate_metadata(self, document, metadata):
+        # All metadata from a single test run should be identical, so we
+        # just use the first one we see to validate the rest.
+        document_metadata = {k: v for k, v in metadata.items()
+                             if k in REQUIRED_METADATA_PROPERTIES and k != "timestamp"}
+        if not document_metadata:
+            return
+
+        if not self._metadata_source:
+            self._metadata_source = document
+            self._metadata = document_metadata
+
+        if document_metadata != self._metadata:
+            raise JUnitXMLValidationError(f"{document} metadata differs from {self._metadata_source}\n"
+                                          f"{document}: {document_metadata}\n"
+                                          f"{self._metadata_source}: {self._metadata}")
+
+
+def parse_test_result_stream(stream):
+    """Collect the test cases of a JUnit XML stream into JSON.
+
+    Args:
+        stream: The JUnitXMLStream to consume.
+
+    Returns:
+        A dict containing the parsed test result, in the same format as parse_test_result.
+    """
+    test_cases = defaultdict(list)
+    for feature, test_case in stream:
+        test_cases[feature].append(test_case)
+
+    return {
+        "test_metadata": stream.test_metadata,
+        "test_cases": dict(test_cases),
+        "test_summary": stream.test_summary,
+    }
+
+
 def _validate_junit_xml(root):
     _validate_test_summary(root)
     _validate_test_metadata(root)
@@ -271,15 +457,16 @@ def _validate_test_metadata(root):
         raise JUnitXMLValidationError("missing metadata element(s)")
 
 
-def _validate_test_cases(root):
-    def _validate_test_case(test_case):
-        for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
-            if attribute not in test_case.keys():
-                raise JUnitXMLValidationError(
-                    f'"{attribute}" not found in test case '
-                    f"\"{test_case.get('name', 'Name Not Found')}\""
-                )
+def _validate_test_case(test_case):
+    for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
+        if attribute not in test_case.keys():
+            raise JUnitXMLValidationError(
+                f'"{attribute}" not found in test case '
+                f"\"{test_case.get('name', 'Name Not Found')}\""
+            )
 
+
+def _validate_test_cases(root):
     cases = root.findall(TESTCASE_TAG)
 
     for test_case in cases:
@@ -344,49 +531,50 @@ def _parse_test_metadata(root):
     return test_result_metadata
 
 
-def _parse_test_cases(root):
-    test_case_results = defaultdict(list)
+def _parse_test_case(test_case):
+    result = {}
+
+    # FIXME: This is specific to pytest, needs to be extended to support spytest.
+    test_class_tokens = test_case.get("classname").split(".")
+    feature = test_class_tokens[0]
+
+    for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
+        result[attribute] = test_case.get(attribute)
+
+    # NOTE: "if failure" and "if error" does not work with the ETree library.
+    failure = test_case.find("failure")
+    error = test_case.find("error")
+    skipped = test_case.find("skipped")
+
+    # NOTE: "error" is unique in that it can occur alongside a succesful, failed, or skipped test result.
+    # Because of this, we track errors separately so that the error can be correlated with the stage it
+    # occurred.
+    #
+    # If there is *only* an error tag we note that as well, as this indicates that the framework
+    # errored out during setup or teardown.
+    if failure is not None:
+        result["result"] = "failure"
+        summary = failure.get("message", "")
+    elif skipped is not None:
+        result["result"] = "skipped"
+        summary = skipped.get("message", "")
+    elif error is not None:
+        result["result"] = "error"
+        summary = error.get("message", "")
+    else:
+        result["result"] = "success"
+        summary = ""
 
-    def _parse_test_case(test_case):
-        result = {}
-
-        # FIXME: This is specific to pytest, needs to be extended to support spytest.
-        test_class_tokens = test_case.get("classname").split(".")
-        feature = test_class_tokens[0]
-
-        for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
-            result[attribute] = test_case.get(attribute)
-
-        # NOTE: "if failure" and "if error" does not work with the ETree library.
-        failure = test_case.find("failure")
-        error = test_case.find("error")
-        skipped = test_case.find("skipped")
-
-        # NOTE: "error" is unique in that it can occur alongside a succesful, failed, or skipped test result.
-        # Because of this, we track errors separately so that the error can be correlated with the stage it
-        # occurred.
-        #
-        # If there is *only* an error tag we note that as well, as this indicates that the framework
-        # errored out during setup or teardown.
-        if failure is not None:
-            result["result"] = "failure"
-            summary = failure.get("message", "")
-        elif skipped is not None:
-            result["result"] = "skipped"
-            summary = skipped.get("message", "")
-        elif error is not None:
-            result["result"] = "error"
-            summary = error.get("message", "")
-        else:
-            result["result"] = "success"
-            summary = ""
+    result["summary"] = summary[:min(len(summary), MAXIMUM_SUMMARY_SIZE)]
+    result["error"] = error is not None
+
+    return feature, result
 
-        result["summary"] = summary[:min(len(summary), MAXIMUM_SUMMARY_SIZE)]
-        result["error"] = error is not None
 
-        return feature, result
+def _parse_test_cases(root):
+    test_case_results = defaultdict(list)
 
-    for test_case in root.findall("testcase"):
+    for test_case in root.findall(TESTCASE_TAG):
         feature, result = _parse_test_case(test_case)
         test_case_results[feature].append(result)
 
@@ -4,6 +4,7 @@ import os
 import tempfile
 
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from azure.kusto.data import KustoConnectionStringBuilder
 
 try:
@@ -16,7 +17,46 @@ from azure.kusto.ingest import DataFormat
 
 from utilities import validate_json_file
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List
+
+MAXIMUM_BATCH_SIZE = 64 * 1024 * 1024  # 64MB
+
+
+def ndjson_batches(records: Iterable[Dict], max_batch_size: int = MAXIMUM_BATCH_SIZE) -> Iterator[bytes]:
+    """Serialize records into batches of newline-delimited JSON.
+
+    Args:
+        records: The records to serialize, consumed lazily.
+        max_batch_size: The maximum size of a batch in bytes. A record larger than this is put in a batch of its own.
+
+    Yields:
+        The batches, each containing one JSON document per line.
+    """
+    batch = []
+    batch_size = 0
+    for record in records:
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        if batch and batch_size + len(line) > max_batch_size:
+            yield b"".join(batch)
+            batch = []
+            batch_size = 0
+
+        batch.append(line)
+        batch_size += len(line)
+
+    if batch:
+        yield b"".join(batch)
+
+
+def _test_case_records(report_stream, report_guid):
+    # Each line holds a single test case in the same {"cases": [...]} shape as upload_report,
+    # so that the cases are expanded by the existing table mapping.
+    for feature, case in report_stream:
+        case.update({
+            "id": report_guid,
+            "feature": feature
+        })
+        yield {"cases": [case]}
 
 
 class ReportDBConnector(ABC):
@@ -42,6 +82,23 @@ class ReportDBConnector(ABC):
         """
         pass
 
+    @abstractmethod
+    def upload_report_stream(self, report_stream, external_tracking_id: str = "", report_guid: str = "") -> None:
+        """Upload a report from a stream of test cases to the back-end data store.
+
+        The test cases are uploaded in batches while the stream is being parsed, the metadata
+        and summary of the report are uploaded once the stream has been consumed.
+
+        Args:
+            report_stream: A JUnitXMLStream, or any iterable of (feature, test case) tuples with
+                test_metadata and test_summary attributes. See junit_xml_parser.
+            external_tracking_id: An identifier that a client can use to map a test report
+                to some external system of their choosing (e.g. Jenkins, Travis CI, JIRA, etc.).
+                This id does not have to be unique.
+            report_guid: A randomly generated UUID that is used to query for a specific test run across tables.
+        """
+        pass
+
     @abstractmethod
     def upload_reachability_data(self, ping_output: List) -> None:
         """Upload testbed reachability data to the back-end data store.
@@ -99,13 +156,17 @@ class KustoConnector(ReportDBConnector):
         REBOOT_TIMING_TABLE: "RebootTimingDataMapping"
     }
 
-    def __init__(self, db_name: str):
+    MAXIMUM_UPLOAD_WORKERS = 4
+
+    def __init__(self, db_name: str, max_batch_size: int = MAXIMUM_BATCH_SIZE):
         """Initialize a Kusto report DB connector.
 
         Args:
             db_name: The Kusto database to connect to.
+            max_batch_size: The maximum size in bytes of the files test cases are ingested from.
         """
         self.db_name = db_name
+        self.max_batch_size = max_batch_size
 
         ingest_cluster = os.getenv("TEST_REPORT_INGEST_KUSTO_CLUSTER")
         tenant_id = os.getenv("TEST_REPORT_AAD_TENANT_ID")
@@ -135,6 +196,17 @@ class KustoConnector(ReportDBConnector):
         self._upload_summary(report_json, report_guid)
         self._upload_test_cases(report_json, report_guid)
 
+    def upload_report_stream(self, report_stream, external_tracking_id: str = "", report_guid: str = "") -> None:
+        batches = ndjson_batches(_test_case_records(report_stream, report_guid), self.max_batch_size)
+        self._ingest_batches(self.RAW_CASE_TABLE, batches)
+
+        report_json = {
+            "test_metadata": report_stream.test_metadata,
+            "test_summary": report_stream.test_summary
+        }
+        self._upload_metadata(report_json, external_tracking_id, report_guid)
+        self._upload_summary(report_json, report_guid)
+
     def upload_reachability_data(self, ping_output: List) -> None:
         ping_time = str(datetime.utcnow())
         for result in ping_output:
@@ -202,15 +274,123 @@ class KustoConnector(ReportDBConnector):
 
         self._ingest_data(self.RAW_CASE_TABLE, test_cases)
 
-    def _ingest_data(self, table, data):
-        props = IngestionProperties(
+    def _ingestion_properties(self, table):
+        return IngestionProperties(
             database=self.db_name,
             table=table,
             data_format=self.TABLE_FORMAT_LOOKUP[table],
             ingestion_mapping_reference=self.TABLE_MAPPING_LOOKUP[table]
         )
 
+    def _ingest_data(self, table, data):
+        props = self._ingestion_properties(table)
+
         with tempfile.NamedTemporaryFile(mode="w+") as temp:
             temp.write(json.dumps(data))
             temp.seek(0)
             self._ingestion_client.ingest_from_file(temp.name, ingestion_properties=props)
+
+    def _ingest_batch(self, props, batch):
+        with tempfile.NamedTemporaryFile(mode="wb", suffix=".json") as temp:
+            temp.write(batch)
+            temp.flush()
+            self._ingestion_client.ingest_from_file(temp.name, ingestion_properties=props)
+
+    def _ingest_batches(self, table, batches):
+        # Batches are uploaded in the background while the next ones are being parsed, the number of
+        # batches in flight is bounded so that a slow upload doesn't buffer the whole report in memory.
+        props = self._ingestion_properties(table)
+
+        with ThreadPoolExecutor(max_workers=self.MAXIMUM_UPLOAD_WORKERS) as executor:
+            pending = set()
+            for batch in batches:
+                if len(pending) >= self.MAXIMUM_UPLOAD_WORKERS:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
+                pending.add(executor.submit(self._ingest_batch, props, batch))
+
+            for future in pending:
+                future.result()
+
+
+class LocalConnector(ReportDBConnector):
+    """LocalConnector is a stand-in for a back-end data store that keeps test reports in local files.
+
+    Every upload to a table is stored as newline-delimited JSON in <directory>/<table>/<sequence>.json, in the
+    same format and batches as KustoConnector would ingest them. It can be used to try out or benchmark report
+    parsing and uploading without any credentials.
+    """
+
+    def __init__(self, directory: str, max_batch_size: int = MAXIMUM_BATCH_SIZE):
+        """Initialize a local report DB connector.
+
+        Args:
+            directory: The directory to store the tables in, created if it doesn't exist.
+            max_batch_size: The maximum size in bytes of the files test cases are stored in.
+        """
+        self.directory = directory
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.bytes_written = 0
+        self._sequence = {}
+
+    def upload_report(self, report_json: Dict, external_tracking_id: str = "", report_guid: str = "") -> None:
+        test_cases = ((feature, case) for feature, cases in report_json["test_cases"].items() for case in cases)
+        self._write_batches(KustoConnector.RAW_CASE_TABLE,
+                            ndjson_batches(_test_case_records(test_cases, report_guid), self.max_batch_size))
+        self._upload_metadata(report_json, external_tracking_id, report_guid)
+
+    def upload_report_stream(self, report_stream, external_tracking_id: str = "", report_guid: str = "") -> None:
+        self._write_batches(KustoConnector.RAW_CASE_TABLE,
+                            ndjson_batches(_test_case_records(report_stream, report_guid), self.max_batch_size))
+        report_json = {
+            "test_metadata": report_stream.test_metadata,
+            "test_summary": report_stream.test_summary
+        }
+        self._upload_metadata(report_json, external_tracking_id, report_guid)
+
+    def upload_reachability_data(self, ping_output: List) -> None:
+        self._write_batches(KustoConnector.RAW_REACHABILITY_TABLE, ndjson_batches([{"data": ping_output}]))
+
+    def upload_pdu_status_data(self, pdu_status_output: List) -> None:
+        self._write_batches(KustoConnector.RAW_PDU_STATUS_TABLE, ndjson_batches([{"data": pdu_status_output}]))
+
+    def upload_reboot_report(self, path_name: str = "", report_guid: str = "") -> None:
+        reboot_timing_data = {
+            "id": report_guid
+        }
+        reboot_timing_data.update(validate_json_file(path_name))
+        if "reboot_summary" in path_name:
+            self._write_batches(KustoConnector.REBOOT_TIMING_TABLE, ndjson_batches([reboot_timing_data]))
+        elif "reboot_report" in path_name:
+            self._write_batches(KustoConnector.RAW_REBOOT_TIMING_TABLE, ndjson_batches([reboot_timing_data]))
+
+    def _upload_metadata(self, report_json, external_tracking_id, report_guid):
+        metadata = {
+            "id": report_guid,
+            "tracking_id": external_tracking_id,
+            "upload_time": str(datetime.utcnow())
+        }
+        metadata.update(report_json["test_metadata"])
+        summary = {
+            "id": report_guid
+        }
+        summary.update(report_json["test_summary"])
+
+        self._write_batches(KustoConnector.METADATA_TABLE, ndjson_batches([metadata]))
+        self._write_batches(KustoConnector.SUMMARY_TABLE, ndjson_batches([summary]))
+
+    def _write_batches(self, table, batches):
+        table_directory = os.path.join(self.directory, table)
+        os.makedirs(table_directory, exist_ok=True)
+
+        for batch in batches:
+            sequence = self._sequence.get(table, 0)
+            self._sequence[table] = sequence + 1
+            with open(os.path.join(table_directory, f"{sequence:06d}.json"), "wb") as f:
+                f.write(batch)
+
+            self.batches += 1
+            self.bytes_written += len(batch)
@@ -1,14 +1,15 @@
 import argparse
 import json
+import os
 import sys
+import time
 import uuid
 
 from junit_xml_parser import (
     validate_junit_json_file,
-    validate_junit_xml_path,
-    parse_test_result
+    JUnitXMLStream
 )
-from report_data_storage import KustoConnector
+from report_data_storage import KustoConnector, LocalConnector
 
 
 def _run_script():
@@ -18,6 +19,7 @@ def _run_script():
         epilog="""
 Examples:
 python3 report_uploader.py tests/files/sample_tr.xml -e TRACKING_ID#22
+python3 report_uploader.py -c test_result --local /tmp/reports ../results SonicTestData
 """,
     )
     parser.add_argument("path_list", metavar="path", nargs="+", type=str, help="list of file/directory to upload.")
@@ -31,9 +33,18 @@ python3 report_uploader.py tests/files/sample_tr.xml -e TRACKING_ID#22
     parser.add_argument(
         "--category", "-c", type=str, help="Type of data to upload (i.e. test_result, reachability, etc.)"
     )
+    parser.add_argument(
+        "--local", "-l", type=str, help="Store the data as JSON files in this directory instead of uploading to Kusto."
+    )
+    parser.add_argument(
+        "--processes", "-p", type=int, help="Number of processes parsing JUnit XML files (default: CPU count)."
+    )
 
     args = parser.parse_args()
-    kusto_db = KustoConnector(args.db_name)
+    if args.local:
+        kusto_db = LocalConnector(os.path.join(args.local, args.db_name))
+    else:
+        kusto_db = KustoConnector(args.db_name)
 
     if args.category == "test_result":
         tracking_id = args.external_id if args.external_id else ""
@@ -44,10 +55,15 @@ python3 report_uploader.py tests/files/sample_tr.xml -e TRACKING_ID#22
             else:
                 if args.json:
                     test_result_json = validate_junit_json_file(path_name)
+                    kusto_db.upload_report(test_result_json, tracking_id, report_guid)
                 else:
-                    roots = validate_junit_xml_path(path_name)
-                    test_result_json = parse_test_result(roots)
-                kusto_db.upload_report(test_result_json, tracking_id, report_guid)
+                    start = time.time()
+                    report_stream = JUnitXMLStream(path_name, processes=args.processes)
+                    kusto_db.upload_report_stream(report_stream, tracking_id, report_guid)
+                    elapsed = time.time() - start
+                    print("Uploaded {} test cases from {} documents of {} in {:.2f}s ({:.0f} cases/s)".format(
+                        report_stream.test_cases, report_stream.documents, path_name, elapsed,
+                        report_stream.test_cases / elapsed if elapsed else 0))
     elif args.category == "reachability":
         reachability_data = []
         for path_name in args.path_list:
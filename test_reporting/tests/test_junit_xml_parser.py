@@ -4,6 +4,7 @@ import pytest
 
 from test_reporting.junit_xml_parser import validate_junit_xml_stream, validate_junit_xml_file
 from test_reporting.junit_xml_parser import validate_junit_xml_archive, parse_test_result, JUnitXMLValidationError
+from test_reporting.junit_xml_parser import JUnitXMLStream, parse_test_result_stream
 
 
 VALID_TEST_RESULT = """<?xml version="1.0" encoding="utf-8"?>
@@ -247,6 +248,38 @@ def test_xml_file_not_found():
         validate_junit_xml_file("nonexistent.xml")
 
 
+def test_json_output_from_file_stream():
+    stream = JUnitXMLStream(VALID_TEST_RESULT_FILE)
+    assert ordered(parse_test_result_stream(stream)) == ordered(EXPECTED_JSON_OUTPUT)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_json_output_from_archive_stream(processes):
+    stream = JUnitXMLStream(VALID_TEST_RESULT_ARCHIVE, processes=processes)
+    assert ordered(parse_test_result_stream(stream)) == ordered(EXPECTED_JSON_OUTPUT)
+    assert stream.documents == 2
+
+
+@pytest.mark.parametrize(
+    "token,replacement,message",
+    [
+        ("<testsuite", "<not-a-testsuite", "testsuite tag not found"),
+        ('classname="', 'notaclassname="', "not found in test case"),
+        ("</testsuite>", "", "could not parse"),
+    ],
+)
+def test_invalid_junit_xml_file_stream(tmp_path, token, replacement, message):
+    path = tmp_path / "tr.xml"
+    path.write_text(VALID_TEST_RESULT.replace(token, replacement))
+    with pytest.raises(JUnitXMLValidationError, match=message):
+        list(JUnitXMLStream(str(path)))
+
+
+def test_xml_stream_not_found():
+    with pytest.raises(JUnitXMLValidationError, match="file not found"):
+        list(JUnitXMLStream("nonexistent.xml"))
+
+
 # credit to: https://stackoverflow.com/questions/25851183/
 def ordered(obj):
     if isinstance(obj, dict):
@@ -1,13 +1,16 @@
 from __future__ import print_function, division, absolute_import
 
+import hashlib
 import inspect
 import logging
 import os
 import cPickle as pickle
 import shutil
 import sys
+import tempfile
+import time
 
-from collections import defaultdict
+from collections import OrderedDict
 from threading import Lock
 from six import with_metaclass
 
@@ -19,6 +22,11 @@ CACHE_LOCATION = os.path.join(CURRENT_PATH, '../../../_cache')
 
 SIZE_LIMIT = 1000000000  # 1G bytes, max disk usage allowed by cache
 ENTRY_LIMIT = 1000000    # Max number of pickle files allowed in cache.
+MEMORY_SIZE_LIMIT = 200000000   # 200M bytes, max size of pickled facts kept in memory
+MEMORY_ENTRY_LIMIT = 10000      # Max number of facts kept in memory
+
+PICKLE_SUFFIX = '.pickle'
+ZONE_INFO_FILE = '.zone_info'
 
 
 class Singleton(type):
@@ -39,6 +47,10 @@ class FactsCache(with_metaclass(Singleton, object)):
 
     Used singleton design pattern. Only a single instance of this class can be initialized.
 
+    Size and number of the cached files are tracked in an index built by scanning the cache folder once. When a write
+    exceeds SIZE_LIMIT or ENTRY_LIMIT, the least recently used facts are removed. Facts kept in memory are limited by
+    MEMORY_SIZE_LIMIT and MEMORY_ENTRY_LIMIT the same way, they are loaded from the cached file again when needed.
+
     Args:
         with_metaclass ([function]): Python 2&3 compatible function from the six library for adding metaclass.
     """
@@ -47,24 +59,147 @@ class FactsCache(with_metaclass(Singleton, object)):
 
     def __init__(self, cache_location=CACHE_LOCATION):
         self._cache_location = os.path.abspath(cache_location)
-        self._cache = defaultdict(dict)
+        self._cache = OrderedDict()     # (zone, key) -> [facts, pickled size, write time], least recently used first
+        self._cache_size = 0
+        self._index = None              # (zone, key) -> [file size, sha1 of file content], least recently used first
+        self._index_size = 0
+        self._zone_ttl = {}
         self._write_lock = Lock()
 
-    def _check_usage(self):
-        """Check cache usage, raise exception if usage exceeds the limitations.
+    def _facts_file(self, zone, key):
+        return os.path.join(self._cache_location, zone, '{}{}'.format(key, PICKLE_SUFFIX))
+
+    def _load_index(self):
+        """Scan the cache folder once to get size of the cached files, ordered by last access time.
         """
-        total_size = 0
-        total_entries = 0
-        for root, _, files in os.walk(self._cache_location):
-            for f in files:
-                fp = os.path.join(root, f)
-                total_size += os.path.getsize(fp)
-                total_entries += 1
-
-        if total_size > SIZE_LIMIT or total_entries > ENTRY_LIMIT:
-            msg = 'Cache usage exceeds limitations. total_size={}, SIZE_LIMIT={}, total_entries={}, ENTRY_LIMIT={}' \
-                .format(total_size, SIZE_LIMIT, total_entries, ENTRY_LIMIT)
-            raise Exception(msg)
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self._cache_location):
+            for zone in os.listdir(self._cache_location):
+                zone_folder = os.path.join(self._cache_location, zone)
+                if not os.path.isdir(zone_folder):
+                    continue
+                for f in os.listdir(zone_folder):
+                    if not f.endswith(PICKLE_SUFFIX):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(zone_folder, f))
+                    except OSError:
+                        continue
+                    entries.append((st.st_atime, (zone, f[:-len(PICKLE_SUFFIX)]), st.st_size))
+        entries.sort(key=lambda entry: entry[0])
+        self._index = OrderedDict()
+        self._index_size = 0
+        for _, name, size in entries:
+            self._index[name] = [size, None]
+            self._index_size += size
+
+    def _touch(self, zone, key):
+        """Mark facts as most recently used."""
+        name = (zone, key)
+        if name in self._cache:
+            self._cache[name] = self._cache.pop(name)
+        if self._index is not None and name in self._index:
+            self._index[name] = self._index.pop(name)
+
+    def _remember(self, zone, key, value, size, write_time):
+        """Keep facts in memory, drop least recently used facts exceeding the memory limits."""
+        self._forget(zone, key)
+        self._cache[(zone, key)] = [value, size, write_time]
+        self._cache_size += size
+        while self._cache and (self._cache_size > MEMORY_SIZE_LIMIT or len(self._cache) > MEMORY_ENTRY_LIMIT):
+            name, entry = self._cache.popitem(last=False)
+            self._cache_size -= entry[1]
+            logger.debug('Dropped facts "{}.{}" from memory'.format(name[0], name[1]))
+
+    def _forget(self, zone, key):
+        entry = self._cache.pop((zone, key), None)
+        if entry:
+            self._cache_size -= entry[1]
+
+    def _remove(self, zone, key):
+        """Remove facts from memory, index and disk."""
+        self._forget(zone, key)
+        if self._index is not None:
+            entry = self._index.pop((zone, key), None)
+            if entry:
+                self._index_size -= entry[0]
+        try:
+            os.remove(self._facts_file(zone, key))
+        except OSError:
+            pass
+
+    def _evict(self, size):
+        """Remove least recently used cached files to make room for a file of the given size."""
+        while self._index and (self._index_size + size > SIZE_LIMIT or len(self._index) + 1 > ENTRY_LIMIT):
+            zone, key = next(iter(self._index))
+            logger.info('Evict cached facts "{}.{}"'.format(zone, key))
+            self._remove(zone, key)
+
+    def _is_expired(self, zone, write_time):
+        ttl = self._zone_ttl.get(zone)
+        return ttl is not None and time.time() - write_time > ttl
+
+    def set_zone_policy(self, zone, version=None, ttl=None):
+        """Set validity of the facts cached in a zone.
+
+        Args:
+            zone (str): Name of the zone.
+            version (str): Invalidation key of the zone, like the image version of a DUT. When it is different from the
+                version the facts were cached with, all the facts cached in the zone are removed. Default is None,
+                facts are not checked.
+            ttl (int or float): Facts cached more than ttl seconds ago are not used. Default is None, no expiration.
+        """
+        with self._write_lock:
+            if ttl is None:
+                self._zone_ttl.pop(zone, None)
+            else:
+                self._zone_ttl[zone] = ttl
+            if version is None:
+                return
+            zone_folder = os.path.join(self._cache_location, zone)
+            zone_info_file = os.path.join(zone_folder, ZONE_INFO_FILE)
+            try:
+                with open(zone_info_file, 'rb') as f:
+                    cached_version = pickle.load(f).get('version')
+            except (IOError, ValueError, EOFError, pickle.UnpicklingError):
+                cached_version = None
+            if cached_version == version:
+                return
+            if os.path.isdir(zone_folder):
+                logger.info('Cached facts of zone "{}" are for version "{}", remove them for version "{}"'
+                            .format(zone, cached_version, version))
+                for f in os.listdir(zone_folder):
+                    if f.endswith(PICKLE_SUFFIX):
+                        self._remove(zone, f[:-len(PICKLE_SUFFIX)])
+            for name in [name for name in self._cache if name[0] == zone]:
+                self._forget(*name)
+            try:
+                self._write_file(zone_folder, zone_info_file, pickle.dumps({'version': version}, pickle.HIGHEST_PROTOCOL))
+            except (IOError, OSError) as e:
+                logger.error('Dump zone info "{}" failed with exception: {}'.format(zone_info_file, repr(e)))
+
+    def _write_file(self, folder, path, data):
+        """Write a file atomically, readers never see a partially written file."""
+        if not os.path.exists(folder):
+            logger.info('Create cache dir {}'.format(folder))
+            try:
+                os.makedirs(folder)
+            except OSError:
+                if not os.path.isdir(folder):
+                    raise
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
 
     def read(self, zone, key):
         """Read cached facts.
@@ -78,17 +213,32 @@ class FactsCache(with_metaclass(Singleton, object)):
             obj: Cached object, usually a dictionary.
         """
         # Lazy load
-        if zone in self._cache and key in self._cache[zone]:
+        entry = self._cache.get((zone, key))
+        if entry and not self._is_expired(zone, entry[2]):
             logger.debug('Read cached facts "{}.{}"'.format(zone, key))
-            return self._cache[zone][key]
+            with self._write_lock:
+                self._touch(zone, key)
+            return entry[0]
         else:
-            facts_file = os.path.join(self._cache_location, '{}/{}.pickle'.format(zone, key))
+            facts_file = self._facts_file(zone, key)
             try:
-                with open(facts_file) as f:
-                    self._cache[zone][key] = pickle.load(f)
-                    logger.debug('Loaded cached facts "{}.{}" from {}'.format(zone, key, facts_file))
-                    return self._cache[zone][key]
-            except (IOError, ValueError) as e:
+                with open(facts_file, 'rb') as f:
+                    data = f.read()
+                    st = os.fstat(f.fileno())
+                if self._is_expired(zone, st.st_mtime):
+                    logger.info('Cached facts "{}.{}" expired'.format(zone, key))
+                    with self._write_lock:
+                        self._remove(zone, key)
+                    return self.NOTEXIST
+                value = pickle.loads(data)
+                with self._write_lock:
+                    self._remember(zone, key, value, len(data), st.st_mtime)
+                    self._touch(zone, key)
+                # record access time for the least recently used order of later sessions
+                os.utime(facts_file, (time.time(), st.st_mtime))
+                logger.debug('Loaded cached facts "{}.{}" from {}'.format(zone, key, facts_file))
+                return value
+            except (IOError, OSError, ValueError, EOFError, pickle.UnpicklingError) as e:
                 logger.info('Load cache file "{}" failed with exception: {}'\
                     .format(os.path.abspath(facts_file), repr(e)))
                 return self.NOTEXIST
@@ -106,20 +256,32 @@ class FactsCache(with_metaclass(Singleton, object)):
             boolean: Caching facts is successful or not.
         """
         with self._write_lock:
-            self._check_usage()
-            facts_file = os.path.join(self._cache_location, '{}/{}.pickle'.format(zone, key))
+            facts_file = self._facts_file(zone, key)
             try:
-                cache_subfolder = os.path.join(self._cache_location, zone)
-                if not os.path.exists(cache_subfolder):
-                    logger.info('Create cache dir {}'.format(cache_subfolder))
-                    os.makedirs(cache_subfolder)
-
-                with open(facts_file, 'w') as f:
-                    pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
-                    self._cache[zone][key] = value
+                data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                if len(data) > SIZE_LIMIT:
+                    logger.error('Facts "{}.{}" of size {} exceed cache SIZE_LIMIT={}'
+                                 .format(zone, key, len(data), SIZE_LIMIT))
+                    return False
+                digest = hashlib.sha1(data).hexdigest()
+                self._load_index()
+                entry = self._index.get((zone, key))
+                if entry:
+                    # re-added below as the most recently used entry
+                    self._index_size -= entry[0]
+                    del self._index[(zone, key)]
+                if entry and entry[1] == digest and os.path.exists(facts_file):
+                    # same content is cached already, only refresh its write time
+                    os.utime(facts_file, None)
+                else:
+                    self._evict(len(data))
+                    self._write_file(os.path.join(self._cache_location, zone), facts_file, data)
                     logger.info('Cached facts "{}.{}" to {}'.format(zone, key, facts_file))
-                    return True
-            except (IOError, ValueError) as e:
+                self._index[(zone, key)] = [len(data), digest]
+                self._index_size += len(data)
+                self._remember(zone, key, value, len(data), time.time())
+                return True
+            except (IOError, OSError, ValueError, pickle.PicklingError) as e:
                 logger.error('Dump cache file "{}" failed with exception: {}'.format(facts_file, repr(e)))
                 return False
 
@@ -132,35 +294,43 @@ class FactsCache(with_metaclass(Singleton, object)):
                 will be cleaned up.
             key (str): Name of cached facts. Default is None.
         """
-        if zone:
-            if key:
-                if zone in self._cache and key in self._cache[zone]:
-                    del self._cache[zone][key]
-                    logger.debug('Removed "{}.{}" from cache.'.format(zone, key))
-                try:
-                    cache_file = os.path.join(self._cache_location, zone, '{}.pickle'.format(key))
-                    os.remove(cache_file)
-                    logger.debug('Removed cache file "{}.pickle"'.format(cache_file))
-                except OSError as e:
-                    logger.error('Cleanup cache {}.{}.pickle failed with exception: {}'.format(zone, key, repr(e)))
-            else:
-                if zone in self._cache:
-                    del self._cache[zone]
+        with self._write_lock:
+            if zone:
+                if key:
+                    if (zone, key) in self._cache:
+                        self._forget(zone, key)
+                        logger.debug('Removed "{}.{}" from cache.'.format(zone, key))
+                    if self._index is not None and (zone, key) in self._index:
+                        self._index_size -= self._index.pop((zone, key))[0]
+                    try:
+                        cache_file = self._facts_file(zone, key)
+                        os.remove(cache_file)
+                        logger.debug('Removed cache file "{}.pickle"'.format(cache_file))
+                    except OSError as e:
+                        logger.error('Cleanup cache {}.{}.pickle failed with exception: {}'.format(zone, key, repr(e)))
+                else:
+                    for name in [name for name in self._cache if name[0] == zone]:
+                        self._forget(*name)
                     logger.debug('Removed zone "{}" from cache'.format(zone))
+                    if self._index is not None:
+                        for name in [name for name in self._index if name[0] == zone]:
+                            self._index_size -= self._index.pop(name)[0]
+                    try:
+                        cache_subfolder = os.path.join(self._cache_location, zone)
+                        shutil.rmtree(cache_subfolder)
+                        logger.debug('Removed cache subfolder "{}"'.format(cache_subfolder))
+                    except OSError as e:
+                        logger.error('Remove cache subfolder "{}" failed with exception: {}'.format(zone, repr(e)))
+            else:
+                self._cache = OrderedDict()
+                self._cache_size = 0
+                self._index = None
                 try:
-                    cache_subfolder = os.path.join(self._cache_location, zone)
-                    shutil.rmtree(cache_subfolder)
-                    logger.debug('Removed cache subfolder "{}"'.format(cache_subfolder))
+                    shutil.rmtree(self._cache_location)
+                    logger.debug('Removed all cache files under "{}"'.format(self._cache_location))
                 except OSError as e:
-                    logger.error('Remove cache subfolder "{}" failed with exception: {}'.format(zone, repr(e)))
-        else:
-            self._cache = defaultdict(dict)
-            try:
-                shutil.rmtree(self._cache_location)
-                logger.debug('Removed all cache files under "{}"'.format(self._cache_location))
-            except OSError as e:
-                logger.error('Remove cache folder "{}" failed with exception: {}'\
-                    .format(self._cache_location, repr(e)))
+                    logger.error('Remove cache folder "{}" failed with exception: {}'\
+                        .format(self._cache_location, repr(e)))
 
 
 def _get_default_zone(function, func_args, func_kargs):
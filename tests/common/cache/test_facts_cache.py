@@ -0,0 +1,36 @@
+"""Unit tests of the size accounting and least recently used order of FactsCache, no testbed is needed.
+
+Run with: pytest --noconftest tests/common/cache/test_facts_cache.py
+"""
+import pytest
+
+from tests.common.cache import facts_cache
+from tests.common.cache.facts_cache import FactsCache, Singleton
+
+
+@pytest.fixture
+def cache(tmpdir, monkeypatch):
+    # a new instance in a temporary folder instead of the singleton
+    monkeypatch.delitem(Singleton._instances, FactsCache, raising=False)
+    yield FactsCache(str(tmpdir))
+
+
+def test_rewrite_same_value(cache):
+    for _ in range(5):
+        assert cache.write('zone', 'key', 'a' * 16)
+    size = len(facts_cache.pickle.dumps('a' * 16, facts_cache.pickle.HIGHEST_PROTOCOL))
+    assert cache._index_size == size
+    assert list(cache._index) == [('zone', 'key')]
+
+
+def test_rewrite_same_value_eviction_order(cache, monkeypatch):
+    size = len(facts_cache.pickle.dumps('a' * 16, facts_cache.pickle.HIGHEST_PROTOCOL))
+    monkeypatch.setattr(facts_cache, 'SIZE_LIMIT', 2 * size)
+    assert cache.write('zone', 'a', 'a' * 16)
+    assert cache.write('zone', 'b', 'b' * 16)
+    # rewriting 'a' makes it the most recently used, 'b' is evicted to make room for 'c'
+    assert cache.write('zone', 'a', 'a' * 16)
+    assert cache.write('zone', 'c', 'c' * 16)
+    assert list(cache._index) == [('zone', 'a'), ('zone', 'c')]
+    assert cache._index_size == 2 * size
+    assert cache.read('zone', 'b') is FactsCache.NOTEXIST
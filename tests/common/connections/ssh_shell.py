@@ -0,0 +1,197 @@
+"""Persistent SSH connection for running shell commands without ansible
+
+Every ansible 'command' or 'shell' module call packages the module, transfers it to the host and starts python there.
+SshShell keeps one SSH connection per host and opens a new channel on it for each command, which costs a round trip.
+The result of a command is returned in the same format as the result of the ansible module.
+"""
+import datetime
+import logging
+import pipes
+import select
+import shlex
+import threading
+
+import paramiko
+
+from pytest_ansible.results import ModuleResult
+
+logger = logging.getLogger(__name__)
+
+# Modules which can be run on the SSH connection
+SHELL_MODULES = ("command", "shell")
+
+# Keyword arguments of the shell modules supported by the SSH connection
+SHELL_MODULE_ARGS = ("chdir", "stdin", "_uses_shell", "warn")
+
+SUDO_PASSWORD_REQUIRED = "a password is required"
+
+
+class SshShellUnavailable(Exception):
+    """The command can't be run on the SSH connection, ansible should be used instead."""
+    pass
+
+
+def build_command(module_name, module_args, complex_args, become):
+    """Build the command line running a shell module call
+
+    Args:
+        module_name (str): Name of the ansible module, 'command' or 'shell'.
+        module_args (tuple): Positional arguments of the module call, the free form command.
+        complex_args (dict): Keyword arguments of the module call.
+        become (bool): Run the command as root.
+
+    Returns:
+        tuple: The command line and the command reported in the result, or None if the call is not supported.
+    """
+    if module_name not in SHELL_MODULES or len(module_args) != 1 or not isinstance(module_args[0], basestring):
+        return None
+    if any(arg not in SHELL_MODULE_ARGS for arg in complex_args):
+        return None
+    cmd = module_args[0]
+    if module_name == "shell" or complex_args.get("_uses_shell"):
+        script = cmd
+        result_cmd = cmd
+    else:
+        # command module doesn't use shell, quote the arguments to keep shell from interpreting them
+        result_cmd = shlex.split(cmd.encode("utf-8") if isinstance(cmd, unicode) else cmd)
+        if any("$" in arg or arg.startswith("~") for arg in result_cmd):
+            # ansible expands variables and user home in the arguments
+            return None
+        script = " ".join(pipes.quote(arg) for arg in result_cmd)
+    if complex_args.get("chdir"):
+        script = "cd {} && {}".format(pipes.quote(complex_args["chdir"]), script)
+    command_line = "/bin/sh -c {}".format(pipes.quote(script))
+    if become:
+        command_line = "sudo -H -n {}".format(command_line)
+    return command_line, result_cmd
+
+
+class SshShell(object):
+    """Persistent SSH connection to a host running commands in channels of the connection"""
+
+    CONNECT_TIMEOUT = 30
+    KEEPALIVE_INTERVAL = 30
+    READ_SIZE = 65536
+
+    def __init__(self, hostname, address, username, password, port=22, become=True):
+        self.hostname = hostname
+        self.address = address
+        self.username = username
+        self.password = password
+        self.port = port
+        self.become = become
+        self.client = None
+        self.lock = threading.Lock()
+        # set when the host can't be used without ansible, e.g. the credentials are not right
+        self.disabled = False
+
+    def _connect(self):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            client.connect(self.address, port=self.port, username=self.username, password=self.password,
+                           timeout=self.CONNECT_TIMEOUT, allow_agent=False, look_for_keys=False)
+        except Exception as e:
+            client.close()
+            self.disabled = True
+            raise SshShellUnavailable("Failed to connect to {}: {}".format(self.hostname, repr(e)))
+        client.get_transport().set_keepalive(self.KEEPALIVE_INTERVAL)
+        logger.debug("Opened SSH connection to {} ({}@{}:{})".format(
+            self.hostname, self.username, self.address, self.port))
+        return client
+
+    def _open_channel(self):
+        with self.lock:
+            for attempt in range(2):
+                if self.client is None or not self.client.get_transport() or \
+                        not self.client.get_transport().is_active():
+                    self.close()
+                    self.client = self._connect()
+                try:
+                    return self.client.get_transport().open_session()
+                except (paramiko.SSHException, EOFError, IOError) as e:
+                    # connection dropped, the command didn't start yet so it is safe to reconnect and retry
+                    logger.debug("Failed to open SSH channel to {}: {}".format(self.hostname, repr(e)))
+                    self.close()
+            raise SshShellUnavailable("Failed to open SSH channel to {}".format(self.hostname))
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def exec_command(self, command_line, stdin=None):
+        """Run a command line in a new channel
+
+        Returns:
+            tuple: Exit code, stdout and stderr of the command.
+        """
+        channel = self._open_channel()
+        try:
+            channel.exec_command(command_line)
+            if stdin is not None:
+                channel.sendall(stdin if stdin.endswith("\n") else stdin + "\n")
+            channel.shutdown_write()
+            stdout, stderr = [], []
+            # read both streams as they come, an unread stream can stall the channel
+            while True:
+                if channel.recv_ready():
+                    stdout.append(channel.recv(self.READ_SIZE))
+                elif channel.recv_stderr_ready():
+                    stderr.append(channel.recv_stderr(self.READ_SIZE))
+                elif channel.exit_status_ready():
+                    break
+                else:
+                    select.select([channel], [], [], 1)
+            rc = channel.recv_exit_status()
+            # the end of the output can arrive together with the exit status, read both streams to EOF
+            for recv, output in ((channel.recv, stdout), (channel.recv_stderr, stderr)):
+                while True:
+                    data = recv(self.READ_SIZE)
+                    if not data:
+                        break
+                    output.append(data)
+        finally:
+            channel.close()
+        return rc, "".join(stdout), "".join(stderr)
+
+    def run_module(self, module_name, module_args, complex_args):
+        """Run a shell module call
+
+        Raises:
+            SshShellUnavailable: The call is not supported or the command couldn't be run on the connection.
+
+        Returns:
+            ModuleResult: The result in the format of the ansible module result.
+        """
+        command = build_command(module_name, module_args, complex_args, self.become)
+        if command is None:
+            raise SshShellUnavailable("Unsupported arguments of module {}".format(module_name))
+        command_line, result_cmd = command
+
+        start = datetime.datetime.now()
+        rc, stdout, stderr = self.exec_command(command_line, complex_args.get("stdin"))
+        end = datetime.datetime.now()
+
+        stdout = stdout.decode("utf-8", "replace").rstrip("\r\n")
+        stderr = stderr.decode("utf-8", "replace").rstrip("\r\n")
+        if self.become and rc != 0 and SUDO_PASSWORD_REQUIRED in stderr:
+            self.disabled = True
+            raise SshShellUnavailable("sudo on {} requires a password".format(self.hostname))
+
+        res = {
+            "cmd": result_cmd,
+            "rc": rc,
+            "stdout": stdout,
+            "stderr": stderr,
+            "stdout_lines": stdout.splitlines(),
+            "stderr_lines": stderr.splitlines(),
+            "start": str(start),
+            "end": str(end),
+            "delta": str(end - start),
+            "changed": True,
+            "failed": rc != 0,
+        }
+        if rc != 0:
+            res["msg"] = "non-zero return code"
+        return ModuleResult(**res)
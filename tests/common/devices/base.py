@@ -1,9 +1,13 @@
+import functools
 import inspect
 import json
 import logging
+import threading
+import time
 
 from multiprocessing.pool import ThreadPool
 
+from tests.common.connections.ssh_shell import SshShell, SshShellUnavailable
 from tests.common.errors import RunAnsibleModuleFail
 
 logger = logging.getLogger(__name__)
@@ -23,6 +27,39 @@ except Exception as e:
     logging.error("Hack for https://github.com/ansible/pytest-ansible/issues/47 failed: {}".format(repr(e)))
 
 
+class ModuleStats(object):
+    """
+    @summary: Count and latency of module calls, by module and by the way the module was run (ansible or ssh)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, module_name, path, elapsed):
+        with self.lock:
+            entry = self.stats.setdefault((module_name, path), [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+    def report(self):
+        """
+        @summary: Lines of a table of the module calls, modules with the largest total time first
+        """
+        with self.lock:
+            stats = sorted(self.stats.items(), key=lambda item: item[1][1], reverse=True)
+        lines = ["{:<32} {:<8} {:>8} {:>10} {:>10} {:>10}".format(
+            "module", "path", "calls", "total(s)", "avg(ms)", "max(ms)")]
+        for (module_name, path), (count, total, longest) in stats:
+            lines.append("{:<32} {:<8} {:>8} {:>10.2f} {:>10.1f} {:>10.1f}".format(
+                module_name, path, count, total, total * 1000 / count, longest * 1000))
+        return lines
+
+
+module_stats = ModuleStats()
+
+
 class AnsibleHostBase(object):
     """
     @summary: The base class for various objects.
@@ -30,8 +67,17 @@ class AnsibleHostBase(object):
     This class filters an object from the ansible_adhoc fixture by hostname. The object can be considered as an
     ansible host object although it is not under the hood. Anyway, we can use this object to run ansible module
     on the host.
+
+    When ssh_fast_path is enabled, calls of the modules in ssh_fast_path_modules are run directly on a persistent
+    SSH connection to the host instead of ansible. The calls with arguments not supported on the SSH connection and
+    calls on hosts the connection can't be used with fall back to ansible.
     """
 
+    # Set by the --ssh_fast_path option
+    ssh_fast_path = False
+    # Modules which can be run on the SSH connection to this type of host
+    ssh_fast_path_modules = ()
+
     def __init__(self, ansible_adhoc, hostname, *args, **kwargs):
         if hostname == 'localhost':
             self.host = ansible_adhoc(connection='local', host_pattern=hostname)[hostname]
@@ -39,18 +85,50 @@ class AnsibleHostBase(object):
             self.host = ansible_adhoc(become=True, *args, **kwargs)[hostname]
             self.mgmt_ip = self.host.options["inventory_manager"].get_host(hostname).vars["ansible_host"]
         self.hostname = hostname
+        self._ssh_shell = None
 
     def __getattr__(self, module_name):
         if self.host.has_module(module_name):
             self.module_name = module_name
             self.module = getattr(self.host, module_name)
 
-            return self._run
+            # Bind the module to the returned function, the same host can be called from several threads
+            return functools.partial(self._run, module_name, self.module)
         raise AttributeError(
             "'%s' object has no attribute '%s'" % (self.__class__, module_name)
             )
 
-    def _run(self, *module_args, **complex_args):
+    def _get_ssh_shell(self):
+        if self._ssh_shell is None:
+            try:
+                hostvars = self.host.options['variable_manager']._hostvars[self.hostname]
+                username = hostvars.get('ansible_ssh_user') or hostvars.get('ansible_user')
+                password = hostvars.get('ansible_ssh_pass') or hostvars.get('ansible_password')
+                port = int(hostvars.get('ansible_port') or 22)
+                self._ssh_shell = SshShell(self.hostname, self.mgmt_ip, username, password, port=port)
+            except Exception as e:
+                logger.warning("SSH fast path is not available on {}: {}".format(self.hostname, repr(e)))
+                self._ssh_shell = SshShell(self.hostname, None, None, None)
+                self._ssh_shell.disabled = True
+        return self._ssh_shell
+
+    def _run_ssh_fast_path(self, module_name, module_args, complex_args):
+        """
+        @summary: Run a module call on the SSH connection
+        @return: The result of the call or None if it has to be run by ansible
+        """
+        if not self.ssh_fast_path or module_name not in self.ssh_fast_path_modules or self.hostname == 'localhost':
+            return None
+        ssh_shell = self._get_ssh_shell()
+        if ssh_shell.disabled:
+            return None
+        try:
+            return ssh_shell.run_module(module_name, module_args, complex_args)
+        except SshShellUnavailable as e:
+            logger.debug("Running module {} on {} with ansible: {}".format(module_name, self.hostname, repr(e)))
+            return None
+
+    def _run(self, module_name, module, *module_args, **complex_args):
 
         previous_frame = inspect.currentframe().f_back
         filename, line_number, function_name, lines, index = inspect.getframeinfo(previous_frame)
@@ -60,32 +138,38 @@ class AnsibleHostBase(object):
         if verbose:
             logging.debug("{}::{}#{}: [{}] AnsibleModule::{}, args={}, kwargs={}"\
                 .format(filename, function_name, line_number, self.hostname,
-                        self.module_name, json.dumps(module_args), json.dumps(complex_args)))
+                        module_name, json.dumps(module_args), json.dumps(complex_args)))
         else:
             logging.debug("{}::{}#{}: [{}] AnsibleModule::{} executing..."\
-                .format(filename, function_name, line_number, self.hostname, self.module_name))
+                .format(filename, function_name, line_number, self.hostname, module_name))
 
         module_ignore_errors = complex_args.pop('module_ignore_errors', False)
         module_async = complex_args.pop('module_async', False)
 
         if module_async:
             def run_module(module_args, complex_args):
-                return self.module(*module_args, **complex_args)[self.hostname]
+                return module(*module_args, **complex_args)[self.hostname]
             pool = ThreadPool()
             result = pool.apply_async(run_module, (module_args, complex_args))
             return pool, result
 
-        res = self.module(*module_args, **complex_args)[self.hostname]
+        start_time = time.time()
+        res = self._run_ssh_fast_path(module_name, module_args, complex_args)
+        if res is not None:
+            module_stats.record(module_name, 'ssh', time.time() - start_time)
+        else:
+            res = module(*module_args, **complex_args)[self.hostname]
+            module_stats.record(module_name, 'ansible', time.time() - start_time)
 
         if verbose:
             logging.debug("{}::{}#{}: [{}] AnsibleModule::{} Result => {}"\
-                .format(filename, function_name, line_number, self.hostname, self.module_name, json.dumps(res)))
+                .format(filename, function_name, line_number, self.hostname, module_name, json.dumps(res)))
         else:
             logging.debug("{}::{}#{}: [{}] AnsibleModule::{} done, is_failed={}, rc={}"\
-                .format(filename, function_name, line_number, self.hostname, self.module_name, \
+                .format(filename, function_name, line_number, self.hostname, module_name, \
                         res.is_failed, res.get('rc', None)))
 
         if (res.is_failed or 'exception' in res) and not module_ignore_errors:
-            raise RunAnsibleModuleFail("run module {} failed".format(self.module_name), res)
+            raise RunAnsibleModuleFail("run module {} failed".format(module_name), res)
 
         return res
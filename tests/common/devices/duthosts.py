@@ -1,6 +1,7 @@
 import logging
 
 from tests.common.devices.multi_asic import MultiAsicSonicHost
+from tests.common.helpers.parallel import parallel_call
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +15,18 @@ class DutHosts(object):
     class _Nodes(list):
         """ Internal class representing a list of MultiAsicSonicHosts """
         def _run_on_nodes(self, *module_args, **complex_args):
-            """ Delegate the call to each of the nodes, return the results in a dict."""
-            return {node.hostname: getattr(node, self.attr)(*module_args, **complex_args) for node in self}
+            """ Delegate the call to each of the nodes concurrently, return the results in a dict.
+
+            The keyword arguments 'parallel_timeout' and 'parallel_workers' are not passed to the nodes, they are
+            the time allowed for the call on each node and the max number of nodes called at the same time.
+            """
+            attr = self.attr
+            timeout = complex_args.pop("parallel_timeout", None)
+            max_workers = complex_args.pop("parallel_workers", None)
+            results = parallel_call(lambda node: getattr(node, attr)(*module_args, **complex_args), self,
+                                    timeout=timeout, max_workers=max_workers, label=lambda node: node.hostname,
+                                    name=attr)
+            return {node.hostname: result for node, result in zip(self, results)}
 
         def __getattr__(self, attr):
             """ To support calling ansible modules on a list of MultiAsicSonicHost
@@ -8,6 +8,7 @@ from tests.common.devices.sonic import SonicHost
 from tests.common.devices.sonic_asic import SonicAsic
 from tests.common.helpers.assertions import pytest_assert
 from tests.common.helpers.constants import DEFAULT_ASIC_ID, DEFAULT_NAMESPACE
+from tests.common.helpers.parallel import parallel_call
 
 logger = logging.getLogger(__name__)
 
@@ -83,6 +84,8 @@ class MultiAsicSonicHost(object):
                     - for single asic SonicHost this would still be the same as the ansible module on the global namespace
                 else if asic_index is string 'all', then a list of ansible module output for all the asics on the SonicHost
                     - for single asic, this would be a list of size 1.
+                    - the asics are called concurrently, 'parallel_timeout' and 'parallel_workers' in complex_args
+                      set the time allowed for the call on each asic and the max number of asics called at once.
         """
         if "asic_index" not in complex_args:
             # Default ASIC/namespace
@@ -90,6 +93,8 @@ class MultiAsicSonicHost(object):
         else:
             asic_complex_args = copy.deepcopy(complex_args)
             asic_index = asic_complex_args.pop("asic_index")
+            timeout = asic_complex_args.pop("parallel_timeout", None)
+            max_workers = asic_complex_args.pop("parallel_workers", None)
             if type(asic_index) == int:
                 # Specific ASIC/namespace
                 if self.sonichost.facts['num_asic'] == 1:
@@ -98,7 +103,11 @@ class MultiAsicSonicHost(object):
                 return getattr(self.asics[asic_index], self.multi_asic_attr)(*module_args, **asic_complex_args)
             elif type(asic_index) == str and asic_index.lower() == "all":
                 # All ASICs/namespace
-                return [getattr(asic, self.multi_asic_attr)(*module_args, **asic_complex_args) for asic in self.asics]
+                attr = self.multi_asic_attr
+                return parallel_call(lambda asic: getattr(asic, attr)(*module_args, **asic_complex_args), self.asics,
+                                     timeout=timeout, max_workers=max_workers,
+                                     label=lambda asic: "{}/asic{}".format(self.sonichost.hostname, asic.asic_index),
+                                     name=attr)
             else:
                 raise ValueError("Argument 'asic_index' must be an int or string 'all'.")
 
@@ -311,6 +320,28 @@ class MultiAsicSonicHost(object):
             "ASIC instance not found for port {}".format(port)
         )
 
+    def config_interfaces(self, ifnames, admin_status=None, speed=None, fec=None, autoneg=None,
+                          wait=True, timeout=180):
+        """
+        Configure multiple interfaces in a single CONFIG_DB transaction per ASIC, see SonicHost.config_interfaces.
+        The interfaces are updated in the namespaces of all the ASICs which have them, instead of looking up
+        the ASIC of every interface, and the oper status of all the interfaces is polled in a single loop.
+
+        Returns:
+            True if the interfaces reached the expected oper status, or wait is False
+        """
+        expected_status = {}
+        for asic in self.asics:
+            status = self.sonichost.set_interfaces_config(ifnames, admin_status, speed, fec, autoneg, asic.namespace)
+            if status:
+                expected_status[asic.namespace] = status
+
+        missing = set(ifnames).difference(*expected_status.values())
+        pytest_assert(not missing, "ASIC instance not found for ports {}".format(sorted(missing)))
+        if not wait:
+            return True
+        return self.sonichost.wait_namespaces_oper_status(expected_status, timeout)
+
     def get_queue_oid_asic_instance(self, queue_oid):
         """
         Returns the ASIC instance which has the queue OID saved.
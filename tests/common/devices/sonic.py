@@ -3,6 +3,7 @@ import ipaddress
 import json
 import logging
 import os
+import pipes
 import re
 import socket
 import time
@@ -13,14 +14,52 @@ from datetime import datetime
 from ansible import constants
 from ansible.plugins.loader import connection_loader
 
+from tests.common.connections.ssh_shell import SHELL_MODULES
 from tests.common.devices.base import AnsibleHostBase
 from tests.common.helpers.dut_utils import is_supervisor_node
-from tests.common.cache import cached
-from tests.common.helpers.constants import DEFAULT_ASIC_ID, DEFAULT_NAMESPACE
+from tests.common.helpers.show_table import ShowTable, find_sep_line, get_plan
+from tests.common.cache import cached, FactsCache
+from tests.common.helpers.constants import DEFAULT_ASIC_ID, DEFAULT_NAMESPACE, NAMESPACE_PREFIX
 from tests.common.errors import RunAnsibleModuleFail
+from tests.common.utilities import wait_until
 
 logger = logging.getLogger(__name__)
 
+CONFIG_DB = 4
+APPL_DB = 0
+
+# Redis runs a script atomically, all the ports are updated in a single CONFIG_DB transaction.
+# ARGV[1] is a JSON object with the PORT fields to set, ARGV[2..] are the port names.
+# Returns the name and admin status of every port found in the PORT table.
+CONFIG_PORTS_SCRIPT = """
+local fields = cjson.decode(ARGV[1])
+local result = {}
+for i = 2, #ARGV do
+    local key = 'PORT|' .. ARGV[i]
+    if redis.call('EXISTS', key) == 1 then
+        local autoneg = fields['autoneg'] or redis.call('HGET', key, 'autoneg')
+        for field, value in pairs(fields) do
+            if field == 'speed' and autoneg == 'on' then
+                field = 'adv_speeds'
+            end
+            redis.call('HSET', key, field, value)
+        end
+        table.insert(result, ARGV[i])
+        table.insert(result, redis.call('HGET', key, 'admin_status') or 'down')
+    end
+end
+return result
+"""
+
+# ARGV are the port names, returns the oper status of every port, 'unknown' if it is not in APPL_DB yet
+PORTS_OPER_STATUS_SCRIPT = """
+local result = {}
+for i = 1, #ARGV do
+    table.insert(result, redis.call('HGET', 'PORT_TABLE:' .. ARGV[i], 'oper_status') or 'unknown')
+end
+return result
+"""
+
 
 class SonicHost(AnsibleHostBase):
     """
@@ -30,6 +69,7 @@ class SonicHost(AnsibleHostBase):
     and also provides the ability to run Ansible modules on the SONiC device.
     """
 
+    ssh_fast_path_modules = SHELL_MODULES
 
     def __init__(self, ansible_adhoc, hostname,
                  shell_user=None, shell_passwd=None,
@@ -66,10 +106,18 @@ class SonicHost(AnsibleHostBase):
             }
             self.host.options['variable_manager'].extra_vars.update(evars)
 
-        self._facts = self._gather_facts()
         self._os_version = self._get_os_version()
+        # Facts cached for another image version are stale
+        cache = FactsCache()
+        cache.set_zone_policy(self.hostname, version=self._os_version)
+        self._facts = self._gather_facts()
         self.is_multi_asic = True if self.facts["num_asic"] > 1 else False
+        if self.is_multi_asic:
+            for asic_index in range(self.facts["num_asic"]):
+                cache.set_zone_policy("{}-{}{}".format(self.hostname, NAMESPACE_PREFIX, asic_index),
+                                      version=self._os_version)
         self._kernel_version = self._get_kernel_version()
+        self._show_cache = {}
 
 
     @property
@@ -797,6 +845,126 @@ class SonicHost(AnsibleHostBase):
         intf_str = ','.join(ifnames)
         return self.no_shutdown(intf_str)
 
+    def eval_redis_script(self, db, script, args, namespace=DEFAULT_NAMESPACE):
+        """
+            Run a Lua script in redis
+
+            Args:
+                db: the redis database number
+                script: the Lua script
+                args: the ARGV of the script
+                namespace: the namespace of the redis instance
+
+            Returns:
+                list: the lines of the script result
+        """
+        redis_cmd = "-n {} EVAL {} 0 {}".format(db, pipes.quote(script), " ".join(pipes.quote(arg) for arg in args))
+        if namespace != DEFAULT_NAMESPACE:
+            res = self.command("sudo ip netns exec {} /usr/bin/redis-cli {}".format(namespace, redis_cmd), verbose=False)
+        else:
+            res = self.run_redis_cli_cmd(redis_cmd)
+        return res["stdout_lines"]
+
+    def set_interfaces_config(self, ifnames, admin_status=None, speed=None, fec=None, autoneg=None,
+                              namespace=DEFAULT_NAMESPACE):
+        """
+            Set admin status, speed, FEC and auto negotiation mode of multiple interfaces in a single
+            CONFIG_DB transaction. The settings which are None are not changed. Same as set_speed, the
+            speed is set as the advertised speeds of interfaces with auto negotiation enabled.
+
+            Args:
+                ifnames (list): the interface names
+                admin_status (str): 'up' or 'down'
+                speed (str): SONiC style interface speed. E.g, 1G=1000, 10G=10000, 100G=100000
+                fec (str): 'rs', 'fc' or 'none'
+                autoneg (boolean): True to enable auto negotiation else disable
+                namespace: the namespace of the interfaces
+
+            Returns:
+                dict: the admin status after the update of the interfaces found in CONFIG_DB
+        """
+        fields = {}
+        if admin_status is not None:
+            fields['admin_status'] = admin_status
+        if speed is not None:
+            fields['speed'] = str(speed)
+        if fec is not None:
+            fields['fec'] = fec
+        if autoneg is not None:
+            fields['autoneg'] = 'on' if autoneg else 'off'
+
+        lines = self.eval_redis_script(CONFIG_DB, CONFIG_PORTS_SCRIPT, [json.dumps(fields)] + list(ifnames), namespace)
+        return dict(zip(lines[0::2], lines[1::2]))
+
+    def get_interfaces_oper_status(self, ifnames, namespace=DEFAULT_NAMESPACE):
+        """
+            Get the oper status of multiple interfaces from APPL_DB
+
+            Returns:
+                dict: oper status by interface name, 'unknown' for interfaces not in APPL_DB
+        """
+        ifnames = list(ifnames)
+        return dict(zip(ifnames, self.eval_redis_script(APPL_DB, PORTS_OPER_STATUS_SCRIPT, ifnames, namespace)))
+
+    def wait_interfaces_oper_status(self, expected_status, timeout=180, interval=2, namespace=DEFAULT_NAMESPACE):
+        """
+            Wait until multiple interfaces reach the expected oper status, the oper status of all the
+            interfaces is read at once in every poll
+
+            Args:
+                expected_status (dict): the expected oper status by interface name
+                timeout: maximum time to wait
+
+            Returns:
+                boolean: True if all the interfaces reached the expected oper status before timeout
+        """
+        return self.wait_namespaces_oper_status({namespace: expected_status}, timeout, interval)
+
+    def wait_namespaces_oper_status(self, expected_status, timeout=180, interval=2):
+        """
+            Same as wait_interfaces_oper_status for interfaces in multiple namespaces, polled in a single loop
+
+            Args:
+                expected_status (dict): the expected oper status by interface name, for every namespace
+        """
+        pending = {}
+
+        def _oper_status_reached():
+            pending.clear()
+            for namespace, expected in expected_status.items():
+                current = self.get_interfaces_oper_status(expected.keys(), namespace)
+                pending.update((ifname, current[ifname]) for ifname in expected if current[ifname] != expected[ifname])
+            return not pending
+
+        if not wait_until(timeout, interval, _oper_status_reached):
+            logger.warning("Interfaces didn't reach the expected oper status: {}".format(pending))
+            return False
+        return True
+
+    def config_interfaces(self, ifnames, admin_status=None, speed=None, fec=None, autoneg=None,
+                          wait=True, timeout=180, namespace=DEFAULT_NAMESPACE):
+        """
+            Configure multiple interfaces in a single CONFIG_DB transaction, see set_interfaces_config,
+            and wait for their oper status to follow their admin status.
+
+            Port flapping tests toggle hundreds of ports, a config command per port and setting is much
+            slower than updating CONFIG_DB at once.
+
+            Args:
+                wait (boolean): wait until the oper status of the interfaces is the same as their admin status
+                timeout: maximum time to wait
+
+            Returns:
+                boolean: True if the interfaces reached the expected oper status, or wait is False
+        """
+        status = self.set_interfaces_config(ifnames, admin_status, speed, fec, autoneg, namespace)
+        missing = set(ifnames) - set(status)
+        if missing:
+            raise Exception("Interfaces {} not found in CONFIG_DB".format(sorted(missing)))
+        if not wait:
+            return True
+        return self.wait_interfaces_oper_status(status, timeout, namespace=namespace)
+
     def get_ip_route_info(self, dstip, ns=""):
         """
         @summary: return route information for a destionation. The destination coulb an ip address or ip prefix.
@@ -1070,43 +1238,32 @@ default via fc00::1a dev PortChannel0004 proto 186 src fc00:1::32 metric 20  pre
         return positions
 
 
-    def _parse_show(self, output_lines):
+    def _parse_show(self, output_lines, as_table=False):
+        """Parse the tabular output of a show command
 
-        result = []
+        Args:
+            output_lines: The lines of the command output.
+            as_table: Return a ShowTable instead of a list of dictionaries.
 
-        sep_line_pattern = re.compile(r"^( *-+ *)+$")
-        sep_line_found = False
-        for idx, line in enumerate(output_lines):
-            if sep_line_pattern.match(line):
-                sep_line_found = True
-                header_line = output_lines[idx-1]
-                sep_line = output_lines[idx]
-                content_lines = output_lines[idx+1:]
-                break
+        Returns:
+            List of dictionaries or ShowTable, empty list if the output has no separation line.
+        """
+        result = []
 
-        if not sep_line_found:
+        idx = find_sep_line(output_lines)
+        if idx is None:
             logging.error('Failed to find separation line in the show command output')
             return result
 
         try:
-            positions = self._parse_column_positions(sep_line)
+            plan = get_plan(output_lines[idx-1], output_lines[idx], self._parse_column_positions)
         except Exception as e:
             logging.error('Possibly bad command output, exception: {}'.format(repr(e)))
             return result
 
-        headers = []
-        for (left, right) in positions:
-            headers.append(header_line[left:right].strip().lower())
-
-        for content_line in content_lines:
-            item = {}
-            for idx, (left, right) in enumerate(positions):
-                k = headers[idx]
-                v = content_line[left:right].strip()
-                item[k] = v
-            result.append(item)
-
-        return result
+        if as_table:
+            return ShowTable(plan, [plan.parse_line(line) for line in output_lines[idx+1:]])
+        return [plan.parse_dict(line) for line in output_lines[idx+1:]]
 
     def show_and_parse(self, show_cmd, **kwargs):
         """Run a show command and parse the output using a generic pattern.
@@ -1168,14 +1325,31 @@ default via fc00::1a dev PortChannel0004 proto 186 src fc00:1::32 metric 20  pre
 
         Args:
             show_cmd: The show command that will be executed.
+            as_table: Return a ShowTable with columnar access instead of the list of dictionaries.
+            cache_ttl: Reuse the output of the same command run within cache_ttl seconds. Disabled by default, a poll
+                loop waiting for the output to change must not use it.
 
         Returns:
             Return the parsed output of the show command in a list of dictionary. Each list item is a dictionary,
             corresponding to one content line under the header in the output. Keys of the dictionary are the column
             headers in lowercase.
         """
-        output = self.shell(show_cmd, **kwargs)["stdout_lines"]
-        return self._parse_show(output)
+        as_table = kwargs.pop("as_table", False)
+        cache_ttl = kwargs.pop("cache_ttl", None)
+        if not cache_ttl:
+            output = self.shell(show_cmd, **kwargs)["stdout_lines"]
+            return self._parse_show(output, as_table)
+
+        # the keyword arguments of the shell module can be lists or dictionaries, which are not hashable
+        key = (show_cmd, json.dumps(kwargs, sort_keys=True, default=str))
+        now = time.time()
+        cached_result = self._show_cache.get(key)
+        if cached_result is None or now - cached_result[0] > cache_ttl:
+            output = self.shell(show_cmd, **kwargs)["stdout_lines"]
+            cached_result = (now, self._parse_show(output, True))
+            self._show_cache[key] = cached_result
+        # the cached table is shared, the callers get their own rows
+        return cached_result[1] if as_table else list(cached_result[1])
 
     @cached(name='mg_facts')
     def get_extended_minigraph_facts(self, tbinfo, namespace = DEFAULT_NAMESPACE):
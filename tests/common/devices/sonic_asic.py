@@ -446,6 +446,10 @@ class SonicAsic(object):
         return self.sonichost.shell("sudo config interface {ns} startup {intf}".
                                     format(ns=self.cli_ns_option, intf=interface_name))
 
+    def config_interfaces(self, ifnames, **kwargs):
+        """Configure multiple interfaces of this ASIC, see SonicHost.config_interfaces."""
+        return self.sonichost.config_interfaces(ifnames, namespace=self.namespace, **kwargs)
+
     def shutdown_interface(self, interface_name):
         return self.sonichost.shell("sudo config interface {ns} shutdown {intf}".
                                     format(ns=self.cli_ns_option, intf=interface_name))
@@ -38,3 +38,27 @@ class RunAnsibleModuleFail(AnsibleError):
 
 class MissingInputError(Exception):
     pass
+
+
+class ParallelCallFail(RunAnsibleModuleFail):
+
+    """Raised when a call fanned out to several targets failed on more than one of them.
+
+    The results are those of the first target failed with RunAnsibleModuleFail, so the callers handling failure of
+    a module called on one target handle it the same way. The exceptions of all the failed targets are in errors.
+    """
+
+    def __init__(self, msg, errors):
+        results = None
+        for error in errors.values():
+            if getattr(error, "results", None) is not None:
+                results = error.results
+                break
+        super(ParallelCallFail, self).__init__(msg, results)
+        self.errors = errors
+
+    def _to_string(self):
+        lines = [self.message]
+        for target, error in self.errors.items():
+            lines.append("  {}: {}".format(target, repr(error)))
+        return "\n".join(lines)
@@ -4,12 +4,19 @@ import os
 import shutil
 import tempfile
 import signal
+import time
 import traceback
-from multiprocessing import Process, Manager, Pipe
+from collections import OrderedDict
+from multiprocessing import Process, Manager, Pipe, TimeoutError
+from multiprocessing.pool import ThreadPool
+from tests.common.errors import ParallelCallFail
 from tests.common.helpers.assertions import pytest_assert as pt_assert
 
 logger = logging.getLogger(__name__)
 
+# Max number of threads used by parallel_call
+PARALLEL_CALL_MAX_WORKERS = 16
+
 
 class SonicProcess(Process):
     """
@@ -128,6 +135,114 @@ def parallel_run(target, args, kwargs, nodes, timeout=None):
     return results
 
 
+def parallel_call(func, targets, timeout=None, max_workers=None, label=str, name=None):
+    """Call func on each of the targets concurrently in a pool of threads
+
+    Unlike parallel_run, the calls run in threads of the current process, so the targets don't need to be picklable
+    and the results are returned directly. It is meant for fanning out I/O bound calls like ansible modules.
+
+    Args:
+        func (function): The function to be called with each target as the only argument.
+        targets (list): List of targets, e.g. nodes or asics.
+        timeout (int or float, optional): Time allowed for each call, counted from the start of the call. A call
+            exceeding it is reported as failed, its thread is left to complete in the background.
+        max_workers (int, optional): Max number of calls running at the same time. Defaults to
+            PARALLEL_CALL_MAX_WORKERS. With 1 the calls run serially in the current thread.
+        label (function, optional): Function returning the name of a target in logs and errors.
+        name (str, optional): Name of the call in logs and errors. Defaults to the name of func.
+
+    Raises:
+        ParallelCallFail: In case of calls failed or timed out on several targets, or timed out on one target. When
+            the call raised an exception on one target only, that exception is raised as is. ParallelCallFail is a
+            RunAnsibleModuleFail with the results of the first failed ansible module, the exceptions of all the
+            failed targets are in its errors attribute.
+
+    Returns:
+        list: Results of the calls in order of the targets.
+    """
+    targets = list(targets)
+    name = name or getattr(func, '__name__', str(func))
+    if max_workers is None:
+        max_workers = PARALLEL_CALL_MAX_WORKERS
+    if len(targets) <= 1 or max_workers <= 1:
+        return [func(target) for target in targets]
+
+    timings = [[None, None] for _ in targets]
+
+    def run(index):
+        timings[index][0] = time.time()
+        try:
+            return True, func(targets[index]), None
+        except Exception as e:
+            return False, e, traceback.format_exc()
+        finally:
+            timings[index][1] = time.time()
+
+    start_time = time.time()
+    pool = ThreadPool(min(max_workers, len(targets)))
+    async_results = [pool.apply_async(run, (index,)) for index in range(len(targets))]
+    pool.close()
+
+    results = []
+    errors = OrderedDict()
+    for index, async_result in enumerate(async_results):
+        while not async_result.ready():
+            if timeout is None:
+                async_result.wait()
+                break
+            started = timings[index][0]
+            if started is None:
+                # still queued behind other calls
+                async_result.wait(0.1)
+                continue
+            remaining = started + timeout - time.time()
+            if remaining <= 0:
+                break
+            async_result.wait(remaining)
+
+        target_label = label(targets[index])
+        if not async_result.ready():
+            errors[target_label] = (TimeoutError('{} on {} did not complete in {} seconds'.format(
+                name, target_label, timeout)), None)
+            results.append(None)
+            continue
+        succeeded, result, tb = async_result.get()
+        if succeeded:
+            results.append(result)
+        else:
+            errors[target_label] = (result, tb)
+            results.append(None)
+
+    end_time = time.time()
+    breakdown = []
+    durations = []
+    for index, (started, finished) in enumerate(timings):
+        if started is None or finished is None:
+            elapsed = 'n/a'
+        else:
+            durations.append(finished - started)
+            elapsed = '{:.2f}s'.format(finished - started)
+        breakdown.append('{}={}'.format(label(targets[index]), elapsed))
+    # the breakdown is only worth reading when a target is much slower than the others, not for the calls
+    # completing in a fraction of a second anyway
+    durations.sort()
+    median = (durations[(len(durations) - 1) // 2] + durations[len(durations) // 2]) / 2.0 if durations else 0
+    log = logger.info if durations and durations[-1] > max(2 * median, 1) else logger.debug
+    log('Completed {} on {} targets in {:.2f} seconds: {}'.format(
+        name, len(targets), end_time - start_time, ', '.join(breakdown)))
+
+    if errors:
+        for target_label, (error, tb) in errors.items():
+            logger.error('{} on {} failed with exception {} and traceback {}'.format(
+                name, target_label, repr(error), tb))
+        if len(errors) == 1 and list(errors.values())[0][1] is not None:
+            raise list(errors.values())[0][0]
+        raise ParallelCallFail('{} failed on {} of {} targets'.format(name, len(errors), len(targets)),
+                               OrderedDict((key, value[0]) for key, value in errors.items()))
+
+    return results
+
+
 def reset_ansible_local_tmp(target):
     """Decorator for resetting ansible default local tmp dir for parallel multiprocessing.Process
 
@@ -0,0 +1,116 @@
+"""
+Column parser for the tabular output of the SONiC show commands
+
+The layout of a table is given by its header line and the separation line of '-' under every column header.
+It is compiled once per header signature into a plan: the lowercase column names and the slices of the columns, so
+the separation line is not parsed again and a content line is split into a tuple of values in one pass.
+
+A ShowTable keeps the values of the content lines as tuples. The dictionaries keyed by the column names are only
+built for the rows which are accessed.
+"""
+import re
+
+SEP_LINE_PATTERN = re.compile(r"^( *-+ *)+$")
+
+# Compiled plans keyed by header and separation line, the column widths follow the content so the number of layouts
+# seen in a session is bounded to keep the cache from growing
+_plans = {}
+MAX_PLANS = 256
+
+
+class ShowTablePlan(object):
+    """Column names and slices of one table layout"""
+
+    def __init__(self, header_line, positions):
+        self.headers = tuple(header_line[left:right].strip().lower() for (left, right) in positions)
+        self.slices = [slice(left, right) for (left, right) in positions]
+        self.columns = list(zip(self.headers, self.slices))
+
+    def parse_line(self, line):
+        """Get the values of the columns as a tuple"""
+        return tuple([line[column].strip() for column in self.slices])
+
+    def parse_dict(self, line):
+        """Get the values of the columns as a dictionary keyed by the column names"""
+        item = {}
+        for header, column in self.columns:
+            item[header] = line[column].strip()
+        return item
+
+
+def get_plan(header_line, sep_line, parse_column_positions):
+    """Get the compiled plan of a table layout, compile it on the first use
+
+    Args:
+        header_line: The line with the column headers.
+        sep_line: The line of '-' under the column headers.
+        parse_column_positions: Function returning the (start, end) positions of the columns in the separation line.
+    """
+    key = (header_line, sep_line)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = ShowTablePlan(header_line, parse_column_positions(sep_line))
+        if len(_plans) >= MAX_PLANS:
+            _plans.clear()
+        _plans[key] = plan
+    return plan
+
+
+def find_sep_line(output_lines):
+    """Find the index of the separation line in the output, or None if there is no separation line"""
+    for idx, line in enumerate(output_lines):
+        if line.lstrip(" ").startswith("-") and SEP_LINE_PATTERN.match(line):
+            return idx
+    return None
+
+
+class ShowTable(object):
+    """Parsed table with columnar access, rows are built as dictionaries when accessed
+
+    Supports len(), indexing and iteration like the list of dictionaries returned by SonicHost.show_and_parse.
+    """
+
+    def __init__(self, plan, values):
+        self.plan = plan
+        self.values = values
+
+    @property
+    def headers(self):
+        return list(self.plan.headers)
+
+    def column(self, name):
+        """Get all the values of the column"""
+        idx = self.plan.headers.index(name)
+        return [row[idx] for row in self.values]
+
+    def row(self, idx):
+        return dict(zip(self.plan.headers, self.values[idx]))
+
+    def to_list(self):
+        """Get the rows as a list of dictionaries"""
+        headers = self.plan.headers
+        return [dict(zip(headers, row)) for row in self.values]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [dict(zip(self.plan.headers, row)) for row in self.values[idx]]
+        return self.row(idx)
+
+    def __iter__(self):
+        headers = self.plan.headers
+        for row in self.values:
+            yield dict(zip(headers, row))
+
+    def __eq__(self, other):
+        if isinstance(other, ShowTable):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.to_list())
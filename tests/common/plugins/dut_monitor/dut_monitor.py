@@ -1,94 +1,199 @@
+"""
+Sampler of the hardware resources consumed by the DUT - CPU, RAM and HDD.
+
+Values are read directly from '/proc' and 'statvfs', without starting any process, so the sampler itself doesn't
+skew the measured CPU utilization and can sample several times per second.
+Every sample is stored as a fixed size binary record to a ring file which is memory mapped by the sampler:
+    header  - HEADER_FORMAT: magic, number of record slots, record size, sampling interval, number of records written
+    records - RECORD_FORMAT, record N is stored to the slot N % slots
+The number of records written is updated after the record is stored, so a reader never sees a partial record.
+"""
 import argparse
-import time
+import heapq
+import mmap
 import os
+import struct
+import sys
+import time
 
-from  datetime import datetime
 
+DUT_MONITOR_FILE = "/tmp/dut_monitor.bin"
+MEASURE_DELAY = 0.5
+RING_SLOTS = 7200
+TOP_CONSUMERS = 10
+CMDLINE_SIZE = 64
 
-FETCH_CPU_CMD = "ps -eo pcpu,args | sort -k 1 -r | tail -n +2"
-FETCH_HDD_CMD = "df -hm /"
-MEASURE_DELAY = 2
+MAGIC = 0x314d5544
+HEADER_FORMAT = "<IIIdQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+COUNT_FORMAT = "<Q"
+COUNT_OFFSET = HEADER_SIZE - struct.calcsize(COUNT_FORMAT)
+# timestamp, CPU busy and total jiffies, RAM total and available KB, HDD used and available blocks
+SAMPLE_FIELDS = "dQQQQQQ"
+# pid, CPU utilization in percents of one CPU, command line
+CONSUMER_FIELDS = "If{}s".format(CMDLINE_SIZE)
+RECORD_FIELDS = SAMPLE_FIELDS + CONSUMER_FIELDS * TOP_CONSUMERS
+RECORD_FORMAT = "<" + RECORD_FIELDS
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
 
 
-def process_cpu(log_file):
+def read_cpu():
     """
-    @summary: Fetch CPU utilization. Write to the file total and top 10 process CPU utilization.
-    @param log_file: Opened file object to store fetched CPU utilization.
+    @summary: Read CPU time spent by all CPUs since boot from '/proc/stat'.
+    @return: Tuple with busy and total jiffies.
     """
-    buff = []
-    general_template = """
-"{timestamp}":
-    total: {total}
-    top_consumer:
-"""
-    per_process_template = "        {cpu_utilization}: \"{process}\""
-    top_consumer_list = []
-    total = 0
-    top_consumer_counter = 10
-
-    for line in os.popen(FETCH_CPU_CMD).readlines():
-        process_consumed = float(line.split()[0])
-        total += process_consumed
-        if top_consumer_counter:
-            top_consumer_list.append(per_process_template.format(cpu_utilization=process_consumed,
-                                     process=" ".join(line.split()[1:])))
-            top_consumer_counter -= 1
+    with open("/proc/stat") as stream:
+        fields = [int(value) for value in stream.readline().split()[1:9]]
+    # user, nice, system, idle, iowait, irq, softirq, steal
+    total = sum(fields)
+    return total - fields[3] - fields[4], total
 
-    result = general_template.format(timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), total=total) \
-                + "\n".join(top_consumer_list)
-    log_file.write(result)
 
-
-def process_ram(log_file):
+def read_ram():
     """
-    @summary: Fetch RAM utilization and write it to the file.
-              Use 'MemTotal' and 'MemAvailable' from '/proc/meminfo' to obtain used RAM amount.
-    @param log_file: Opened file object to store fetched RAM utilization.
+    @summary: Read 'MemTotal' and 'MemAvailable' from '/proc/meminfo'.
+    @return: Tuple with total and available RAM in KB.
     """
-    with open('/proc/meminfo') as stream:
+    total = available = 0
+    with open("/proc/meminfo") as stream:
         for line in stream:
-            if 'MemAvailable' in line:
-                available_mem_in_kb = int(line.split()[1])
-            if 'MemTotal' in line:
-                total_mem_in_kb = int(line.split()[1])
+            if line.startswith("MemTotal:"):
+                total = int(line.split()[1])
+            elif line.startswith("MemAvailable:"):
+                available = int(line.split()[1])
+                break
+    return total, available
 
-    used = total_mem_in_kb - available_mem_in_kb
-    used_percent = used * 100 / total_mem_in_kb
-    log_file.write("\"{date}\": {used_ram}\n".format(date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                   used_ram=used_percent))
+
+def read_hdd():
+    """
+    @summary: Read usage of the root file system the same way as 'df' does.
+    @return: Tuple with used and available blocks.
+    """
+    stat = os.statvfs("/")
+    return stat.f_blocks - stat.f_bfree, stat.f_bavail
 
 
-def process_hdd(log_file):
+def read_process_jiffies():
+    """
+    @summary: Read CPU time spent by every process from '/proc/<pid>/stat'.
+    @return: Dictionary with pid as key and user plus system jiffies as value.
+    """
+    jiffies = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as stream:
+                data = stream.read()
+        except IOError:
+            # process exited
+            continue
+        # command name in parentheses can contain spaces, fields after it start with the process state
+        fields = data[data.rfind(")") + 2:].split()
+        jiffies[int(entry)] = int(fields[11]) + int(fields[12])
+    return jiffies
+
+
+def read_cmdline(pid):
     """
-    @summary: Fetch used amount of HDD and write it to the file. Execute command defined in FETCH_HDD_CMD.
-    @param log_file: Opened file object to store fetched HDD utilization.
+    @summary: Read command line of the process, or its name in brackets for kernel threads like 'ps' does.
     """
-    output_line_id = 1
-    use_value_id = 4
-    hdd_usage = os.popen(FETCH_HDD_CMD).read().split("\n")[output_line_id].split()[use_value_id].rstrip("%")
-    log_file.write("\"{date}\": {used_ram}\n".format(date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                   used_ram=hdd_usage))
-
-
-def main():
-    cpu_log = open("/tmp/cpu.log", "w")
-    ram_log = open("/tmp/ram.log", "w")
-    hdd_log = open("/tmp/hdd.log", "w")
-
-    print "Started resources monitoring ..."
-    while True:
-        process_cpu(cpu_log)
-        process_ram(ram_log)
-        process_hdd(hdd_log)
-        time.sleep(MEASURE_DELAY)
-        cpu_log.flush()
-        ram_log.flush()
-        hdd_log.flush()
+    try:
+        with open("/proc/{}/cmdline".format(pid)) as stream:
+            cmdline = stream.read(CMDLINE_SIZE).replace("\0", " ").strip()
+        if not cmdline:
+            with open("/proc/{}/comm".format(pid)) as stream:
+                cmdline = "[{}]".format(stream.read().strip())
+    except IOError:
+        cmdline = ""
+    return cmdline.encode("utf-8") if not isinstance(cmdline, bytes) else cmdline
+
+
+class Sampler(object):
+    """
+    Store samples of the CPU, RAM and HDD utilization to the ring file
+    """
+    def __init__(self, path, slots, interval):
+        self.slots = slots
+        self.interval = interval
+        self.count = 0
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.prev_time = None
+        self.prev_jiffies = None
+
+        size = HEADER_SIZE + slots * RECORD_SIZE
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.ring = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        struct.pack_into(HEADER_FORMAT, self.ring, 0, MAGIC, slots, RECORD_SIZE, interval, 0)
+
+    def top_consumers(self, timestamp):
+        """
+        @summary: Find processes which consumed the most of CPU time since the previous sample.
+        @return: List of pid, CPU utilization and command line of TOP_CONSUMERS processes.
+        """
+        jiffies = read_process_jiffies()
+        prev_jiffies, prev_time = self.prev_jiffies, self.prev_time
+        self.prev_jiffies, self.prev_time = jiffies, timestamp
+        if prev_jiffies is None or timestamp <= prev_time:
+            return []
+
+        # processes started after the previous sample consumed all their CPU time since then
+        deltas = [(value - prev_jiffies.get(pid, 0), pid) for pid, value in jiffies.items()]
+        top = heapq.nlargest(TOP_CONSUMERS, [item for item in deltas if item[0] > 0])
+        scale = 100.0 / (self.clock_ticks * (timestamp - prev_time))
+        return [(pid, delta * scale, read_cmdline(pid)) for delta, pid in top]
+
+    def sample(self):
+        """
+        @summary: Take a sample and store it to the next slot of the ring.
+        """
+        timestamp = time.time()
+        values = [timestamp]
+        values.extend(read_cpu())
+        values.extend(read_ram())
+        values.extend(read_hdd())
+        consumers = self.top_consumers(timestamp)
+        for consumer in consumers:
+            values.extend(consumer)
+        values.extend((0, 0.0, b"") * (TOP_CONSUMERS - len(consumers)))
+
+        offset = HEADER_SIZE + (self.count % self.slots) * RECORD_SIZE
+        struct.pack_into(RECORD_FORMAT, self.ring, offset, *values)
+        self.count += 1
+        struct.pack_into(COUNT_FORMAT, self.ring, COUNT_OFFSET, self.count)
+
+    def run(self):
+        next_sample = time.time()
+        while True:
+            self.sample()
+            next_sample += self.interval
+            delay = next_sample - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # sampling took longer than the interval, don't try to catch up
+                next_sample = time.time()
+
+
+def main(args):
+    sampler = Sampler(args.file, args.slots, args.interval)
+    print("Started resources monitoring ...")
+    sys.stdout.flush()
+    sampler.run()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--start", help="device file", action="store_true", default=False)
+    parser.add_argument("--file", help="ring file to store the samples to", default=DUT_MONITOR_FILE)
+    parser.add_argument("--interval", help="sampling interval in seconds", type=float, default=MEASURE_DELAY)
+    parser.add_argument("--slots", help="number of samples kept in the ring file", type=int, default=RING_SLOTS)
     args = parser.parse_args()
 
     if args.start:
-        main()
+        main(args)
@@ -2,20 +2,111 @@ import pytest
 import paramiko
 import threading
 import logging
+import struct
 import time
+import math
 import os
 import yaml
 
-from collections import OrderedDict
 from  datetime import datetime
 from errors import HDDThresholdExceeded, RAMThresholdExceeded, CPUThresholdExceeded
+from dut_monitor import DUT_MONITOR_FILE, MAGIC, HEADER_FORMAT, HEADER_SIZE, RECORD_FIELDS, RECORD_SIZE
+from dut_monitor import SAMPLE_FIELDS, CONSUMER_FIELDS, TOP_CONSUMERS
 
 
 logger = logging.getLogger(__name__)
 DUT_MONITOR = "/tmp/dut_monitor.py"
-DUT_CPU_LOG = "/tmp/cpu.log"
-DUT_RAM_LOG = "/tmp/ram.log"
-DUT_HDD_LOG = "/tmp/hdd.log"
+
+
+def values_number(fields):
+    """
+    @summary: Number of values packed with the struct format fields.
+    """
+    return len(struct.unpack("<" + fields, b"\0" * struct.calcsize("<" + fields)))
+
+
+SAMPLE_VALUES = values_number(SAMPLE_FIELDS)
+CONSUMER_VALUES = values_number(CONSUMER_FIELDS)
+RECORD_VALUES = SAMPLE_VALUES + CONSUMER_VALUES * TOP_CONSUMERS
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def percentile(values, percent):
+    """
+    @summary: Nearest-rank percentile of the values.
+    """
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+def overuse_periods(values, threshold):
+    """
+    @summary: Find periods of consecutive values exceeding the threshold.
+    @return: List of (first index, last index) of the periods.
+    """
+    periods = []
+    start = None
+    for index, value in enumerate(values):
+        if value > threshold:
+            if start is None:
+                start = index
+        elif start is not None:
+            periods.append((start, index - 1))
+            start = None
+    if start is not None:
+        periods.append((start, len(values) - 1))
+    return periods
+
+
+class DUTMeasurements(object):
+    """
+    Samples of the hardware resources consumption decoded from the ring file, in chronological order.
+    Every resource is a column with one value per sample:
+        - timestamps, ram and hdd - time of the sample, used RAM and HDD in percents
+        - cpu - CPU utilization in percents during the interval ending with the sample, there is no value for
+          the first sample, so cpu[i] and consumers[i] belong to the interval from timestamps[i] to timestamps[i + 1]
+        - consumers - dictionary with command line of the top CPU consumers as keys and CPU utilization as values
+    """
+    def __init__(self, data):
+        count = len(data) // RECORD_SIZE
+        # decode all the records at once and take the columns by slicing
+        values = struct.unpack("<" + RECORD_FIELDS * count, data[:count * RECORD_SIZE])
+
+        self.timestamps = values[0::RECORD_VALUES]
+        cpu_busy = values[1::RECORD_VALUES]
+        cpu_total = values[2::RECORD_VALUES]
+        self.cpu = [100.0 * (busy - prev_busy) / max(total - prev_total, 1)
+                    for busy, prev_busy, total, prev_total in zip(cpu_busy[1:], cpu_busy, cpu_total[1:], cpu_total)]
+        self.ram = [100.0 * (total - available) / max(total, 1)
+                    for total, available in zip(values[3::RECORD_VALUES], values[4::RECORD_VALUES])]
+        self.hdd = [100.0 * used / (used + available) if used + available else 0.
+                    for used, available in zip(values[5::RECORD_VALUES], values[6::RECORD_VALUES])]
+
+        self.consumers = []
+        for record in range(1, count):
+            start = record * RECORD_VALUES + SAMPLE_VALUES
+            consumers = values[start:start + CONSUMER_VALUES * TOP_CONSUMERS]
+            self.consumers.append(dict((cmdline.rstrip(b"\0").decode("utf-8", "replace"), utilization)
+                                       for pid, utilization, cmdline in zip(*[iter(consumers)] * CONSUMER_VALUES)
+                                       if pid))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def summary(self):
+        """
+        @summary: Median, 95th percentile and peak of every resource.
+        """
+        result = []
+        for name, column in (("CPU", self.cpu), ("RAM", self.ram), ("HDD", self.hdd)):
+            if column:
+                result.append("{}: p50 {:.1f}%, p95 {:.1f}%, max {:.1f}%".format(
+                    name, percentile(column, 50), percentile(column, 95), max(column)))
+        return "; ".join(result)
 
 
 class DUTMonitorPlugin(object):
@@ -63,67 +154,67 @@ class DUTMonitorPlugin(object):
 
         # Stop monitoring on DUT
         dut_ssh.stop()
-        # Download log files with CPU, RAM and HDD measurements data
-        measurements = dut_ssh.get_log_files()
+        # Download and decode CPU, RAM and HDD samples
+        measurements = dut_ssh.get_measurements()
+        if len(measurements):
+            logger.info("DUT resources consumption: {}".format(measurements.summary()))
         # Verify hardware resources consumption does not exceed defined threshold
-        if measurements["hdd"]:
+        if measurements.hdd:
             try:
-                self.assert_hhd(hdd_meas=measurements["hdd"], thresholds=dut_thresholds)
+                self.assert_hhd(measurements=measurements, thresholds=dut_thresholds)
             except HDDThresholdExceeded as err:
                 monitor_exceptions.append(err)
 
-        if measurements["ram"]:
+        if measurements.ram:
             try:
-                self.assert_ram(ram_meas=measurements["ram"], thresholds=dut_thresholds)
+                self.assert_ram(measurements=measurements, thresholds=dut_thresholds)
             except RAMThresholdExceeded as err:
                 monitor_exceptions.append(err)
 
-        if measurements["cpu"]:
+        if measurements.cpu:
             try:
-                self.assert_cpu(cpu_meas=measurements["cpu"], thresholds=dut_thresholds)
+                self.assert_cpu(measurements=measurements, thresholds=dut_thresholds)
             except CPUThresholdExceeded as err:
                 monitor_exceptions.append(err)
 
         if monitor_exceptions:
             raise Exception("\n".join(item.message for item in monitor_exceptions))
 
-    def assert_hhd(self, hdd_meas, thresholds):
+    def assert_hhd(self, measurements, thresholds):
         """
         Verify that free disk space on the DUT is not overutilized
         """
-        overused = []
         fail_msg = "Used HDD threshold - {}\nHDD overuse:\n".format(thresholds["hdd_used"])
-
-        for timestamp, used_hdd in hdd_meas.items():
-            if used_hdd > thresholds["hdd_used"]:
-                overused.append((timestamp, used_hdd))
+        overused = [(format_time(timestamp), used_hdd)
+                    for timestamp, used_hdd in zip(measurements.timestamps, measurements.hdd)
+                    if used_hdd > thresholds["hdd_used"]]
 
         if overused:
             raise HDDThresholdExceeded(fail_msg + "\n".join(str(item) for item in overused))
 
-    def assert_ram(self, ram_meas, thresholds):
+    def assert_ram(self, measurements, thresholds):
         """
         Verify that RAM resources on the DUT are not overutilized
         """
         failed = False
-        peak_overused = []
+        ram_meas = measurements.ram
         fail_msg = "\nRAM thresholds: peak - {}; before/after test difference - {}%\n".format(thresholds["ram_peak"],
                                                                                             thresholds["ram_delta"])
 
-        for timestamp, used_ram in ram_meas.items():
-            if used_ram > thresholds["ram_peak"]:
-                peak_overused.append((timestamp, used_ram))
+        peak_overused = [(format_time(timestamp), used_ram)
+                         for timestamp, used_ram in zip(measurements.timestamps, ram_meas)
+                         if used_ram > thresholds["ram_peak"]]
         if peak_overused:
             fail_msg = fail_msg + "RAM overuse:\n{}\n".format("\n".join(str(item) for item in peak_overused))
             failed = True
 
         # Take first and last RAM measurements
         if len(ram_meas) >= 4:
-            before = sum(ram_meas.values()[0:2]) / 2
-            after = sum(ram_meas.values()[2:4]) / 2
+            before = sum(ram_meas[0:2]) / 2
+            after = sum(ram_meas[-2:]) / 2
         else:
-            before = ram_meas.values()[0]
-            after = ram_meas.values()[-1]
+            before = ram_meas[0]
+            after = ram_meas[-1]
 
         delta = thresholds["ram_delta"] / 100. * before
         if after >= before + delta:
@@ -133,96 +224,48 @@ class DUTMonitorPlugin(object):
         if failed:
             raise RAMThresholdExceeded(fail_msg)
 
-    def assert_cpu(self, cpu_meas, thresholds):
+    def assert_cpu(self, measurements, thresholds):
         """
         Verify that CPU resources on the DUT are not overutilized
         """
-        failed = False
-        total_overused = []
-        process_overused = {}
         cpu_thresholds = "CPU thresholds: total - {}; per process - {}; average - {}\n".format(thresholds["cpu_total"],
                                                             thresholds["cpu_process"],
                                                             thresholds["cpu_total_average"])
         average_cpu = "\n> Average CPU consumption during test run {}; Threshold - {}\n"
         fail_msg = ""
-        total_sum = 0
-        t_format = "%Y-%m-%d %H:%M:%S"
+        timestamps = measurements.timestamps
 
-        def handle_process_measurements(p_name, t_first, t_last, p_average):
-            """Compose fail message if process overuse CPU durig 'cpu_measure_duration' interval."""
-            msg_template = "> Process '{}'\nAverage CPU overuse {} during {} seconds\n{}"
-            duration = (t_last - t_first).total_seconds()
+        def overuse_duration(first, last):
+            """Duration of the intervals of CPU measurements from first to last"""
+            return timestamps[last + 1] - timestamps[first]
 
+        # Total CPU utilization exceeding threshold during 'cpu_measure_duration' interval
+        for first, last in overuse_periods(measurements.cpu, thresholds["cpu_total"]):
+            duration = overuse_duration(first, last)
             if duration >= thresholds["cpu_measure_duration"]:
-                return msg_template.format(process_name,
-                                           p_average,
-                                           duration,
-                                           "{} - {}\n".format(t_first.strftime(t_format),
-                                                              t_last.strftime(t_format)))
-            return ""
-
-        def handle_total_measurements(overused_list):
-            """Compose fail message if CPU utilization exceeds threshold during 'duration' interval."""
-            fail_msg = ""
-            start = datetime.strptime(overused_list[0][0], t_format)
-            end = datetime.strptime(overused_list[-1][0], t_format)
-
-            if (end - start).total_seconds() >= thresholds["cpu_measure_duration"]:
-                fail_msg = "Total CPU overuse during {} seconds.\n{}\n\n".format((end - start).total_seconds(),
-                "\n".join([str(item) for item in overused_list])
-                )
-            del overused_list[0:]
-            return fail_msg
-
-        # Calculate total CPU utilization
-        for m_id, timestamp in enumerate(cpu_meas):
-            # Collect total CPU utilization to calculate total average
-            total_sum += cpu_meas[timestamp]["total"]
-            if cpu_meas[timestamp]["total"] > thresholds["cpu_total"]:
-                total_overused.append((timestamp, cpu_meas[timestamp]["total"]))
-                if m_id == (len(cpu_meas) - 1):
-                    fail_msg += handle_total_measurements(total_overused)
-                    total_overused = []
-            elif total_overused:
-                fail_msg += handle_total_measurements(total_overused)
-                total_overused = []
-
-            for process_consumption, process_name in cpu_meas[timestamp]["top_consumer"].items():
-                if process_consumption >= thresholds["cpu_process"]:
-                    if process_name not in process_overused:
-                        process_overused[process_name] = []
-                    # Collect list of CPU utilization for specific process if CPU utilization exceeds threshold
-                    process_overused[process_name].append((timestamp, process_consumption))
-
-        # Handle measurements per process
-        if process_overused:
-            for process_name, process_consumption in process_overused.items():
-                timestamps = []
-                process_sum = 0
-                for m_id, m_value in enumerate(process_consumption):
-                    t_stamp = datetime.strptime(m_value[0], t_format)
-                    process_sum += m_value[1]
-                    if not timestamps:
-                        timestamps.append(t_stamp)
-                        continue
-                    if (2 <= (t_stamp - timestamps[-1]).total_seconds() <= 3):
-                            timestamps.append(t_stamp)
-                            if m_id == (len(process_consumption) - 1):
-                                fail_msg += handle_process_measurements(p_name=process_name,
-                                                                        t_first=timestamps[0],
-                                                                        t_last=timestamps[-1],
-                                                                        p_average=process_sum / len(timestamps))
-                    else:
-                        fail_msg += handle_process_measurements(p_name=process_name,
-                                                                t_first=timestamps[0],
-                                                                t_last=timestamps[-1],
-                                                                p_average=process_sum / len(timestamps))
-                        timestamps = []
-                        process_sum = 0
+                fail_msg += "Total CPU overuse during {:.1f} seconds.\n{}\n\n".format(duration,
+                    "\n".join([str((format_time(timestamps[index + 1]), measurements.cpu[index]))
+                               for index in range(first, last + 1)])
+                    )
+
+        # Process CPU utilization exceeding threshold during 'cpu_measure_duration' interval
+        process_names = set()
+        for consumers in measurements.consumers:
+            process_names.update(name for name, consumption in consumers.items()
+                                 if consumption > thresholds["cpu_process"])
+        for process_name in sorted(process_names):
+            process_meas = [consumers.get(process_name, 0.) for consumers in measurements.consumers]
+            for first, last in overuse_periods(process_meas, thresholds["cpu_process"]):
+                duration = overuse_duration(first, last)
+                if duration >= thresholds["cpu_measure_duration"]:
+                    fail_msg += "> Process '{}'\nAverage CPU overuse {} during {:.1f} seconds\n{} - {}\n".format(
+                        process_name, sum(process_meas[first:last + 1]) / (last - first + 1), duration,
+                        format_time(timestamps[first]), format_time(timestamps[last + 1]))
 
         # Calculate average CPU utilization
-        if (total_sum / len(cpu_meas)) > thresholds["cpu_total_average"]:
-            fail_msg += average_cpu.format(total_sum / len(cpu_meas), thresholds["cpu_total_average"])
+        average = sum(measurements.cpu) / len(measurements.cpu)
+        if average > thresholds["cpu_total_average"]:
+            fail_msg += average_cpu.format(average, thresholds["cpu_total_average"])
 
         if fail_msg:
             raise CPUThresholdExceeded(cpu_thresholds + fail_msg)
@@ -306,7 +349,7 @@ class DUTMonitorClient(object):
     def start(self):
         """
         @summary: Start HW resources monitoring on the DUT.
-                  Write obtained values to the following files on the DUT: DUT_CPU_LOG, DUT_RAM_LOG, DUT_HDD_LOG
+                  Obtained values are written to the ring file DUT_MONITOR_FILE on the DUT
         """
         self.running = True
         self._upload_to_dut()
@@ -331,32 +374,25 @@ class DUTMonitorClient(object):
         if not self.run_channel.closed:
             self.run_channel.close()
 
-    def read_yml(self, file_pointer):
+    def get_measurements(self):
         """
-        @summary: Read yaml file content. Convert it to the ordered data.
-        @return: OrderedDict with sorted keys by timestamp, or empty dict for empty file.
-        """
-        with file_pointer as fp:
-            measurements = yaml.safe_load("".join(fp))
-        if measurements is None:
-            return {}
-        # Sort json data to process logs chronologically
-        keys = measurements.keys()
-        keys.sort()
-        key_value_pairs = [(item, measurements[item]) for item in keys]
-        return OrderedDict(key_value_pairs)
-
-    def get_log_files(self):
-        """
-        @summary: Fetch monitoring logs from device, parse, convert to dictionary with sorted order.
-        @return: Dictionary with keys "cpu", "ram", "hdd", values contains appropriate measurements made on DUT.
+        @summary: Fetch the ring file with measurements from device and decode it.
+        @return: DUTMeasurements with the samples in chronological order.
         """
         logger.debug("Downloading file from the DUT...")
-        cpu_log_fp = self.ssh.open_sftp().file(DUT_CPU_LOG)
-        ram_log_fp = self.ssh.open_sftp().file(DUT_RAM_LOG)
-        hdd_log_fp = self.ssh.open_sftp().file(DUT_HDD_LOG)
-
-        cpu_meas = self.read_yml(cpu_log_fp)
-        ram_meas = self.read_yml(ram_log_fp)
-        hdd_meas = self.read_yml(hdd_log_fp)
-        return {"cpu": cpu_meas, "ram": ram_meas, "hdd": hdd_meas}
+        sftp = self.ssh.open_sftp()
+        try:
+            with sftp.file(DUT_MONITOR_FILE) as fp:
+                magic, slots, record_size, _, count = struct.unpack(HEADER_FORMAT, fp.read(HEADER_SIZE))
+                if magic != MAGIC or record_size != RECORD_SIZE:
+                    raise Exception("Unexpected format of DUT monitor file {}".format(DUT_MONITOR_FILE))
+                # Download only the written records, the oldest one is in the next slot to be written once wrapped
+                first = count % slots if count > slots else 0
+                fp.seek(HEADER_SIZE + first * RECORD_SIZE)
+                data = fp.read((min(count, slots) - first) * RECORD_SIZE)
+                if first:
+                    fp.seek(HEADER_SIZE)
+                    data += fp.read(first * RECORD_SIZE)
+        finally:
+            sftp.close()
+        return DUTMeasurements(data)
@@ -1,9 +1,11 @@
 import sys
+import json
 import logging
 import os
 import re
 import time
 import pprint
+import pipes
 
 import system_msg_handler
 
@@ -25,7 +27,8 @@ class LogAnalyzerError(Exception):
 
 
 class LogAnalyzer:
-    def __init__(self, ansible_host, marker_prefix, dut_run_dir="/tmp", start_marker=None, additional_files={}):
+    def __init__(self, ansible_host, marker_prefix, dut_run_dir="/tmp", start_marker=None, additional_files={},
+                 analyze_on_dut=False):
         self.ansible_host = ansible_host
         self.dut_run_dir = dut_run_dir
         self.extracted_syslog = os.path.join(self.dut_run_dir, "syslog")
@@ -40,6 +43,8 @@ class LogAnalyzer:
         self.expected_matches_target = 0
         self._markers = []
         self.fail = True
+        # analyze extracted logs on the DUT and fetch them only if analysis failed
+        self.analyze_on_dut = analyze_on_dut
 
         self.additional_files = list(additional_files.keys())
         self.additional_start_str = list(additional_files.values())
@@ -225,27 +230,10 @@ class LogAnalyzer:
             # Enable logrotate cron task back
             self.ansible_host.command("sed -i 's/^#//g' /etc/cron.d/logrotate")
 
-        # Download extracted logs from the DUT to the temporal folder defined in SYSLOG_TMP_FOLDER
-        self.save_extracted_log(dest=tmp_folder)
-        file_list = [tmp_folder]
-
-        for path in self.additional_files:
-            file_dir, file_name = split(path)
-            extracted_file_name = os.path.join(self.dut_run_dir, file_name)
-            tmp_folder = ".".join((extracted_file_name, timestamp))
-            self.save_extracted_file(dest=tmp_folder, src=extracted_file_name)
-            file_list.append(tmp_folder)
-
-        match_messages_regex = re.compile('|'.join(self.match_regex)) if len(self.match_regex) else None
-        ignore_messages_regex = re.compile('|'.join(self.ignore_regex)) if len(self.ignore_regex) else None
-        expect_messages_regex = re.compile('|'.join(self.expect_regex)) if len(self.expect_regex) else None
-
-        analyzer_parse_result = self.ansible_loganalyzer.analyze_file_list(file_list, match_messages_regex, ignore_messages_regex, expect_messages_regex)
-        # Print file content and remove the file
-        for folder in file_list:
-            with open(folder) as fo:
-                logging.debug("{} file content:\n\n{}".format(folder, fo.read()))
-            os.remove(folder)
+        if self.analyze_on_dut:
+            analyzer_parse_result = self._analyze_on_dut(marker)
+        else:
+            analyzer_parse_result = self._analyze_fetched(timestamp, tmp_folder)
 
         total_match_cnt = 0
         total_expect_cnt = 0
@@ -272,10 +260,82 @@ class LogAnalyzer:
         analyzer_summary["unused_expected_regexp"] = unused_regex_messages
 
         if fail:
-            self._verify_log(analyzer_summary)
+            try:
+                self._verify_log(analyzer_summary)
+            except LogAnalyzerError:
+                if self.analyze_on_dut:
+                    file_list = self._save_extracted_logs(timestamp, tmp_folder)
+                    logging.error("Log analysis failed, extracted logs are saved to: {}".format(", ".join(file_list)))
+                raise
         else:
             return analyzer_summary
 
+    def _extracted_files(self):
+        """
+        @summary: Get paths of the extracted logs on the DUT.
+        """
+        file_list = [self.extracted_syslog]
+        for path in self.additional_files:
+            file_list.append(os.path.join(self.dut_run_dir, split(path)[1]))
+        return file_list
+
+    def _save_extracted_logs(self, timestamp, tmp_folder):
+        """
+        @summary: Download extracted logs from the DUT to the temporal folder defined in SYSLOG_TMP_FOLDER.
+
+        @return: List of downloaded files.
+        """
+        self.save_extracted_log(dest=tmp_folder)
+        file_list = [tmp_folder]
+
+        for extracted_file_name in self._extracted_files()[1:]:
+            tmp_folder = ".".join((extracted_file_name, timestamp))
+            self.save_extracted_file(dest=tmp_folder, src=extracted_file_name)
+            file_list.append(tmp_folder)
+        return file_list
+
+    def _analyze_fetched(self, timestamp, tmp_folder):
+        """
+        @summary: Download extracted logs and analyze them locally.
+
+        @return: Map of file name to list of matched and expected lines.
+        """
+        file_list = self._save_extracted_logs(timestamp, tmp_folder)
+
+        match_messages_regex = re.compile('|'.join(self.match_regex)) if len(self.match_regex) else None
+        ignore_messages_regex = re.compile('|'.join(self.ignore_regex)) if len(self.ignore_regex) else None
+        expect_messages_regex = re.compile('|'.join(self.expect_regex)) if len(self.expect_regex) else None
+
+        analyzer_parse_result = self.ansible_loganalyzer.analyze_file_list(file_list, match_messages_regex, ignore_messages_regex, expect_messages_regex)
+        # Print file content and remove the file
+        for folder in file_list:
+            with open(folder) as fo:
+                logging.debug("{} file content:\n\n{}".format(folder, fo.read()))
+            os.remove(folder)
+        return analyzer_parse_result
+
+    def _analyze_on_dut(self, marker):
+        """
+        @summary: Analyze extracted logs on the DUT. Only matched and expected lines are returned from the DUT.
+
+        @return: Map of file name to list of matched and expected lines.
+        """
+        regex_file = os.path.join(self.dut_run_dir, "loganalyzer.{}.json".format(marker))
+        regex_sets = {"match": self.match_regex, "ignore": self.ignore_regex, "expect": self.expect_regex}
+        self.ansible_host.copy(content=json.dumps(regex_sets), dest=regex_file)
+
+        cmd = "python {run_dir}/loganalyzer.py --action analyze_files --run_id {marker} --logs {logs} --regex_file {regex_file}".format(
+            run_dir=self.dut_run_dir, marker=marker, logs=",".join(self._extracted_files()), regex_file=regex_file)
+        if self.start_marker:
+            cmd += " --start_marker {}".format(pipes.quote(self.start_marker))
+
+        logging.debug("Analyzing extracted logs on the DUT")
+        try:
+            result = self.ansible_host.command(cmd)
+        finally:
+            self.ansible_host.file(path=regex_file, state="absent")
+        return json.loads(result["stdout"])
+
     def save_extracted_log(self, dest):
         """
         @summary: Download extracted syslog log file to the ansible host.
@@ -0,0 +1,30 @@
+"""Report count and latency of the modules called on the hosts during the session
+
+With option '--ssh_fast_path', 'command' and 'shell' module calls on SONiC hosts are run on a persistent SSH
+connection to the host instead of ansible. The report shows the calls run on the connection with path 'ssh' and the
+calls run by ansible with path 'ansible'.
+"""
+import logging
+
+from tests.common.devices.base import AnsibleHostBase, module_stats
+
+logger = logging.getLogger(__name__)
+
+
+def pytest_addoption(parser):
+    parser.addoption("--ssh_fast_path", action="store_true", default=False,
+                     help="Run 'command' and 'shell' modules on SONiC hosts on a persistent SSH connection")
+
+
+def pytest_configure(config):
+    AnsibleHostBase.ssh_fast_path = config.getoption("--ssh_fast_path")
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    lines = module_stats.report()
+    if len(lines) <= 1:
+        return
+    terminalreporter.write_sep("=", "module calls")
+    for line in lines:
+        terminalreporter.write_line(line)
+        logger.info(line)
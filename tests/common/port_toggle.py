@@ -43,17 +43,11 @@ def port_toggle(duthost, tbinfo, ports=None, wait_time_getter=None, wait_after_p
     port_down_wait_time, port_up_wait_time = wait_time_getter(duthost, len(ports))
     logger.info("Toggling ports:\n%s", pprint.pformat(ports))
 
-    cmds_down = []
-    cmds_up = []
-    for port in ports:
-        namespace = '-n {}'.format(mg_facts["minigraph_neighbors"][port]['namespace']) if mg_facts["minigraph_neighbors"][port]['namespace'] else ''
-        cmds_down.append("config interface {} shutdown {}".format(namespace, port))
-        cmds_up.append("config interface {} startup {}".format(namespace, port))
-
     shutdown_ok = False
     shutdown_err_msg = ""
     try:
-        duthost.shell_cmds(cmds=cmds_down)
+        # all the ports are updated in one CONFIG_DB transaction per ASIC
+        duthost.config_interfaces(ports, admin_status="down", wait=False)
 
         if watch:
             time.sleep(1)
@@ -71,7 +65,7 @@ def port_toggle(duthost, tbinfo, ports=None, wait_time_getter=None, wait_after_p
     startup_ok = False
     startup_err_msg = ""
     try:
-        duthost.shell_cmds(cmds=cmds_up)
+        duthost.config_interfaces(ports, admin_status="up", wait=False)
 
         logger.info("Wait for ports to come up")
         startup_ok = wait_until(port_up_wait_time, 5, lambda: len(__get_down_ports()) == 0)
@@ -54,7 +54,8 @@ pytest_plugins = ('tests.common.plugins.ptfadapter',
                   'tests.common.plugins.custom_fixtures',
                   'tests.common.dualtor',
                   'tests.vxlan',
-                  'tests.common.plugins.allure_server')
+                  'tests.common.plugins.allure_server',
+                  'tests.common.plugins.module_stats')
 
 
 def pytest_addoption(parser):